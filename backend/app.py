@@ -2,19 +2,37 @@
 Flask API server cho hệ thống xử lý ảnh với biến đổi Fourier
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, url_for
 from flask_cors import CORS
 import os
 import cv2
 import numpy as np
 from werkzeug.utils import secure_filename
 import base64
-from io import BytesIO
-from PIL import Image
+import json
+import threading
+import time
+import uuid
+from typing import Optional
 
-from core.image_processor import ImageProcessor
-from utils.validation import validate_processing_params, validate_image_file
-from utils.image_io import read_image, save_image, convert_bgr_to_rgb
+from core.image_processor import (
+    ImageProcessor, AUTO_PARAMS, PRECISIONS, precision_error, preview_shape, frequency_scale,
+    estimate_process_memory,
+)
+from core.tiling import TILE_MEMORY_BYTES, estimate_monolithic_bytes, plan_image_tiles
+from core.metrics import METRIC_LEVELS
+from core.fourier_transform import set_fft_backend
+from core.fft_plan import FFT_PLANNERS, PAD_MODES
+from core.cache import MASK_CACHE, SPECTRUM_CACHE, IMAGE_STORE, ARTIFACT_STORE, image_digest
+from core.workspace import WORKSPACE_POOL
+from core.jobs import JOB_STATUSES, JobManager
+from core.telemetry import (
+    StageTimer, timed, render_prometheus, render_cache_stats, render_gauges,
+    REQUEST_SECONDS, REQUESTS_TOTAL, REQUESTS_IN_FLIGHT,
+)
+from core.profiling import MemoryProfiler, CallProfiler, format_profile
+from utils.validation import validate_processing_params, validate_image_file, validate_precision
+from utils.image_io import read_image, save_image, encode_image, parse_encoding
 
 app = Flask(__name__)
 CORS(app)
@@ -24,47 +42,656 @@ UPLOAD_FOLDER = 'uploads'
 RESULTS_FOLDER = 'results'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tiff', 'tif'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+MAX_SWEEP_SETTINGS = 200  # Số bộ tham số tối đa cho một lần /api/sweep
+MAX_SWEEP_THUMBNAIL = 512  # Cạnh dài tối đa của ảnh thu nhỏ trong /api/sweep
+# Các ảnh /api/process có thể trả về (tham số include) và định dạng response
+ARTIFACTS = ('original_image', 'processed_image', 'magnitude_spectrum', 'filter_mask')
+RESPONSE_FORMATS = ('json', 'url', 'multipart')
+# Mã hóa mặc định: ảnh kết quả giữ lossless (PNG nén nhanh mức 1),
+# ảnh xem trước (gốc, phổ, mặt nạ) dùng JPEG - nhanh hơn PNG hàng chục lần
+DEFAULT_ENCODINGS = {
+    'original_image': 'jpeg:85',
+    'processed_image': 'png:1',
+    'magnitude_spectrum': 'jpeg:85',
+    'filter_mask': 'jpeg:85',
+}
+# Ảnh xem trước (preview_scale / max_preview_pixels)
+PREVIEW_ENCODING = 'jpeg:85'
+MIN_PREVIEW_PIXELS = 64 * 64
+MAX_PROFILE_TOP = 100  # Số hàm tối đa của cProfile trong profile_top
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['RESULTS_FOLDER'] = RESULTS_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# FFT backend ('numpy', 'scipy', 'pyfftw') và số luồng (0 = số CPU); áp dụng bởi
+# apply_fft_config trước mỗi request nên có thể đổi sau khi import app
+app.config['FFT_BACKEND'] = os.environ.get('FFT_BACKEND', 'scipy')
+app.config['FFT_WORKERS'] = int(os.environ.get('FFT_WORKERS', '0'))
+# Cho phép profile=1 (tracemalloc, RSS, cProfile từng bước) - chỉ bật khi cần đo
+app.config['ENABLE_PROFILING'] = os.environ.get('ENABLE_PROFILING', '0') == '1'
+
+_FFT_CONFIG_LOCK = threading.Lock()
+_applied_fft_config = None
+
+
+def apply_fft_config() -> None:
+    """
+    Chọn FFT backend theo app.config['FFT_BACKEND'] / ['FFT_WORKERS'] nếu khác lần
+    áp dụng trước (gọi trước mỗi request và trong warm-up của wsgi.py)
+    """
+    global _applied_fft_config
+    config = (app.config['FFT_BACKEND'], int(app.config['FFT_WORKERS']))
+    if config == _applied_fft_config:
+        return
+    with _FFT_CONFIG_LOCK:
+        if config != _applied_fft_config:
+            set_fft_backend(*config)
+            _applied_fft_config = config
+            print(f"FFT backend: {config[0]}, FFT_WORKERS={config[1]}")
+
+
+apply_fft_config()
+
+# Pool worker cho /api/jobs (JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL)
+JOB_MANAGER = JobManager()
 
 # Tạo thư mục nếu chưa tồn tại
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
 
+@app.before_request
+def configure_fft_backend():
+    """Áp dụng thay đổi FFT_BACKEND / FFT_WORKERS trong app.config (nếu có)"""
+    apply_fft_config()
+
+
+@app.before_request
+def start_request_metrics():
+    """Đếm request đang xử lý theo route (mẫu URL, không theo id để giới hạn số nhãn)"""
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(g.metrics_endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Ghi thời gian và mã trạng thái của request (cả response lỗi 4xx/5xx)"""
+    if 'metrics_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start, g.metrics_endpoint, request.method)
+        REQUESTS_TOTAL.inc(g.metrics_endpoint, request.method, str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    """Giảm số request đang xử lý (chạy cả khi view ném ngoại lệ)"""
+    if 'metrics_endpoint' in g:
+        REQUESTS_IN_FLIGHT.dec(g.metrics_endpoint)
+
+
 def allowed_file(filename):
     """Kiểm tra extension file có được phép không"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def image_to_base64(image: np.ndarray) -> str:
-    """Chuyển đổi numpy array thành base64 string"""
-    # Chuyển BGR sang RGB nếu cần
-    if len(image.shape) == 3 and image.shape[2] == 3:
-        image_rgb = convert_bgr_to_rgb(image)
+def image_to_base64(image: np.ndarray, encoding: str = 'png') -> str:
+    """Chuyển đổi numpy array (BGR) thành base64 data URL"""
+    data, mimetype, _ = encode_image(image, *parse_encoding(encoding))
+    return to_data_url(data, mimetype)
+
+
+def parse_artifact_encodings(include, preview: bool = False):
+    """
+    Đọc cấu hình mã hóa cho từng ảnh trả về: encoding (áp dụng cho tất cả) và
+    encoding_<tên ảnh> (ghi đè riêng), dạng 'png[:0-9]', 'jpeg[:1-100]', 'webp[:1-101]'
+    
+    Args:
+        include: Danh sách ảnh trả về
+        preview: True nếu là ảnh xem trước (mặc định JPEG cho mọi ảnh)
+        
+    Returns:
+        {tên ảnh: (định dạng, mức)}
+    """
+    default = request.form.get('encoding') or (PREVIEW_ENCODING if preview else None)
+    return {
+        name: parse_encoding(
+            request.form.get(f'encoding_{name}') or default or DEFAULT_ENCODINGS[name]
+        )
+        for name in include
+    }
+
+
+def get_preview_image(image: np.ndarray, image_id: str, shape):
+    """
+    Lấy ảnh thu nhỏ (INTER_AREA) của ảnh đã lưu, tạo và lưu vào IMAGE_STORE nếu chưa có
+    để các lần kéo slider tiếp theo không phải resize lại ảnh gốc
+    
+    Returns:
+        (ảnh thu nhỏ, mã của ảnh thu nhỏ)
+    """
+    preview_id = f'{image_id}@{shape[0]}x{shape[1]}'
+    preview = IMAGE_STORE.get(preview_id)
+    if preview is None:
+        preview = cv2.resize(image, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+        preview.flags.writeable = False
+        IMAGE_STORE.put(preview_id, preview)
+    return preview, preview_id
+
+
+def to_data_url(data: bytes, mimetype: str) -> str:
+    """Chuyển bytes đã mã hóa thành data URL base64"""
+    return f"data:{mimetype};base64,{base64.b64encode(data).decode()}"
+
+
+def parse_include(value):
+    """
+    Đọc tham số include (danh sách ảnh cần trả về, phân cách bằng dấu phẩy)
+    
+    Returns:
+        Danh sách tên ảnh (mặc định tất cả) hoặc None nếu có tên không hợp lệ
+    """
+    if value is None:
+        return list(ARTIFACTS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if any(name not in ARTIFACTS for name in names):
+        return None
+    return list(dict.fromkeys(names))
+
+
+def artifact_response(payload: dict, artifacts: dict, response_format: str = 'json'):
+    """
+    Tạo response chứa metadata và các ảnh đã mã hóa
+    
+    Args:
+        payload: Metadata (metrics, image_id, ...)
+        artifacts: {tên: (bytes, mimetype)}
+        response_format: 'json' (data URL base64), 'url' (lưu vào ARTIFACT_STORE và
+            trả đường dẫn /api/artifacts/<id>) hoặc 'multipart' (multipart/mixed)
+    """
+    if response_format == 'multipart':
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Type: application/json\r\n'
+            f'Content-Disposition: inline; name="metadata"\r\n\r\n'.encode(),
+            json.dumps(payload).encode(),
+            b'\r\n',
+        ]
+        for name, (data, mimetype) in artifacts.items():
+            parts.append(
+                f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                f'Content-Disposition: inline; name="{name}"\r\n'
+                f'Content-Length: {len(data)}\r\n\r\n'.encode()
+            )
+            parts.append(data)
+            parts.append(b'\r\n')
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return Response(b''.join(parts), mimetype=f'multipart/mixed; boundary={boundary}')
+    
+    payload = dict(payload)
+    for name, (data, mimetype) in artifacts.items():
+        if response_format == 'url':
+            artifact_id = uuid.uuid4().hex
+            ARTIFACT_STORE.put(artifact_id, (data, mimetype))
+            payload[name] = url_for('get_artifact', artifact_id=artifact_id)
+        else:
+            payload[name] = to_data_url(data, mimetype)
+    return jsonify(payload)
+
+
+def decode_image_bytes(image_bytes: bytes):
+    """Giải mã bytes ảnh (PNG/JPEG/...) thành mảng BGR, None nếu không hợp lệ"""
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def store_image(image: np.ndarray) -> str:
+    """
+    Lưu ảnh đã giải mã vào IMAGE_STORE theo mã băm nội dung
+    
+    Returns:
+        image_id (mã băm nội dung)
+    """
+    image_id = image_digest(image)
+    image.flags.writeable = False
+    IMAGE_STORE.put(image_id, image)
+    return image_id
+
+
+def get_request_image(timer: Optional[StageTimer] = None):
+    """
+    Lấy ảnh từ request: image_id (ảnh đã upload trước đó), file upload hoặc base64
+    Ảnh mới được lưu vào IMAGE_STORE để các request sau chỉ cần gửi image_id
+    
+    Args:
+        timer: Đo thời gian bước 'decode' (giải mã) và 'store' (băm + lưu IMAGE_STORE)
+        
+    Returns:
+        (image, image_id, error) - error là (message, status) nếu không lấy được ảnh
+    """
+    json_body = request.get_json(silent=True) or {}
+    
+    # Thử lấy từ ảnh đã lưu trên server
+    image_id = request.form.get('image_id') or json_body.get('image_id')
+    if image_id:
+        image = IMAGE_STORE.get(image_id)
+        if image is None:
+            return None, None, ('Không tìm thấy ảnh hoặc ảnh đã hết hạn, hãy upload lại', 404)
+        print(f"Using stored image {image_id}. Shape: {image.shape}")
+        return image, image_id, None
+    
+    # Thử lấy từ file upload
+    if 'image' in request.files:
+        print("Reading image from file upload...")
+        file = request.files['image']
+        if file and file.filename:  # Có filename
+            if not allowed_file(file.filename):
+                return None, None, ('Định dạng file không được phép', 400)
+        # Đọc ảnh từ file (có thể không có filename nếu là blob)
+        file_bytes = file.read()
+        print(f"File size: {len(file_bytes)} bytes")
+        if len(file_bytes) == 0:
+            return None, None, ('File rỗng', 400)
+        with timed(timer, 'decode'):
+            image = decode_image_bytes(file_bytes)
+        if image is None:
+            return None, None, ('Không thể đọc ảnh từ file. Có thể file không phải là ảnh hợp lệ.', 400)
+        print(f"Image decoded successfully. Shape: {image.shape}")
+    
+    # Thử lấy từ base64
+    elif 'image' in json_body:
+        image_base64 = json_body['image']
+        if image_base64.startswith('data:image'):
+            # Bỏ qua data URL prefix
+            image_base64 = image_base64.split(',')[1]
+        
+        with timed(timer, 'decode'):
+            image = decode_image_bytes(base64.b64decode(image_base64))
+        if image is None:
+            return None, None, ('Không thể đọc ảnh từ base64', 400)
+    
     else:
-        image_rgb = image
+        return None, None, ('Không tìm thấy ảnh trong request', 400)
+    
+    with timed(timer, 'store'):
+        image_id = store_image(image)
+    return image, image_id, None
+
+
+def get_reference_image(timer: Optional[StageTimer] = None):
+    """
+    Lấy ảnh tham chiếu (tùy chọn) cho chế độ auto: reference_id (ảnh đã upload)
+    hoặc file upload 'reference'
     
-    # Chuyển sang PIL Image
-    if len(image_rgb.shape) == 2:
-        pil_image = Image.fromarray(image_rgb, mode='L')
+    Args:
+        timer: Đo thời gian giải mã (bước 'decode_reference')
+        
+    Returns:
+        (reference, error) - reference là None nếu request không có ảnh tham chiếu
+    """
+    reference_id = request.form.get('reference_id')
+    if reference_id:
+        reference = IMAGE_STORE.get(reference_id)
+        if reference is None:
+            return None, ('Không tìm thấy ảnh tham chiếu hoặc ảnh đã hết hạn, hãy upload lại', 404)
+        return reference, None
+    
+    if 'reference' in request.files:
+        with timed(timer, 'decode_reference'):
+            reference = decode_image_bytes(request.files['reference'].read())
+        if reference is None:
+            return None, ('Không thể đọc ảnh tham chiếu', 400)
+        return reference, None
+    
+    return None, None
+
+
+def parse_process_request():
+    """
+    Đọc và validate tham số của /api/process (và /api/jobs), lấy ảnh từ request
+    
+    Returns:
+        (params, error) - params là dictionary tham số cho run_process,
+        error là (message, status) nếu request không hợp lệ
+    """
+    # Lấy tham số
+    filter_type = request.form.get('filter_type', 'gaussian').lower()
+    filter_mode = request.form.get('filter_mode', 'lowpass').lower()
+    cutoff = request.form.get('cutoff', '50.0')
+    order = int(request.form.get('order', 2))
+    center_freq = request.form.get('center_freq')
+    bandwidth = request.form.get('bandwidth')
+    
+    # Tham số 'auto' được tìm sau khi có ảnh; tạm dùng giá trị mặc định để validate
+    auto_params = [
+        name for name, value in (('cutoff', cutoff), ('center_freq', center_freq), ('bandwidth', bandwidth))
+        if value is not None and value.lower() == 'auto'
+    ]
+    cutoff = 50.0 if 'cutoff' in auto_params else float(cutoff)
+    center_freq = float(center_freq) if center_freq and 'center_freq' not in auto_params else None
+    bandwidth = float(bandwidth) if bandwidth and 'bandwidth' not in auto_params else None
+    precision = request.form.get('precision', 'float32').lower()
+    include = parse_include(request.form.get('include'))
+    response_format = request.form.get('response_format', 'json').lower()
+    preview_scale = float(request.form.get('preview_scale') or 0) or None
+    max_preview_pixels = int(request.form.get('max_preview_pixels') or 0) or None
+    preview_requested = bool(preview_scale or max_preview_pixels)
+    tiled = request.form.get('tiled', '0').lower()
+    tile_memory = int(request.form.get('tile_memory_mb') or 0) * 1024 * 1024 or TILE_MEMORY_BYTES
+    if tiled not in ('0', '1', 'auto'):
+        return None, (f"tiled phải là '0', '1' hoặc 'auto': {tiled}", 400)
+    pad_mode = request.form.get('pad_mode', 'zero').lower()
+    fft_planner = (request.form.get('fft_planner') or '').lower() or None
+    if tiled == '1' and auto_params:
+        return None, ('Chế độ tile không hỗ trợ tham số auto', 400)
+    if pad_mode not in PAD_MODES:
+        return None, (f'pad_mode chỉ nhận: {", ".join(PAD_MODES)}', 400)
+    if fft_planner is not None and fft_planner not in FFT_PLANNERS:
+        return None, (f'fft_planner chỉ nhận: {", ".join(FFT_PLANNERS)}', 400)
+    if tiled == '1' and pad_mode != 'zero':
+        return None, ('Chế độ tile chỉ hỗ trợ pad_mode=zero', 400)
+    if tiled == '1' and fft_planner not in (None, 'fast'):
+        return None, ('Chế độ tile chỉ hỗ trợ fft_planner=fast (lưới next_fast_len)', 400)
+    if preview_scale is not None and not 0 < preview_scale <= 1:
+        return None, (f'preview_scale phải trong khoảng (0, 1]: {preview_scale}', 400)
+    if max_preview_pixels is not None and max_preview_pixels < MIN_PREVIEW_PIXELS:
+        return None, (f'max_preview_pixels tối thiểu {MIN_PREVIEW_PIXELS}', 400)
+    try:
+        encodings = parse_artifact_encodings(include or [], preview_requested)
+    except ValueError as e:
+        return None, (str(e), 400)
+    
+    # Validate tham số
+    is_valid, error_msg = validate_processing_params(
+        filter_type, filter_mode, cutoff, order, center_freq, bandwidth
+    )
+    if not is_valid:
+        return None, (error_msg, 400)
+    if not validate_precision(precision):
+        return None, (f'Độ chính xác không hợp lệ: {precision}', 400)
+    metrics_level = request.form.get('metrics')
+    if metrics_level is not None and metrics_level.lower() not in METRIC_LEVELS:
+        return None, (f'metrics chỉ nhận: {", ".join(METRIC_LEVELS)}', 400)
+    if include is None:
+        return None, (f'include chỉ gồm: {", ".join(ARTIFACTS)}', 400)
+    if response_format not in RESPONSE_FORMATS:
+        return None, (f'response_format không hợp lệ: {response_format}', 400)
+    if filter_mode != 'bandreject' and set(auto_params) - {'cutoff'}:
+        return None, ('center_freq/bandwidth auto chỉ dùng cho band-reject', 400)
+    profile = request.form.get('profile') == '1'
+    profile_top = int(request.form.get('profile_top') or 0)
+    if (profile or profile_top) and not app.config['ENABLE_PROFILING']:
+        return None, ('Profiling chưa được bật trên server (ENABLE_PROFILING=1)', 403)
+    if not 0 <= profile_top <= MAX_PROFILE_TOP:
+        return None, (f'profile_top phải trong khoảng 0-{MAX_PROFILE_TOP}: {profile_top}', 400)
+    
+    # Lấy ảnh từ request (image_id, file upload hoặc base64)
+    timer = MemoryProfiler() if profile or profile_top else StageTimer()
+    image, image_id, error = get_request_image(timer)
+    if error is not None:
+        return None, error
+    reference = None
+    if auto_params:
+        reference, error = get_reference_image(timer)
+        if error is not None:
+            return None, error
+    
+    return {
+        'filter_type': filter_type,
+        'filter_mode': filter_mode,
+        'cutoff': cutoff,
+        'order': order,
+        'center_freq': center_freq,
+        'bandwidth': bandwidth,
+        'precision': precision,
+        'precision_report': request.form.get('precision_report') == '1',
+        'auto_params': auto_params,
+        'auto_objective': request.form.get('auto_objective'),
+        'reference': reference,
+        'include': include,
+        'include_given': request.form.get('include') is not None,
+        'encodings': encodings,
+        'response_format': response_format,
+        'preview_scale': preview_scale,
+        'max_preview_pixels': max_preview_pixels,
+        'metrics_level': metrics_level.lower() if metrics_level is not None else None,
+        'preview_metrics': request.form.get('preview_metrics') == '1',
+        'tiled': tiled,
+        'tile_memory': tile_memory,
+        'pad_mode': pad_mode,
+        'fft_planner': fft_planner,
+        'image': image,
+        'image_id': image_id,
+        'timer': timer,
+        'profile_top': profile_top,
+    }, None
+
+
+def run_process(params: dict, stage_hook=None):
+    """
+    Xử lý ảnh theo tham số đã đọc bởi parse_process_request (không phụ thuộc request,
+    chạy được trong worker của JOB_MANAGER)
+    
+    Args:
+        params: Tham số từ parse_process_request
+        stage_hook: Hàm gọi khi bắt đầu mỗi bước (xem ImageProcessor.stage_hook)
+        
+    Returns:
+        (response, artifacts) - metadata và {tên ảnh: (bytes, mimetype)}; với profile=1
+        response có thêm 'profile' (xem MemoryProfiler.report)
+        
+    Raises:
+        ValueError: Tham số không dùng được với ảnh này (trả về 400)
+    """
+    timer = params['timer']
+    if not isinstance(timer, MemoryProfiler):
+        return _run_process(params, stage_hook)
+    
+    with CallProfiler(params['profile_top']) as call_profiler:
+        response, artifacts = _run_process(params, stage_hook)
+    response['profile'] = timer.report(call_profiler.top_functions())
+    print(f"Profile {params['image_id']}:\n{format_profile(response['profile'])}")
+    return response, artifacts
+
+
+def _run_process(params: dict, stage_hook=None):
+    """Phần xử lý của run_process"""
+    def enter_stage(name):
+        if stage_hook is not None:
+            stage_hook(name)
+    
+    filter_type, filter_mode = params['filter_type'], params['filter_mode']
+    cutoff, order = params['cutoff'], params['order']
+    center_freq, bandwidth = params['center_freq'], params['bandwidth']
+    precision, auto_params, include = params['precision'], params['auto_params'], params['include']
+    image, image_id = params['image'], params['image_id']
+    timer = params['timer']
+    
+    print(f"Processing image with filter_type={filter_type}, filter_mode={filter_mode}, cutoff={cutoff}")
+    # Chế độ xem trước: xử lý trên ảnh thu nhỏ, tham số tần số quy đổi theo lưới mới.
+    # Kết quả đầy đủ lấy bằng request tiếp theo với cùng image_id, không gửi preview_*
+    preview = None
+    work_image, work_id = image, image_id
+    if params['preview_scale'] or params['max_preview_pixels']:
+        small_shape = preview_shape(image.shape, params['preview_scale'], params['max_preview_pixels'])
+        if small_shape != image.shape[:2]:
+            enter_stage('preview')
+            with timed(timer, 'preview'):
+                work_image, work_id = get_preview_image(image, image_id, small_shape)
+            factor = frequency_scale(image.shape, small_shape, params['fft_planner'])
+            cutoff *= factor
+            center_freq = center_freq * factor if center_freq is not None else None
+            bandwidth = bandwidth * factor if bandwidth is not None else None
+            preview = {
+                'shape': list(small_shape),
+                'source_shape': list(image.shape[:2]),
+                'frequency_scale': factor
+            }
+    
+    processor = ImageProcessor()
+    processor.stage_hook = stage_hook
+    processor.timer = timer
+    processor.load_image_from_array(work_image, digest=work_id, copy=False)
+    
+    # Tìm tham số tự động trên proxy của phổ đã cache
+    auto_result = None
+    if auto_params:
+        reference = params['reference']
+        if preview is not None and reference is not None and reference.shape == image.shape:
+            reference = cv2.resize(reference, (work_image.shape[1], work_image.shape[0]),
+                                   interpolation=cv2.INTER_AREA)
+        auto_result = processor.optimize_parameters(
+            auto_params, filter_type=filter_type, filter_mode=filter_mode,
+            cutoff=cutoff, order=order, center_freq=center_freq, bandwidth=bandwidth,
+            reference=reference, objective=params['auto_objective'], precision=precision,
+            pad_mode=params['pad_mode'], fft_planner=params['fft_planner']
+        )
+        if auto_result['at_bound']:
+            print(f"Tham số auto nằm ở cận khoảng tìm kiếm: {', '.join(auto_result['at_bound'])}")
+        cutoff = auto_result['params']['cutoff']
+        center_freq = auto_result['params']['center_freq']
+        bandwidth = auto_result['params']['bandwidth']
+        if preview is not None:
+            # Báo cáo tham số theo đơn vị của ảnh gốc để dùng lại cho bản đầy đủ
+            for found in [auto_result['params']] + [point['params'] for point in auto_result['points']]:
+                for name in AUTO_PARAMS:
+                    if found.get(name) is not None:
+                        found[name] = found[name] / preview['frequency_scale']
+            auto_result['bounds'] = {
+                name: [bound / preview['frequency_scale'] for bound in bounds]
+                for name, bounds in auto_result['bounds'].items()
+            }
+            auto_result['nyquist'] = auto_result['nyquist'] / preview['frequency_scale']
+    
+    # Chế độ tile: bắt buộc (tiled=1) hoặc khi ước lượng bộ nhớ nguyên khối vượt ngân sách
+    # (tile luôn pad 0 trên lưới next_fast_len, không theo pad_mode/fft_planner)
+    use_tiles = params['tiled'] == '1' or (
+        params['tiled'] == 'auto' and not auto_params and filter_type != 'ideal'
+        and params['pad_mode'] == 'zero' and params['fft_planner'] in (None, 'fast')
+        and estimate_monolithic_bytes(work_image.shape, PRECISIONS[precision]().itemsize) > params['tile_memory']
+    )
+    if use_tiles and params['tiled'] == 'auto':
+        # 'auto' không báo lỗi khi không có tile nào vừa ngân sách (viền kernel quá lớn):
+        # xử lý nguyên khối như khi không bật tile
+        try:
+            plan_image_tiles(work_image.shape, filter_type, filter_mode, cutoff, order, center_freq,
+                             bandwidth, PRECISIONS[precision], params['tile_memory'])
+        except ValueError as e:
+            print(f"Không dùng được chế độ tile, xử lý nguyên khối: {e}")
+            use_tiles = False
+    if use_tiles:
+        spectral = [name for name in ('magnitude_spectrum', 'filter_mask') if name in include]
+        if spectral and params['include_given']:
+            raise ValueError(f'Chế độ tile không tạo được: {", ".join(spectral)}')
+        include = [name for name in include if name not in spectral]
+    
+    # Xử lý ảnh
+    
+    metrics_level = params['metrics_level']
+    if metrics_level is None:
+        metrics_level = 'full' if preview is None or params['preview_metrics'] else 'none'
+    print("Starting image processing...")
+    process_kwargs = dict(
+        filter_type=filter_type,
+        filter_mode=filter_mode,
+        cutoff=cutoff,
+        order=order,
+        center_freq=center_freq,
+        bandwidth=bandwidth,
+        precision=precision,
+        metrics_level=metrics_level
+    )
+    if use_tiles:
+        processed_image = processor.process_image_tiled(memory_budget=params['tile_memory'], **process_kwargs)
     else:
-        pil_image = Image.fromarray(image_rgb, mode='RGB')
+        processed_image = processor.process_image(pad_mode=params['pad_mode'], fft_planner=params['fft_planner'],
+                                                  **process_kwargs)
+    print("Image processing completed")
+    if isinstance(timer, MemoryProfiler) and processor.fft_plan is not None:
+        timer.estimate = estimate_process_memory(work_image.shape, precision, metrics_level=metrics_level,
+                                                 fft_shape=processor.fft_plan.shape)
+    
+    response = {
+        'success': True,
+        'metrics': processor.get_metrics(),
+        'precision': precision,
+        'image_id': image_id,
+        'spectrum_cache_hit': processor.spectrum_cache_hit
+    }
+    if auto_result is not None:
+        response['auto'] = auto_result
+    if preview is not None:
+        response['preview'] = preview
+    if processor.tiling is not None:
+        response['tiling'] = processor.tiling
+    if processor.fft_plan is not None:
+        response['fft_plan'] = processor.fft_plan.to_dict()
+    if params['precision_report']:
+        enter_stage('precision')
+        with timed(timer, 'precision'):
+            response['precision_error'] = precision_error(
+                work_image, filter_type=filter_type, filter_mode=filter_mode, cutoff=cutoff,
+                order=order, center_freq=center_freq, bandwidth=bandwidth,
+                pad_mode=params['pad_mode'], fft_planner=params['fft_planner']
+            )
     
-    # Chuyển sang base64
-    buffered = BytesIO()
-    pil_image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+    # Chỉ tạo và mã hóa các ảnh được yêu cầu (phổ và mặt nạ tính khi cần)
+    artifact_sources = {
+        'original_image': lambda: work_image,
+        'processed_image': lambda: processed_image,
+        'magnitude_spectrum': processor.get_magnitude_spectrum_image,
+        'filter_mask': processor.get_filter_mask_image,
+    }
+    artifacts = {}
+    response['encoding'] = {}
+    if include:
+        enter_stage('encode')
+    for name in include:
+        with timed(timer, f'encode_{name}'):
+            data, mimetype, info = encode_image(artifact_sources[name](), *params['encodings'][name])
+        artifacts[name] = (data, mimetype)
+        response['encoding'][name] = info
+    response['timings'] = timer.to_dict()
+    return response, artifacts
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'ok', 'message': 'Server đang hoạt động'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'Server đang hoạt động',
+        'caches': {
+            'mask': MASK_CACHE.stats(),
+            'spectrum': SPECTRUM_CACHE.stats(),
+            'image': IMAGE_STORE.stats(),
+            'artifact': ARTIFACT_STORE.stats(),
+            'workspace': WORKSPACE_POOL.stats()
+        },
+        'jobs': JOB_MANAGER.stats()
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Thống kê cho Prometheus (text format 0.0.4): histogram thời gian từng bước xử lý
+    (fourier_stage_seconds) và từng request, số request theo mã trạng thái, số request
+    đang xử lý, hit/miss của các cache và số job theo trạng thái
+    """
+    jobs = JOB_MANAGER.stats()
+    extra = render_cache_stats([
+        MASK_CACHE.stats(), SPECTRUM_CACHE.stats(), IMAGE_STORE.stats(),
+        ARTIFACT_STORE.stats(), WORKSPACE_POOL.stats()
+    ])
+    extra += render_gauges('fourier_workspace_in_use', 'Số bộ đệm workspace đang được mượn',
+                           'pool', {WORKSPACE_POOL.name: WORKSPACE_POOL.stats()['in_use']})
+    extra += render_gauges('fourier_jobs', 'Số job theo trạng thái', 'status',
+                           {status: jobs[status] for status in JOB_STATUSES})
+    extra += render_gauges('fourier_job_capacity', 'Giới hạn của pool job', 'kind',
+                           {'workers': jobs['workers'], 'max_jobs': jobs['max_jobs']})
+    return Response(render_prometheus(extra), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/api/process', methods=['POST'])
@@ -74,120 +701,274 @@ def process_image():
     
     Request body:
     - image: base64 encoded image hoặc file upload
+    - image_id: mã ảnh trả về từ /api/upload hoặc /api/process trước đó
+      (thay cho image, không cần gửi lại ảnh)
     - filter_type: 'ideal', 'butterworth', 'gaussian'
     - filter_mode: 'lowpass', 'highpass', 'bandreject'
     - cutoff: float (tần số cắt)
     - order: int (bậc bộ lọc, mặc định 2)
     - center_freq: float (cho band-reject, optional)
     - bandwidth: float (cho band-reject, optional)
+    - precision: 'float32' (mặc định) hoặc 'float64'
+    - precision_report: '1' để trả thêm sai số float32 so với float64
+    - cutoff / center_freq / bandwidth = 'auto': tự tìm giá trị tối ưu trên phổ đã cache
+      (xem ImageProcessor.optimize_parameters); kết quả tìm kiếm trả về trong 'auto'
+      (at_bound liệt kê tham số nằm ở cận khoảng tìm kiếm 'bounds' - không phải tối ưu
+      thực sự; với ảnh xem trước, bounds và nyquist là của ảnh xem trước, quy về đơn vị ảnh gốc)
+    - reference / reference_id: ảnh tham chiếu (file upload hoặc mã ảnh) cho chế độ auto
+    - auto_objective: 'psnr', 'ssim' (cần ảnh tham chiếu) hoặc 'noref'
+    - include: các ảnh cần trả về, phân cách bằng dấu phẩy (original_image,
+      processed_image, magnitude_spectrum, filter_mask); mặc định tất cả, rỗng = chỉ metrics
+    - response_format: 'json' (ảnh base64 trong JSON, mặc định), 'url' (JSON chứa
+      đường dẫn /api/artifacts/<id>) hoặc 'multipart' (multipart/mixed: phần đầu là
+      JSON, mỗi ảnh là một phần nhị phân)
+    - encoding / encoding_<tên ảnh>: định dạng mã hóa ('png:1', 'jpeg:85', 'webp:80', ...);
+      mặc định xem DEFAULT_ENCODINGS. Thời gian mã hóa và số byte trả về trong 'encoding'
+    - preview_scale: tỷ lệ thu nhỏ (0, 1] / max_preview_pixels: số pixel tối đa - xử lý
+      nhanh trên ảnh thu nhỏ (tham số tần số tự quy đổi, thông tin trong 'preview');
+      metrics bỏ qua trừ khi preview_metrics='1'. Bản đầy đủ: gửi lại image_id không kèm preview_*
+    - metrics: 'full' (MSE, PSNR, SSIM - mặc định), 'cheap' (MSE, PSNR; bỏ SSIM tốn kém
+      nhất) hoặc 'none'; mặc định 'none' với ảnh xem trước
+    - tiled: '1' xử lý theo tile (overlap-save) trong giới hạn bộ nhớ, 'auto' chỉ khi ước
+      lượng bộ nhớ vượt ngân sách và có tile vừa ngân sách, '0' (mặc định) nguyên khối;
+      tile_memory_mb: ngân sách (MB).
+      Không có magnitude_spectrum/filter_mask; thông tin tile trả về trong 'tiling'.
+      Tile chỉ dùng pad_mode=zero và fft_planner=fast ('1' báo lỗi 400 với giá trị khác,
+      'auto' xử lý nguyên khối)
     """
     print("=== Received /api/process request ===")
     print(f"Content-Type: {request.content_type}")
     print(f"Has files: {'image' in request.files}")
     print(f"Has json: {request.is_json}")
     try:
-        # Lấy tham số
-        filter_type = request.form.get('filter_type', 'gaussian').lower()
-        filter_mode = request.form.get('filter_mode', 'lowpass').lower()
-        cutoff = float(request.form.get('cutoff', 50.0))
-        order = int(request.form.get('order', 2))
-        center_freq = request.form.get('center_freq')
-        bandwidth = request.form.get('bandwidth')
-        
-        center_freq = float(center_freq) if center_freq else None
-        bandwidth = float(bandwidth) if bandwidth else None
+        params, error = parse_process_request()
+        if error is not None:
+            return jsonify({'error': error[0]}), error[1]
+        try:
+            response, artifacts = run_process(params)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return artifact_response(response, artifacts, params['response_format'])
+    
+    except Exception as e:
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Error in process_image: {str(e)}")
+        print(f"Traceback: {error_trace}")
+        return jsonify({'error': f'Lỗi xử lý: {str(e)}'}), 500
+
+
+@app.route('/api/sweep', methods=['POST'])
+def sweep_parameters():
+    """
+    Quét nhiều bộ tham số lọc trên một ảnh: FFT thuận một lần, IFFT theo batch,
+    chỉ trả về metrics cho từng bộ tham số (và ảnh thu nhỏ nếu yêu cầu)
+    
+    Request body (form hoặc JSON):
+    - image / image_id: như /api/process
+    - filter_type, filter_mode, cutoff, order, center_freq, bandwidth: tham số
+      mặc định cho mọi bộ tham số
+    - params: danh sách bộ tham số (JSON list các dict), mỗi dict ghi đè tham số mặc định
+    - hoặc khoảng cutoff: cutoff_start, cutoff_stop (bao gồm), cutoff_step;
+      kết hợp với orders ('1,2,4') nếu muốn quét cả bậc bộ lọc
+    - precision: 'float32' (mặc định) hoặc 'float64'
+    - thumbnail_size: cạnh dài của ảnh thu nhỏ (0 = không trả ảnh, mặc định)
+    - metrics: 'full' (mặc định) hoặc 'cheap' (chỉ MSE, PSNR - nhanh hơn nhiều khi quét dày)
+    """
+    try:
+        json_body = request.get_json(silent=True) or {}
         
-        # Validate tham số
-        is_valid, error_msg = validate_processing_params(
-            filter_type, filter_mode, cutoff, order, center_freq, bandwidth
-        )
-        if not is_valid:
-            return jsonify({'error': error_msg}), 400
+        def get_param(name, default=None):
+            value = request.form.get(name)
+            if value is None:
+                value = json_body.get(name, default)
+            return value
         
-        # Lấy ảnh từ request
-        image_data = None
+        base = {
+            'filter_type': str(get_param('filter_type', 'gaussian')).lower(),
+            'filter_mode': str(get_param('filter_mode', 'lowpass')).lower(),
+            'cutoff': float(get_param('cutoff', 50.0)),
+            'order': int(get_param('order', 2)),
+            'center_freq': float(get_param('center_freq')) if get_param('center_freq') else None,
+            'bandwidth': float(get_param('bandwidth')) if get_param('bandwidth') else None,
+        }
+        precision = str(get_param('precision', 'float32')).lower()
+        thumbnail_size = int(get_param('thumbnail_size', 0))
+        metrics_level = str(get_param('metrics', 'full')).lower()
+        if not validate_precision(precision):
+            return jsonify({'error': f'Độ chính xác không hợp lệ: {precision}'}), 400
+        if metrics_level not in ('cheap', 'full'):
+            return jsonify({'error': "metrics chỉ nhận: cheap, full"}), 400
+        if thumbnail_size < 0 or thumbnail_size > MAX_SWEEP_THUMBNAIL:
+            return jsonify({'error': f'thumbnail_size phải trong khoảng 0 - {MAX_SWEEP_THUMBNAIL}'}), 400
         
-        # Thử lấy từ file upload
-        if 'image' in request.files:
-            print("Reading image from file upload...")
-            file = request.files['image']
-            if file and file.filename:  # Có filename
-                if not allowed_file(file.filename):
-                    return jsonify({'error': 'Định dạng file không được phép'}), 400
-            # Đọc ảnh từ file (có thể không có filename nếu là blob)
-            file_bytes = file.read()
-            print(f"File size: {len(file_bytes)} bytes")
-            if len(file_bytes) == 0:
-                return jsonify({'error': 'File rỗng'}), 400
-            nparr = np.frombuffer(file_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if image is None:
-                return jsonify({'error': 'Không thể đọc ảnh từ file. Có thể file không phải là ảnh hợp lệ.'}), 400
-            print(f"Image decoded successfully. Shape: {image.shape}")
+        # Danh sách bộ tham số: liệt kê trực tiếp hoặc sinh từ khoảng cutoff
+        params = get_param('params')
+        if isinstance(params, str):
+            params = json.loads(params)
+        if params is None:
+            if get_param('cutoff_start') is None or get_param('cutoff_stop') is None:
+                return jsonify({'error': 'Cần params hoặc cutoff_start/cutoff_stop'}), 400
+            start = float(get_param('cutoff_start'))
+            stop = float(get_param('cutoff_stop'))
+            step = float(get_param('cutoff_step', 5.0))
+            if step <= 0 or stop < start:
+                return jsonify({'error': 'Khoảng cutoff không hợp lệ'}), 400
+            if (stop - start) / step + 1 > MAX_SWEEP_SETTINGS:
+                return jsonify({'error': f'Tối đa {MAX_SWEEP_SETTINGS} bộ tham số mỗi lần quét'}), 400
+            cutoffs = np.arange(start, stop + step * 1e-6, step)
+            orders = get_param('orders')
+            orders = [int(o) for o in str(orders).split(',')] if orders else [base['order']]
+            params = [{'cutoff': round(float(c), 6), 'order': o} for o in orders for c in cutoffs]
+        if not isinstance(params, list) or not params:
+            return jsonify({'error': 'params phải là danh sách không rỗng'}), 400
+        if len(params) > MAX_SWEEP_SETTINGS:
+            return jsonify({'error': f'Tối đa {MAX_SWEEP_SETTINGS} bộ tham số mỗi lần quét'}), 400
         
-        # Thử lấy từ base64
-        elif 'image' in request.json:
-            image_base64 = request.json['image']
-            if image_base64.startswith('data:image'):
-                # Bỏ qua data URL prefix
-                image_base64 = image_base64.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_base64)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if image is None:
-                return jsonify({'error': 'Không thể đọc ảnh từ base64'}), 400
+        # Ghép với tham số mặc định và validate từng bộ
+        param_sets = []
+        for item in params:
+            if not isinstance(item, dict) or not set(item) <= set(base):
+                return jsonify({'error': f'Bộ tham số không hợp lệ: {item}'}), 400
+            merged = {**base, **item}
+            merged['filter_type'] = str(merged['filter_type']).lower()
+            merged['filter_mode'] = str(merged['filter_mode']).lower()
+            merged['cutoff'] = float(merged['cutoff'])
+            merged['order'] = int(merged['order'])
+            is_valid, error_msg = validate_processing_params(
+                merged['filter_type'], merged['filter_mode'], merged['cutoff'],
+                merged['order'], merged['center_freq'], merged['bandwidth']
+            )
+            if not is_valid:
+                return jsonify({'error': f'{error_msg} ({item})'}), 400
+            param_sets.append(merged)
         
-        else:
-            return jsonify({'error': 'Không tìm thấy ảnh trong request'}), 400
+        # Lấy ảnh từ request (image_id, file upload hoặc base64)
+        image, image_id, error = get_request_image()
+        if error is not None:
+            return jsonify({'error': error[0]}), error[1]
         
-        # Xử lý ảnh
-        print(f"Processing image with filter_type={filter_type}, filter_mode={filter_mode}, cutoff={cutoff}")
         processor = ImageProcessor()
-        processor.load_image_from_array(image)
-        
-        print("Starting image processing...")
-        processed_image = processor.process_image(
-            filter_type=filter_type,
-            filter_mode=filter_mode,
-            cutoff=cutoff,
-            order=order,
-            center_freq=center_freq,
-            bandwidth=bandwidth
+        processor.load_image_from_array(image, digest=image_id, copy=False)
+        results = processor.sweep(
+            param_sets, precision=precision, thumbnail_size=thumbnail_size or None,
+            metrics_level=metrics_level
         )
-        print("Image processing completed")
-        
-        # Lấy các thông tin bổ sung
-        magnitude_spectrum = processor.get_magnitude_spectrum_image()
-        filter_mask = processor.get_filter_mask_image()
-        metrics = processor.get_metrics()
-        
-        # Chuyển đổi sang base64
-        original_base64 = image_to_base64(image)
-        processed_base64 = image_to_base64(processed_image)
-        magnitude_base64 = image_to_base64(magnitude_spectrum)
-        mask_base64 = image_to_base64(filter_mask)
+        for entry in results:
+            if 'thumbnail' in entry:
+                entry['thumbnail'] = image_to_base64(entry['thumbnail'], 'jpeg:85')
         
         return jsonify({
             'success': True,
-            'original_image': original_base64,
-            'processed_image': processed_base64,
-            'magnitude_spectrum': magnitude_base64,
-            'filter_mask': mask_base64,
-            'metrics': metrics
+            'image_id': image_id,
+            'precision': precision,
+            'spectrum_cache_hit': processor.spectrum_cache_hit,
+            'count': len(results),
+            'results': results
         })
     
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        return jsonify({'error': f'Tham số không hợp lệ: {str(e)}'}), 400
     except Exception as e:
         import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in process_image: {str(e)}")
-        print(f"Traceback: {error_trace}")
+        print(f"Error in sweep_parameters: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({'error': f'Lỗi xử lý: {str(e)}'}), 500
+
+
+@app.route('/api/artifacts/<artifact_id>', methods=['GET'])
+def get_artifact(artifact_id):
+    """Tải ảnh kết quả đã lưu tạm bởi /api/process?response_format=url"""
+    artifact = ARTIFACT_STORE.get(artifact_id)
+    if artifact is None:
+        return jsonify({'error': 'Không tìm thấy ảnh kết quả hoặc đã hết hạn'}), 404
+    data, mimetype = artifact
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={int(ARTIFACT_STORE.ttl)}'
+    return response
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Xử lý ảnh bất đồng bộ: nhận cùng tham số với /api/process, đưa vào hàng đợi và
+    trả về ngay (202) job_id; theo dõi tiến độ và lấy kết quả qua /api/jobs/<job_id>
+    
+    Cách trả ảnh chọn khi lấy kết quả (response_format của /api/jobs/<job_id>)
+    """
+    try:
+        params, error = parse_process_request()
+        if error is not None:
+            return jsonify({'error': error[0]}), error[1]
+        job = JOB_MANAGER.submit(lambda job: run_process(params, stage_hook=job.enter_stage))
+        if job is None:
+            return jsonify({'error': 'Hàng đợi xử lý đã đầy, hãy thử lại sau'}), 503
+        info = job.to_dict()
+        info['status_url'] = url_for('get_job', job_id=job.id)
+        return jsonify(info), 202
+    
+    except Exception as e:
         return jsonify({'error': f'Lỗi xử lý: {str(e)}'}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Trạng thái job: status ('queued', 'running', 'done', 'failed', 'cancelled'),
+    stage (bước hiện tại), progress (0 - 1), timings (ms theo từng bước);
+    khi status = 'done' có thêm result (cùng dạng response của /api/process)
+    
+    Query: response_format = 'json' (ảnh base64 trong result, mặc định) hoặc 'url'
+    (đường dẫn /api/jobs/<job_id>/artifacts/<tên ảnh>)
+    """
+    response_format = request.args.get('response_format', 'json').lower()
+    if response_format not in ('json', 'url'):
+        return jsonify({'error': f'response_format không hợp lệ: {response_format}'}), 400
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job hoặc kết quả đã hết hạn'}), 404
+    info = job.to_dict()
+    if job.status == 'done':
+        result = dict(job.result)
+        for name, (data, mimetype) in job.artifacts.items():
+            if response_format == 'url':
+                result[name] = url_for('get_job_artifact', job_id=job.id, name=name)
+            else:
+                result[name] = to_data_url(data, mimetype)
+        info['result'] = result
+    elif job.status == 'failed':
+        info['error_status'] = job.error_status
+    return jsonify(info)
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Hủy job: job đang chờ hủy ngay, job đang chạy dừng ở bước kế tiếp"""
+    job = JOB_MANAGER.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy job hoặc kết quả đã hết hạn'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/artifacts/<name>', methods=['GET'])
+def get_job_artifact(job_id, name):
+    """Tải một ảnh kết quả của job đã hoàn thành"""
+    job = JOB_MANAGER.get(job_id)
+    if job is None or name not in job.artifacts:
+        return jsonify({'error': 'Không tìm thấy ảnh kết quả hoặc đã hết hạn'}), 404
+    data, mimetype = job.artifacts[name]
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={int(JOB_MANAGER.ttl)}'
+    return response
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_image():
-    """Upload ảnh lên server"""
+    """
+    Upload ảnh lên server
+    Ảnh đã giải mã được giữ trong IMAGE_STORE; image_id trong response dùng
+    cho /api/process thay vì gửi lại ảnh ở mỗi lần xử lý
+    """
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'Không có file ảnh'}), 400
@@ -203,12 +984,14 @@ def upload_image():
             
             # Đọc ảnh để trả về preview
             image = read_image(filepath)
+            image_id = store_image(image)
             image_base64 = image_to_base64(image)
             
             return jsonify({
                 'success': True,
                 'filename': filename,
                 'filepath': filepath,
+                'image_id': image_id,
                 'preview': image_base64
             })
         else:
@@ -0,0 +1,11 @@
+"""
+Benchmark đường xử lý ảnh trên ảnh phong cảnh nhiễu tổng hợp (xem __main__.py)
+"""
+
+from .landscape import RESOLUTIONS, MODES, generate_landscape
+from .suite import run_suite, compare_results, time_call
+
+__all__ = [
+    'RESOLUTIONS', 'MODES', 'generate_landscape',
+    'run_suite', 'compare_results', 'time_call',
+]
@@ -0,0 +1,107 @@
+"""
+Chạy và so sánh benchmark (từ thư mục backend)
+
+    python -m benchmarks run --resolutions 1mp,12mp --output results/bench-before.json
+    python -m benchmarks compare results/bench-before.json results/bench-after.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+from .landscape import MODES, RESOLUTIONS
+from .suite import case_names, compare_results, run_suite
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+
+def run_command(args) -> int:
+    def progress(name, timing):
+        print(f"{name:55s} {timing['median_ms']:10.2f} ms (min {timing['min_ms']:.2f})", flush=True)
+    
+    try:
+        report = run_suite(_split(args.resolutions), _split(args.modes), _split(args.cases),
+                           args.repeats, args.warmup, args.seed, progress)
+    except ValueError as e:
+        print(f"Lỗi: {e}", file=sys.stderr)
+        return 2
+    if not report['results']:
+        print(f"Không có trường hợp nào khớp --cases; các trường hợp: {', '.join(case_names())}",
+              file=sys.stderr)
+        return 2
+    
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Đã ghi {len(report['results'])} kết quả vào {args.output}")
+    return 0
+
+
+def compare_command(args) -> int:
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    report = compare_results(baseline, current, args.threshold, args.stat, args.min_ms)
+    
+    for key, (before, after) in report['environment_changes'].items():
+        print(f"Cảnh báo: môi trường khác nhau - {key}: {before} -> {after}")
+    print(f"{'trường hợp':55s} {'baseline':>10s} {'hiện tại':>10s} {'tỉ lệ':>7s}  ({args.stat})")
+    for row in report['rows']:
+        marker = {'regression': '  CHẬM HƠN', 'improvement': '  nhanh hơn'}.get(row['status'], '')
+        print(f"{row['name']:55s} {row['baseline']:10.2f} {row['current']:10.2f} {row['ratio']:7.3f}{marker}")
+    for name in report['missing']:
+        print(f"Thiếu trong lần chạy hiện tại: {name}")
+    for name in report['added']:
+        print(f"Mới (không có baseline): {name}")
+    
+    if report['regressions']:
+        print(f"{len(report['regressions'])} trường hợp chậm hơn quá {args.threshold:.0%}")
+        return 1
+    print(f"Không có hồi quy vượt ngưỡng {args.threshold:.0%}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark đường xử lý ảnh Fourier trên ảnh phong cảnh tổng hợp')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run = commands.add_parser('run', help='Chạy benchmark và ghi kết quả JSON')
+    run.add_argument('--resolutions', default=None,
+                     help=f"Danh sách độ phân giải, cách nhau bởi dấu phẩy ({', '.join(RESOLUTIONS)}); mặc định tất cả")
+    run.add_argument('--modes', default=None, help=f"Chế độ màu ({', '.join(MODES)}); mặc định cả hai")
+    run.add_argument('--cases', default=None,
+                     help="Mẫu tên trường hợp (fnmatch), ví dụ 'fft2d,create_filter_mask*'; mặc định tất cả")
+    run.add_argument('--repeats', type=int, default=5, help='Số lần đo mỗi trường hợp')
+    run.add_argument('--warmup', type=int, default=1, help='Số lần chạy khởi động không tính thời gian')
+    run.add_argument('--seed', type=int, default=0, help='Seed sinh ảnh tổng hợp')
+    run.add_argument('--output', default='results/benchmark.json', help='File JSON kết quả')
+    run.set_defaults(handler=run_command)
+    
+    compare = commands.add_parser('compare', help='So sánh hai file kết quả, mã thoát 1 nếu có hồi quy')
+    compare.add_argument('baseline', help='Kết quả trước khi thay đổi')
+    compare.add_argument('current', help='Kết quả sau khi thay đổi')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help='Tỉ lệ chậm đi tối đa cho phép (0.10 = 10%%)')
+    compare.add_argument('--stat', default='median_ms', choices=('median_ms', 'min_ms', 'mean_ms'),
+                         help='Thống kê dùng để so sánh')
+    compare.add_argument('--min-ms', type=float, default=1.0,
+                         help='Bỏ qua các trường hợp nhanh hơn ngưỡng này ở baseline (nhiễu đo)')
+    compare.set_defaults(handler=compare_command)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Sinh ảnh phong cảnh nhiễu tổng hợp cho benchmark (tái lập được theo seed)
+
+Ảnh gồm bầu trời chuyển màu, ba lớp núi có đường sườn ngẫu nhiên, kết cấu tần
+số thấp, nhiễu Gaussian và nhiễu tuần hoàn (sọc) - đủ các thành phần mà bộ lọc
+low-pass/high-pass/band-reject của ứng dụng xử lý.
+"""
+
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+# Độ phân giải benchmark (H, W) theo tỉ lệ 4:3/3:2 của cảm biến máy ảnh
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    '1mp': (864, 1152),
+    '12mp': (3000, 4000),
+    '24mp': (4000, 6000),
+    '40mp': (5184, 7776),
+}
+MODES = ('gray', 'rgb')
+
+# Màu (BGR) của bầu trời (đỉnh, chân trời) và các lớp núi từ xa đến gần
+_SKY = ((235, 180, 120), (250, 225, 200))
+_LAYERS = ((170, 150, 140), (110, 120, 90), (50, 80, 40))
+
+
+def _ridge(width: int, base: float, amplitude: float, rng: np.random.Generator) -> np.ndarray:
+    """Đường sườn núi: tổng các sóng sin với biên độ giảm dần theo tần số"""
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)
+    ridge = np.full(width, base, dtype=np.float32)
+    for octave in range(1, 7):
+        frequency = 2.0 ** octave * rng.uniform(0.5, 1.5)
+        phase = rng.uniform(0.0, 2.0 * np.pi)
+        ridge += amplitude / octave * np.sin(2.0 * np.pi * frequency * x + phase).astype(np.float32)
+    return ridge
+
+
+def generate_landscape(height: int, width: int, channels: int = 3, noise_sigma: float = 12.0,
+                       stripe_amplitude: float = 8.0, seed: int = 0) -> np.ndarray:
+    """
+    Tạo ảnh phong cảnh nhiễu tổng hợp
+    
+    Args:
+        height: Chiều cao ảnh
+        width: Chiều rộng ảnh
+        channels: 3 (BGR) hoặc 1 (ảnh xám 2D)
+        noise_sigma: Độ lệch chuẩn nhiễu Gaussian (mức xám)
+        stripe_amplitude: Biên độ nhiễu tuần hoàn dạng sọc chéo (mức xám)
+        seed: Seed của bộ sinh số ngẫu nhiên
+        
+    Returns:
+        Ảnh uint8 (H, W, 3) hoặc (H, W)
+    """
+    if channels not in (1, 3):
+        raise ValueError(f"Số kênh phải là 1 hoặc 3: {channels}")
+    rng = np.random.default_rng(seed)
+    rows = np.arange(height, dtype=np.float32)[:, np.newaxis]
+    
+    # Bầu trời chuyển màu theo chiều dọc
+    t = rows / np.float32(max(height - 1, 1))
+    image = np.empty((height, width, 3), dtype=np.float32)
+    for c in range(3):
+        image[..., c] = _SKY[0][c] + (_SKY[1][c] - _SKY[0][c]) * t
+    
+    # Các lớp núi: pixel nằm dưới đường sườn lấy màu của lớp
+    for index, color in enumerate(_LAYERS):
+        ridge = _ridge(width, height * (0.35 + 0.18 * index), height * 0.08, rng)
+        below = rows >= ridge[np.newaxis, :]
+        for c in range(3):
+            np.copyto(image[..., c], np.float32(color[c]), where=below)
+    
+    # Kết cấu tần số thấp (cỏ, đá): nhiễu độ phân giải thấp phóng to
+    coarse = rng.standard_normal((max(height // 64, 2), max(width // 64, 2)), dtype=np.float32)
+    texture = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC) * np.float32(10.0)
+    # Nhiễu tuần hoàn dạng sọc chéo (tạo đỉnh phổ cho band-reject)
+    columns = np.arange(width, dtype=np.float32)[np.newaxis, :]
+    stripes = np.float32(stripe_amplitude) * np.sin(np.float32(2.0 * np.pi / 16.0) * (rows + columns))
+    texture += stripes
+    del stripes
+    
+    # Nhiễu Gaussian từng kênh (tránh tạo mảng nhiễu H×W×3 cùng lúc)
+    output = np.empty((height, width, 3), dtype=np.uint8)
+    for c in range(3):
+        channel = image[..., c]
+        channel += texture
+        channel += rng.standard_normal((height, width), dtype=np.float32) * np.float32(noise_sigma)
+        np.clip(channel, 0.0, 255.0, out=channel)
+        output[..., c] = channel
+    if channels == 1:
+        return cv2.cvtColor(output, cv2.COLOR_BGR2GRAY)
+    return output
@@ -0,0 +1,329 @@
+"""
+Các trường hợp benchmark của đường xử lý chính (giải mã -> FFT -> lọc -> IFFT ->
+metrics -> mã hóa -> /api/process) và so sánh hai lần chạy
+"""
+
+import contextlib
+import fnmatch
+import io
+import os
+import platform
+import statistics
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import scipy
+
+from core.cache import IMAGE_STORE, SPECTRUM_CACHE
+from core.filters import create_filter_mask
+from core.fourier_transform import (
+    fft2d, ifft2d, rfft2d, irfft2d, apply_filter, get_fft_backend,
+)
+from core.image_processor import ImageProcessor
+from core.metrics import calculate_all_metrics
+
+from .landscape import MODES, RESOLUTIONS, generate_landscape
+
+
+FILTER_TYPES = ('ideal', 'butterworth', 'gaussian')
+FILTER_MODES = ('lowpass', 'highpass', 'bandreject')
+# Tham số bộ lọc dùng chung cho các trường hợp (mặc định của frontend là r=20)
+CUTOFF = 20.0
+CENTER_FREQ = 80.0
+BANDWIDTH = 20.0
+
+# (tên, hàm tạo) - hàm tạo nhận dữ liệu của nhóm (ảnh, ...) và trả về hàm cần đo
+Case = Tuple[str, Callable[[Dict], Callable[[], object]]]
+
+
+def _normalized(image: np.ndarray) -> np.ndarray:
+    """Ảnh float32 [0, 1] như đầu vào FFT của ImageProcessor (kích thước benchmark đã là next_fast_len)"""
+    return image.astype(np.float32) / np.float32(255.0)
+
+
+def _half_mask(shape: Tuple[int, int], filter_type: str = 'gaussian', filter_mode: str = 'lowpass'):
+    return create_filter_mask(shape[0], shape[1], filter_type, filter_mode, CUTOFF,
+                              center_freq=CENTER_FREQ, bandwidth=BANDWIDTH,
+                              half=True, dtype=np.float32, centered=False)
+
+
+def _fft2d_case(data):
+    image = _normalized(data['image'])
+    return lambda: fft2d(image, shift=False)
+
+
+def _ifft2d_case(data):
+    spectrum = fft2d(_normalized(data['image']), shift=False)
+    return lambda: ifft2d(spectrum, shift=False)
+
+
+def _rfft2d_case(data):
+    image = _normalized(data['image'])
+    return lambda: rfft2d(image, shift=False)
+
+
+def _irfft2d_case(data):
+    spectrum = rfft2d(_normalized(data['image']), shift=False)
+    width = data['image'].shape[1]
+    return lambda: irfft2d(spectrum, width, shift=False)
+
+
+def _apply_filter_case(data):
+    spectrum = rfft2d(_normalized(data['image']), shift=False)
+    mask = _half_mask(data['image'].shape[:2])
+    out = np.empty_like(spectrum)
+    return lambda: apply_filter(spectrum, mask, out=out)
+
+
+def _decode_case(data):
+    from app import decode_image_bytes
+    return lambda: decode_image_bytes(data['jpeg'])
+
+
+def _process_image_case(use_spectrum_cache: bool):
+    def build(data):
+        processor = ImageProcessor()
+        processor.load_image_from_array(data['image'])
+        return lambda: processor.process_image(cutoff=CUTOFF, metrics_level='none',
+                                               use_spectrum_cache=use_spectrum_cache)
+    return build
+
+
+def _metrics_case(level: str):
+    def build(data):
+        processed = data['processed']
+        return lambda: calculate_all_metrics(data['image'], processed, max_value=255.0, level=level)
+    return build
+
+
+def _base64_case(encoding: str):
+    def build(data):
+        from app import image_to_base64
+        processed = data['processed']
+        return lambda: image_to_base64(processed, encoding)
+    return build
+
+
+def _api_process_case(data):
+    from app import app
+    # Ảnh 40 MP nhiễu vượt giới hạn upload mặc định (16 MB) của app
+    app.config['MAX_CONTENT_LENGTH'] = None
+    client = app.test_client()
+    
+    def run():
+        # Bỏ phổ đã cache để đo đủ FFT thuận như request đầu tiên của một ảnh
+        SPECTRUM_CACHE.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post('/api/process', data={
+                'image': (io.BytesIO(data['jpeg']), 'landscape.jpg'),
+                'filter_type': 'gaussian',
+                'cutoff': str(CUTOFF),
+            }, content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/process lỗi {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+    return run
+
+
+# Các trường hợp chạy cho từng (độ phân giải, chế độ màu)
+IMAGE_CASES: List[Case] = [
+    ('decode', _decode_case),
+    ('fft2d', _fft2d_case),
+    ('ifft2d', _ifft2d_case),
+    ('rfft2d', _rfft2d_case),
+    ('irfft2d', _irfft2d_case),
+    ('apply_filter', _apply_filter_case),
+    ('process_image', _process_image_case(False)),
+    ('process_image_cached', _process_image_case(True)),
+    ('metrics_full', _metrics_case('full')),
+    ('metrics_cheap', _metrics_case('cheap')),
+    ('image_to_base64_png', _base64_case('png')),
+    ('image_to_base64_jpeg', _base64_case('jpeg')),
+    ('api_process', _api_process_case),
+]
+
+
+def _mask_case(filter_type: str, filter_mode: str):
+    def build(data):
+        shape = data['image'].shape[:2]
+        return lambda: _half_mask(shape, filter_type, filter_mode)
+    return build
+
+
+# Mặt nạ chỉ phụ thuộc kích thước: chạy một lần cho mỗi độ phân giải (không qua MASK_CACHE)
+MASK_CASES: List[Case] = [
+    (f'create_filter_mask[{filter_type}-{filter_mode}]', _mask_case(filter_type, filter_mode))
+    for filter_type in FILTER_TYPES for filter_mode in FILTER_MODES
+]
+
+
+def case_names() -> List[str]:
+    """Tên tất cả các trường hợp (dùng cho --cases)"""
+    return [name for name, _ in MASK_CASES + IMAGE_CASES]
+
+
+def time_call(func: Callable[[], object], repeats: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """
+    Đo thời gian một hàm: chạy warmup lần (khởi tạo plan FFT, cache, pool) rồi
+    đo repeats lần
+    
+    Returns:
+        Dictionary chứa min_ms, median_ms, mean_ms, max_ms, repeats
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(max(1, repeats)):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'max_ms': max(samples),
+        'repeats': len(samples),
+    }
+
+
+def environment() -> Dict:
+    """Thông tin máy và thư viện để đối chiếu khi so sánh hai lần chạy"""
+    backend = get_fft_backend()
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'opencv': cv2.__version__,
+        'fft_backend': type(backend).__name__,
+        'fft_workers': backend.workers,
+    }
+
+
+def _selected(name: str, patterns: Optional[List[str]]) -> bool:
+    return not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def _groups(resolutions: List[str], modes: List[str], seed: int) -> Iterator[Tuple[str, str, Dict]]:
+    """Sinh dữ liệu từng nhóm (độ phân giải, chế độ màu); ảnh nhóm trước được giải phóng trước khi tạo nhóm sau"""
+    for resolution in resolutions:
+        height, width = RESOLUTIONS[resolution]
+        for mode in modes:
+            image = generate_landscape(height, width, 1 if mode == 'gray' else 3, seed=seed)
+            _, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            processor = ImageProcessor()
+            processor.load_image_from_array(image)
+            processed = processor.process_image(cutoff=CUTOFF, metrics_level='none',
+                                                use_spectrum_cache=False)
+            yield resolution, mode, {'image': image, 'jpeg': jpeg.tobytes(), 'processed': processed}
+            del image, jpeg, processor, processed
+            SPECTRUM_CACHE.clear()
+            IMAGE_STORE.clear()
+
+
+def run_suite(resolutions: Optional[List[str]] = None, modes: Optional[List[str]] = None,
+              cases: Optional[List[str]] = None, repeats: int = 5, warmup: int = 1, seed: int = 0,
+              progress: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Chạy benchmark
+    
+    Args:
+        resolutions: Các khóa của RESOLUTIONS (None = tất cả)
+        modes: 'gray' và/hoặc 'rgb' (None = cả hai)
+        cases: Mẫu fnmatch lọc theo tên trường hợp (None = tất cả)
+        repeats: Số lần đo mỗi trường hợp
+        warmup: Số lần chạy khởi động không tính thời gian
+        seed: Seed sinh ảnh tổng hợp
+        progress: Hàm gọi sau mỗi trường hợp với (tên kết quả, thời gian)
+        
+    Returns:
+        Dictionary {'environment', 'config', 'results': {tên: thời gian}}; tên kết quả
+        dạng '<trường hợp>/<độ phân giải>/<chế độ màu>' ('.../any' cho mặt nạ)
+    """
+    resolutions = resolutions or list(RESOLUTIONS)
+    modes = modes or list(MODES)
+    for resolution in resolutions:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Độ phân giải không hợp lệ: {resolution} (chọn {', '.join(RESOLUTIONS)})")
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError(f"Chế độ màu không hợp lệ: {mode} (chọn {', '.join(MODES)})")
+    
+    results = {}
+    for resolution, mode, data in _groups(resolutions, modes, seed):
+        group_cases = [(name, build, mode) for name, build in IMAGE_CASES]
+        if mode == modes[0]:
+            group_cases = [(name, build, 'any') for name, build in MASK_CASES] + group_cases
+        for name, build, label in group_cases:
+            if not _selected(name, cases):
+                continue
+            key = f'{name}/{resolution}/{label}'
+            timing = time_call(build(data), repeats, warmup)
+            timing['megapixels'] = round(data['image'].shape[0] * data['image'].shape[1] / 1e6, 2)
+            results[key] = timing
+            if progress is not None:
+                progress(key, timing)
+        del data
+    
+    return {
+        'environment': environment(),
+        'config': {'resolutions': resolutions, 'modes': modes, 'cases': cases,
+                   'repeats': repeats, 'warmup': warmup, 'seed': seed},
+        'results': results,
+    }
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = 0.10,
+                    stat: str = 'median_ms', min_ms: float = 1.0) -> Dict:
+    """
+    So sánh hai lần chạy benchmark
+    
+    Args:
+        baseline: Kết quả run_suite trước khi thay đổi
+        current: Kết quả run_suite sau khi thay đổi
+        threshold: Tỉ lệ chậm đi tối đa cho phép (0.10 = chậm hơn 10% là hồi quy)
+        stat: Thống kê so sánh ('median_ms', 'min_ms' hoặc 'mean_ms')
+        min_ms: Bỏ qua đánh giá các trường hợp nhanh hơn ngưỡng này ở baseline (nhiễu đo)
+        
+    Returns:
+        Dictionary {'rows': [...], 'regressions': [...], 'missing': [...], 'added': [...],
+        'environment_changes': {...}}; mỗi dòng có name, baseline, current, ratio, status
+        ('regression', 'improvement', 'ok' hoặc 'noise')
+    """
+    base_results, current_results = baseline['results'], current['results']
+    rows = []
+    for name in base_results:
+        if name not in current_results:
+            continue
+        before, after = base_results[name][stat], current_results[name][stat]
+        ratio = after / before if before > 0 else float('inf')
+        if before < min_ms:
+            status = 'noise'
+        elif ratio > 1.0 + threshold:
+            status = 'regression'
+        elif ratio < 1.0 / (1.0 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline': before, 'current': after, 'ratio': ratio, 'status': status})
+    
+    base_env, current_env = baseline.get('environment', {}), current.get('environment', {})
+    return {
+        'stat': stat,
+        'threshold': threshold,
+        'rows': rows,
+        'regressions': [row['name'] for row in rows if row['status'] == 'regression'],
+        'missing': [name for name in base_results if name not in current_results],
+        'added': [name for name in current_results if name not in base_results],
+        'environment_changes': {
+            key: (base_env.get(key), current_env.get(key))
+            for key in sorted(set(base_env) | set(current_env))
+            if key != 'timestamp' and base_env.get(key) != current_env.get(key)
+        },
+    }
@@ -0,0 +1,355 @@
+"""
+Công cụ dòng lệnh xử lý hàng loạt ảnh bằng bộ lọc Fourier (chạy từ thư mục gốc repo)
+
+    python -m backend.cli batch IN_DIR OUT_DIR --filter-type gaussian --cutoff 40 --workers 4
+
+- Các file được chia thành nhóm nhỏ và phân phối cho một pool process
+- Mặt nạ bộ lọc được tạo sẵn trong process cha cho mọi kích thước ảnh rồi mới fork,
+  các process con dùng chung (copy-on-write) thay vì mỗi process tự tạo lại
+- Trong mỗi process, giải mã ảnh kế tiếp và mã hóa/ghi ảnh trước chạy trên luồng
+  riêng song song với bước FFT
+- Chạy lại được: ảnh đã có file kết quả sẽ bỏ qua (trừ khi --overwrite); file kết
+  quả được ghi tạm rồi đổi tên nên không có file dở dang
+- Metrics và thời gian từng bước của mỗi file ghi vào CSV hoặc JSON Lines
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .core.fourier_transform import set_fft_backend
+from .core.fft_plan import FFT_PLANNERS, PAD_MODES, FFTPlan, plan_fft, remember_plan
+from .core.image_processor import ImageProcessor, get_filter_mask
+from .core.metrics import METRIC_LEVELS, calculate_all_metrics
+from .utils.image_io import read_image, save_image
+from .utils.validation import validate_processing_params, validate_precision
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+# Tag EXIF Orientation (cv2.imread xoay ảnh theo tag này khi giải mã)
+EXIF_ORIENTATION = 0x0112
+METRIC_FIELDS = [
+    'input', 'output', 'status', 'height', 'width', 'mse', 'psnr', 'ssim',
+    'decode_ms', 'process_ms', 'metrics_ms', 'encode_ms', 'error',
+]
+
+# Tham số xử lý của process con (đặt bởi _init_worker)
+_WORKER_OPTIONS: Dict = {}
+
+
+def find_images(in_dir: str) -> List[str]:
+    """
+    Liệt kê các file ảnh trong thư mục (đệ quy)
+    
+    Returns:
+        Danh sách đường dẫn tương đối so với in_dir, đã sắp xếp
+    """
+    paths = []
+    for root, _, files in os.walk(in_dir):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(root, name), in_dir))
+    return sorted(paths)
+
+
+def output_path(relative: str, out_dir: str, image_format: Optional[str] = None) -> str:
+    """Đường dẫn file kết quả: giữ cấu trúc thư mục, đổi đuôi nếu chỉ định image_format"""
+    if image_format:
+        relative = os.path.splitext(relative)[0] + '.' + image_format.lstrip('.')
+    return os.path.join(out_dir, relative)
+
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Đọc kích thước (H, W) từ header ảnh mà không giải mã, None nếu không đọc được
+    Theo hướng EXIF như cv2.imread: hướng 5-8 (xoay 90/270 độ) đổi chỗ H và W
+    """
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        if orientation in (5, 6, 7, 8):
+            width, height = height, width
+        return height, width
+    except (OSError, ValueError):
+        return None
+
+
+def precompute_masks(paths: List[str], options: Dict) -> List[FFTPlan]:
+    """
+    Lập plan FFT cho các ảnh và tạo sẵn mặt nạ bộ lọc cho mọi lưới FFT (trong MASK_CACHE)
+    Gọi trong process cha (sau _configure_fft) trước khi tạo pool để các process con dùng chung
+    
+    Returns:
+        Danh sách plan FFT của các kích thước ảnh (truyền cho process con qua options['fft_plans'])
+    """
+    plans = {}
+    for path in paths:
+        size = image_size(path)
+        if size is not None and size not in plans:
+            plans[size] = plan_fft(size, options['fft_planner'], precision=options['precision'])
+    for shape in {plan.shape for plan in plans.values()}:
+        get_filter_mask(shape, precision=options['precision'], **options['filter'])
+    return list(plans.values())
+
+
+def _configure_fft(options: Dict) -> None:
+    """FFT một luồng khi chạy nhiều process để không tranh CPU giữa các process"""
+    if options['workers'] > 1:
+        set_fft_backend(workers=1)
+
+
+def _init_worker(options: Dict) -> None:
+    """
+    Khởi tạo process con: lưu tham số, chọn FFT backend như process cha và nhận các
+    plan FFT cha đã lập (planner 'measure' không đo lại, lưới trùng với mặt nạ tạo sẵn)
+    """
+    _WORKER_OPTIONS.update(options)
+    _configure_fft(options)
+    for plan in options.get('fft_plans', []):
+        remember_plan(plan, options['precision'])
+
+
+def _decode(path: str):
+    start = time.perf_counter()
+    image = read_image(path)
+    return image, (time.perf_counter() - start) * 1000.0
+
+
+def _encode(image, path: str, quality: int) -> float:
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    stem, ext = os.path.splitext(path)
+    partial = f'{stem}.partial{ext}'
+    if not save_image(image, partial, quality=quality):
+        raise ValueError(f"Không thể ghi ảnh {path}")
+    os.replace(partial, path)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def process_chunk(tasks: List[Tuple[str, str]]) -> List[Dict]:
+    """
+    Xử lý một nhóm file (chạy trong process con)
+    Giải mã file kế tiếp và ghi file trước chạy trên luồng riêng trong lúc tính FFT
+    
+    Args:
+        tasks: Danh sách (file vào, file ra)
+        
+    Returns:
+        Danh sách dòng metrics (xem METRIC_FIELDS)
+    """
+    options = _WORKER_OPTIONS
+    rows = []
+    if not tasks:
+        return rows
+    
+    with ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=1) as writer:
+        next_image = reader.submit(_decode, tasks[0][0])
+        pending = None
+        for index, (source, target) in enumerate(tasks):
+            row = {'input': source, 'output': target, 'status': 'ok'}
+            rows.append(row)
+            try:
+                image, row['decode_ms'] = next_image.result()
+            except Exception as e:
+                image = None
+                row.update(status='error', error=str(e))
+            if index + 1 < len(tasks):
+                next_image = reader.submit(_decode, tasks[index + 1][0])
+            if image is None:
+                continue
+            
+            try:
+                row['height'], row['width'] = image.shape[:2]
+                start = time.perf_counter()
+                processor = ImageProcessor()
+                processor.load_image_from_array(image, copy=False)
+                processed = processor.process_image(
+                    precision=options['precision'], use_spectrum_cache=False, metrics_level='none',
+                    pad_mode=options['pad_mode'], fft_planner=options['fft_planner'], **options['filter']
+                )
+                row['process_ms'] = (time.perf_counter() - start) * 1000.0
+                
+                if options['metrics_level'] != 'none':
+                    start = time.perf_counter()
+                    row.update(calculate_all_metrics(image, processed, max_value=255.0,
+                                                     level=options['metrics_level']))
+                    row['metrics_ms'] = (time.perf_counter() - start) * 1000.0
+            except Exception as e:
+                row.update(status='error', error=str(e))
+                continue
+            
+            # Chỉ giữ một lần ghi đang chạy để bộ nhớ không tăng theo số file
+            if pending is not None:
+                _finish_write(*pending)
+            pending = (row, writer.submit(_encode, processed, target, options['quality']))
+        if pending is not None:
+            _finish_write(*pending)
+    return rows
+
+
+def _finish_write(row: Dict, future) -> None:
+    try:
+        row['encode_ms'] = future.result()
+    except Exception as e:
+        row.update(status='error', error=str(e))
+
+
+class MetricsWriter:
+    """Ghi dòng metrics nối tiếp vào CSV (.csv) hoặc JSON Lines (.jsonl/.json)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.json = not path.lower().endswith('.csv')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        if not self.json:
+            self._csv = csv.DictWriter(self._file, fieldnames=METRIC_FIELDS, extrasaction='ignore')
+            if new_file:
+                self._csv.writeheader()
+    
+    def write(self, rows: List[Dict]) -> None:
+        for row in rows:
+            if self.json:
+                self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            else:
+                self._csv.writerow(row)
+        self._file.flush()
+    
+    def close(self) -> None:
+        self._file.close()
+
+
+def run_batch(args) -> int:
+    """
+    Chạy lệnh batch
+    
+    Returns:
+        Mã thoát: 0 nếu mọi file thành công, 1 nếu có file lỗi, 2 nếu tham số sai
+    """
+    filter_params = {
+        'filter_type': args.filter_type.lower(),
+        'filter_mode': args.filter_mode.lower(),
+        'cutoff': args.cutoff,
+        'order': args.order,
+        'center_freq': args.center_freq,
+        'bandwidth': args.bandwidth,
+    }
+    is_valid, error_msg = validate_processing_params(**filter_params)
+    if not is_valid or not validate_precision(args.precision):
+        print(f"Lỗi: {error_msg or f'Độ chính xác không hợp lệ: {args.precision}'}", file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.in_dir):
+        print(f"Lỗi: Không tìm thấy thư mục {args.in_dir}", file=sys.stderr)
+        return 2
+    
+    workers = args.workers or os.cpu_count() or 1
+    options = {
+        'filter': filter_params,
+        'precision': args.precision.lower(),
+        'pad_mode': args.pad_mode,
+        'fft_planner': args.fft_planner,
+        'metrics_level': args.metric_level,
+        'quality': args.quality,
+        'workers': workers,
+    }
+    
+    # Bỏ qua các file đã có kết quả (chạy tiếp sau khi bị dừng)
+    tasks, skipped = [], 0
+    for relative in find_images(args.in_dir):
+        target = output_path(relative, args.out_dir, args.format)
+        if os.path.exists(target) and not args.overwrite:
+            skipped += 1
+            continue
+        tasks.append((os.path.join(args.in_dir, relative), target))
+    print(f"{len(tasks)} ảnh cần xử lý, bỏ qua {skipped} ảnh đã có kết quả")
+    if not tasks:
+        return 0
+    
+    start = time.perf_counter()
+    # Lập plan với cùng backend như process con (khóa plan 'measure' gồm số luồng FFT)
+    _configure_fft(options)
+    options['fft_plans'] = precompute_masks([source for source, _ in tasks], options)
+    mask_count = len({plan.shape for plan in options['fft_plans']})
+    print(f"Đã tạo sẵn {mask_count} mặt nạ bộ lọc ({(time.perf_counter() - start) * 1000.0:.0f} ms)")
+    
+    chunks = [tasks[i:i + args.chunk_size] for i in range(0, len(tasks), args.chunk_size)]
+    writer = MetricsWriter(args.metrics or os.path.join(args.out_dir, 'metrics.csv'))
+    done = failed = 0
+    try:
+        if workers == 1:
+            _init_worker(options)
+            results = map(process_chunk, chunks)
+            pool = None
+        else:
+            # fork: process con thừa hưởng MASK_CACHE đã tạo sẵn
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            pool = context.Pool(min(workers, len(chunks)), initializer=_init_worker, initargs=(options,))
+            results = pool.imap_unordered(process_chunk, chunks)
+        for rows in results:
+            writer.write(rows)
+            done += len(rows)
+            failed += sum(row['status'] != 'ok' for row in rows)
+            print(f"[{done}/{len(tasks)}] {rows[-1]['input']}")
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        writer.close()
+    
+    elapsed = time.perf_counter() - start
+    print(f"Hoàn tất {done - failed} ảnh, lỗi {failed}, bỏ qua {skipped} trong {elapsed:.1f} s "
+          f"- metrics: {writer.path}")
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m backend.cli',
+                                     description='Xử lý ảnh hàng loạt với bộ lọc Fourier')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    batch = commands.add_parser('batch', help='Xử lý mọi ảnh trong một thư mục')
+    batch.add_argument('in_dir', help='Thư mục ảnh đầu vào (duyệt đệ quy)')
+    batch.add_argument('out_dir', help='Thư mục ghi ảnh kết quả (giữ cấu trúc thư mục)')
+    batch.add_argument('--filter-type', default='gaussian', help="'ideal', 'butterworth', 'gaussian'")
+    batch.add_argument('--filter-mode', default='lowpass', help="'lowpass', 'highpass', 'bandreject'")
+    batch.add_argument('--cutoff', type=float, default=50.0, help='Tần số cắt (D0)')
+    batch.add_argument('--order', type=int, default=2, help='Bậc bộ lọc Butterworth')
+    batch.add_argument('--center-freq', type=float, default=None, help='Tần số trung tâm (band-reject)')
+    batch.add_argument('--bandwidth', type=float, default=None, help='Độ rộng dải (band-reject)')
+    batch.add_argument('--precision', default='float32', help="'float32' hoặc 'float64'")
+    batch.add_argument('--pad-mode', choices=PAD_MODES, default='zero',
+                       help="Cách pad ảnh đến lưới FFT: 'zero', 'reflect' hoặc 'symmetric'")
+    batch.add_argument('--fft-planner', choices=FFT_PLANNERS, default=None,
+                       help="Cách chọn lưới FFT: 'fast' (next_fast_len), 'model' hoặc 'measure'; mặc định FFT_PLANNER")
+    batch.add_argument('--workers', type=int, default=0, help='Số process (0 = số CPU)')
+    batch.add_argument('--chunk-size', type=int, default=4, help='Số file mỗi lần giao cho một process')
+    batch.add_argument('--format', default=None, help='Đuôi file kết quả (png, jpg, ...); mặc định giữ nguyên')
+    batch.add_argument('--quality', type=int, default=85,
+                       help='Chất lượng JPEG; với PNG mức nén = 9 - quality // 10 (xem save_image)')
+    batch.add_argument('--metrics', default=None,
+                       help='File metrics (.csv hoặc .jsonl), mặc định OUT_DIR/metrics.csv')
+    batch.add_argument('--metric-level', choices=METRIC_LEVELS, default='full',
+                       help="'full' (MSE, PSNR, SSIM), 'cheap' (MSE, PSNR) hoặc 'none'")
+    batch.add_argument('--overwrite', action='store_true', help='Xử lý lại cả ảnh đã có kết quả')
+    batch.set_defaults(handler=run_batch)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Module cache dùng chung cho toàn bộ process (thread-safe)
+LRU giới hạn theo tổng số byte (tùy chọn TTL), có đếm hit/miss/eviction
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+def _sizeof(value: Any) -> int:
+    """Ước lượng số byte của một giá trị trong cache (mảng numpy, bytes hoặc tuple/list của chúng)"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(item) for item in value)
+    return 0
+
+
+def image_digest(image: np.ndarray) -> str:
+    """
+    Tính mã băm nội dung của ảnh đã giải mã (pixel + shape + dtype)
+    Dùng làm khóa cache theo nội dung: cùng một ảnh gửi lại sẽ có cùng mã
+    
+    Args:
+        image: Mảng ảnh
+        
+    Returns:
+        Chuỗi hex 32 ký tự
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.shape}|{image.dtype.str}".encode())
+    hasher.update(np.ascontiguousarray(image).data)
+    return hasher.hexdigest()
+
+
+class LRUCache:
+    """Cache LRU thread-safe, loại bỏ phần tử ít dùng nhất khi vượt ngân sách byte"""
+    
+    def __init__(self, max_bytes: int, name: str = 'cache', ttl: Optional[float] = None):
+        """
+        Args:
+            max_bytes: Tổng số byte tối đa của các giá trị trong cache
+            name: Tên cache (dùng khi báo cáo thống kê)
+            ttl: Thời gian sống của mỗi phần tử (giây), None = không hết hạn
+        """
+        self.name = name
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._expires: Dict[Hashable, float] = {}
+        # Các key đang được tạo bởi get_or_create (lời gọi cùng key chờ Future này)
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+    
+    def _remove(self, key: Hashable) -> None:
+        # Gọi khi đang giữ lock
+        del self._data[key]
+        self.current_bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
+    
+    def _purge_expired(self, now: float) -> None:
+        # Gọi khi đang giữ lock; phần tử cũ nhất (ít dùng nhất) nằm đầu OrderedDict
+        # nhưng thời điểm hết hạn tính từ lúc put nên phải duyệt hết
+        expired = [key for key, expires in self._expires.items() if expires <= now]
+        for key in expired:
+            self._remove(key)
+            self.expirations += 1
+    
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        # Gọi khi đang giữ lock; không đếm hit/miss
+        if key in self._data:
+            if self.ttl is not None and self._expires[key] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+            else:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Lấy giá trị theo key và đánh dấu là vừa dùng
+        
+        Returns:
+            Giá trị hoặc None nếu không có trong cache
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Thêm giá trị vào cache, loại bỏ các phần tử cũ nhất nếu vượt ngân sách
+        Giá trị lớn hơn cả ngân sách sẽ không được lưu
+        """
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.ttl is not None:
+                now = time.monotonic()
+                self._purge_expired(now)
+                self._expires[key] = now + self.ttl
+            self._data[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+    
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Lấy giá trị từ cache, nếu chưa có thì tạo bằng factory() và lưu lại
+        factory chạy ngoài lock nên các request với key khác không bị chặn; các lời gọi
+        đồng thời cùng key chờ kết quả của lời gọi đầu tiên (factory chỉ chạy một lần,
+        không tạo nhiều bản của cùng một mặt nạ/phổ lớn vượt ngân sách byte)
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+        if not owner:
+            # Lỗi của factory ở lời gọi đầu tiên cũng được ném lại ở đây
+            return pending.result()
+        
+        try:
+            value = factory()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+        self.put(key, value)
+        with self._lock:
+            del self._pending[key]
+        pending.set_result(value)
+        return value
+    
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (giữ nguyên bộ đếm)"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self.current_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+    
+    def stats(self) -> Dict:
+        """
+        Thống kê cache
+        
+        Returns:
+            Dictionary chứa số phần tử, số byte, hits, misses, evictions, hit_rate
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# Cache mặt nạ bộ lọc dùng chung giữa các request (app.py tạo ImageProcessor mới mỗi request)
+MASK_CACHE = LRUCache(int(os.environ.get('MASK_CACHE_MB', '256')) * 1024 * 1024, name='mask')
+
+# Cache phổ Fourier theo nội dung ảnh: kéo slider cutoff gửi lại cùng ảnh nên
+# chỉ cần nhân mặt nạ và IFFT, bỏ qua giải mã-pad-FFT thuận
+SPECTRUM_CACHE = LRUCache(
+    int(os.environ.get('SPECTRUM_CACHE_MB', '512')) * 1024 * 1024,
+    name='spectrum',
+    ttl=float(os.environ.get('SPECTRUM_CACHE_TTL', '300'))
+)
+
+# Ảnh đã giải mã được giữ trên server theo mã băm nội dung (image_id trả về từ
+# /api/upload); /api/process nhận image_id thay vì gửi lại toàn bộ ảnh
+IMAGE_STORE = LRUCache(
+    int(os.environ.get('IMAGE_STORE_MB', '1024')) * 1024 * 1024,
+    name='image',
+    ttl=float(os.environ.get('IMAGE_STORE_TTL', '1800'))
+)
+
+# Ảnh kết quả đã mã hóa cho response_format=url của /api/process: client tải
+# từng ảnh qua /api/artifacts/<id> ngay sau khi nhận response nên chỉ giữ ngắn hạn
+ARTIFACT_STORE = LRUCache(
+    int(os.environ.get('ARTIFACT_STORE_MB', '256')) * 1024 * 1024,
+    name='artifact',
+    ttl=float(os.environ.get('ARTIFACT_STORE_TTL', '120'))
+)
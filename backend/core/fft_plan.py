@@ -0,0 +1,372 @@
+"""
+Module chọn kích thước lưới FFT và cách pad ảnh (FFT plan)
+
+Đường xử lý nguyên khối pad ảnh (H, W) đến lưới (N, M) rồi FFT. Bộ chọn (planner):
+- 'fast': next_fast_len từng trục (mặc định, giữ nguyên kết quả như trước)
+- 'model': mô hình chi phí FFT hỗn hợp cơ số (radix 2/3/5, 7/11 chậm hơn, thừa số
+  nguyên tố lớn dùng Bluestein) cộng chi phí các bước theo từng phần tử
+- 'measure': đo thời gian FFT thuận + ngược của FFT backend hiện tại trên các lưới
+  tốt nhất theo 'model' và lưới next_fast_len, cache theo máy trong FFT_PLAN_CACHE
+Ứng viên mỗi trục là các số 11-smooth trong [n, n * (1 + FFT_PLAN_MAX_PAD)] (luôn gồm
+next_fast_len(n)); không cắt bớt ảnh vì ảnh kết quả phải giữ nguyên kích thước.
+Lưu ý: cutoff/center_freq/bandwidth tính theo chỉ số tần số của lưới đã pad nên
+đổi lưới làm tần số cắt thực tế (chu kỳ/pixel) thay đổi theo tỉ lệ N/H, M/W.
+
+Chế độ pad: 'zero' (mặc định), 'reflect' (phản xạ không lặp pixel biên, như
+np.pad mode='reflect') và 'symmetric' (lặp pixel biên) - giảm hiện tượng tối/rung
+ở biên ảnh khi lọc low-pass do ảnh nhảy về 0 ở phần pad.
+"""
+
+import json
+import math
+import os
+import socket
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.fft import next_fast_len
+
+from .fourier_transform import get_fft_backend
+
+
+FFT_PLANNERS = ('fast', 'model', 'measure')
+PAD_MODES = ('zero', 'reflect', 'symmetric')
+DEFAULT_FFT_PLANNER = os.environ.get('FFT_PLANNER', 'fast')
+# Phần pad tối đa so với cạnh ảnh khi tìm lưới ('model', 'measure')
+FFT_PLAN_MAX_PAD = float(os.environ.get('FFT_PLAN_MAX_PAD', '0.1'))
+# Chỉ bỏ lưới next_fast_len khi lưới khác rẻ hơn ít nhất tỉ lệ này (tránh đổi lưới vì nhiễu đo)
+FFT_PLAN_MIN_GAIN = float(os.environ.get('FFT_PLAN_MIN_GAIN', '0.1'))
+# File cache thời gian FFT đã đo ('measure'), rỗng = chỉ cache trong bộ nhớ
+FFT_PLAN_CACHE = os.path.expanduser(os.environ.get('FFT_PLAN_CACHE', '~/.cache/fourier-denoiser/fft_costs.json'))
+# Số lưới ứng viên tốt nhất theo mô hình được đo thật ('measure')
+MEASURE_CANDIDATES = 4
+MEASURE_REPEATS = 3
+
+_SMOOTH_PRIMES = (2, 3, 5, 7, 11)
+# Chi phí mỗi phần tử của một tầng butterfly theo cơ số (7, 11 dùng butterfly tổng quát)
+_RADIX_WEIGHTS = {2: 2.0, 3: 3.0, 5: 5.0, 7: 10.5, 11: 16.5}
+# Chi phí mỗi phần tử của các bước theo từng phần tử (pad, nhân mặt nạ, lượng tử hóa)
+_ELEMENTWISE_WEIGHT = 4.0
+
+_plans: Dict[Tuple, 'FFTPlan'] = {}
+_measured: Dict[str, float] = {}
+_measured_loaded = False
+_lock = threading.Lock()
+
+
+def _factorize(n: int) -> List[int]:
+    factors, p = [], 2
+    while p * p <= n:
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+@lru_cache(maxsize=None)
+def model_cost_1d(n: int, real: bool = False) -> float:
+    """
+    Chi phí mô hình (đơn vị tương đối) của một FFT 1D độ dài n
+    
+    Args:
+        n: Độ dài
+        real: True cho FFT số thực (rfft, khoảng một nửa FFT phức)
+        
+    Returns:
+        n * tổng trọng số các thừa số; thừa số nguyên tố lớn tính theo Bluestein
+        (hai FFT độ dài next_fast_len(2p - 1) cho mỗi nhóm p phần tử)
+    """
+    weight = 0.0
+    for p in _factorize(n):
+        if p in _RADIX_WEIGHTS:
+            weight += _RADIX_WEIGHTS[p]
+        else:
+            m = next_fast_len(2 * p - 1)
+            weight += (2.0 * model_cost_1d(m) + 3.0 * m) / p
+    cost = n * max(weight, 1.0)
+    return cost / 2.0 if real else cost
+
+
+def candidate_lengths(n: int, max_pad: float = FFT_PLAN_MAX_PAD) -> List[int]:
+    """
+    Các độ dài FFT ứng viên cho cạnh n: n, next_fast_len(n) và mọi số 11-smooth
+    trong [n, n * (1 + max_pad)]
+    
+    Returns:
+        Danh sách tăng dần
+    """
+    limit = max(next_fast_len(n), int(math.ceil(n * (1.0 + max_pad))))
+    lengths = {1}
+    for p in _SMOOTH_PRIMES:
+        for value in list(lengths):
+            value *= p
+            while value <= limit:
+                lengths.add(value)
+                value *= p
+    return sorted({n, next_fast_len(n)} | {value for value in lengths if value >= n})
+
+
+def _host_key(dtype) -> str:
+    backend = get_fft_backend()
+    return f'{socket.gethostname()}|{backend.name}|{backend.workers}|{np.dtype(dtype).name}'
+
+
+def _load_measured() -> None:
+    global _measured_loaded
+    if _measured_loaded:
+        return
+    _measured_loaded = True
+    if not FFT_PLAN_CACHE:
+        return
+    try:
+        with open(FFT_PLAN_CACHE, encoding='utf-8') as f:
+            _measured.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+
+def _save_measured() -> None:
+    if not FFT_PLAN_CACHE:
+        return
+    try:
+        os.makedirs(os.path.dirname(FFT_PLAN_CACHE) or '.', exist_ok=True)
+        # Gộp với file hiện tại (các process khác cũng ghi) rồi thay thế nguyên tử
+        try:
+            with open(FFT_PLAN_CACHE, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        stored.update(_measured)
+        partial = f'{FFT_PLAN_CACHE}.{os.getpid()}.partial'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        os.replace(partial, FFT_PLAN_CACHE)
+    except OSError as e:
+        print(f"Không ghi được cache FFT plan {FFT_PLAN_CACHE}: {e}")
+
+
+def _transform_seconds(shape: Tuple[int, int], real_fft: bool, dtype) -> float:
+    """Thời gian một lần FFT thuận + ngược một kênh của lưới shape"""
+    backend = get_fft_backend()
+    data = np.full(shape, 0.5, dtype=dtype)
+    if not real_fft:
+        data = data.astype(np.result_type(dtype, np.complex64))
+    start = time.perf_counter()
+    if real_fft:
+        backend.irfft2(backend.rfft2(data), shape)
+    else:
+        backend.ifft2(backend.fft2(data))
+    return time.perf_counter() - start
+
+
+def measure_costs(shapes: List[Tuple[int, int]], real_fft: bool = True, dtype=np.float32,
+                  repeats: int = MEASURE_REPEATS) -> Dict[Tuple[int, int], float]:
+    """
+    Đo thời gian FFT thuận + ngược một kênh của các lưới trên FFT backend hiện tại,
+    cache theo máy/backend/số luồng/dtype (trong bộ nhớ và FFT_PLAN_CACHE)
+    
+    Các lưới chưa có trong cache được đo xen kẽ theo vòng (một vòng khởi tạo plan
+    không tính) và lấy thời gian nhỏ nhất, để nhiễu theo thời gian (CPU bị chia sẻ)
+    ảnh hưởng đều các ứng viên.
+    
+    Args:
+        shapes: Các lưới FFT (N, M)
+        real_fft: True đo rfft2/irfft2, False đo fft2/ifft2
+        dtype: Kiểu số thực
+        repeats: Số vòng đo
+        
+    Returns:
+        Dictionary {lưới: giây}
+    """
+    prefix = f"{_host_key(dtype)}|{'r' if real_fft else 'c'}"
+    keys = {shape: f'{prefix}{shape[0]}x{shape[1]}' for shape in shapes}
+    with _lock:
+        _load_measured()
+        pending = [shape for shape in shapes if keys[shape] not in _measured]
+    if pending:
+        best = {shape: float('inf') for shape in pending}
+        for round_index in range(repeats + 1):
+            for shape in pending:
+                seconds = _transform_seconds(shape, real_fft, dtype)
+                if round_index > 0:
+                    best[shape] = min(best[shape], seconds)
+        with _lock:
+            _measured.update({keys[shape]: seconds for shape, seconds in best.items()})
+            _save_measured()
+    with _lock:
+        return {shape: _measured[keys[shape]] for shape in shapes}
+
+
+class FFTPlan:
+    """Lưới FFT và cách pad đã chọn cho một kích thước ảnh"""
+    
+    def __init__(self, image_shape: Tuple[int, int], shape: Tuple[int, int], planner: str,
+                 pad_mode: str, real_fft: bool, cost: Optional[float] = None,
+                 baseline_cost: Optional[float] = None, candidates: int = 1,
+                 planning_ms: float = 0.0):
+        self.image_shape = image_shape
+        self.shape = shape
+        self.planner = planner
+        self.pad_mode = pad_mode
+        self.real_fft = real_fft
+        self.cost = cost
+        self.baseline_cost = baseline_cost
+        self.candidates = candidates
+        self.planning_ms = planning_ms
+    
+    def with_pad_mode(self, pad_mode: str) -> 'FFTPlan':
+        """Bản sao với chế độ pad khác (kích thước lưới không phụ thuộc cách pad)"""
+        return FFTPlan(self.image_shape, self.shape, self.planner, pad_mode, self.real_fft,
+                       self.cost, self.baseline_cost, self.candidates, self.planning_ms)
+    
+    def to_dict(self) -> Dict:
+        """
+        Thông tin plan cho response (debug)
+        
+        Returns:
+            Dictionary chứa image_shape, fft_shape, pad, planner, pad_mode, real_fft,
+            cost/baseline_cost (đơn vị mô hình với 'model', giây với 'measure'; baseline là
+            lưới next_fast_len), speedup, candidates và planning_ms
+        """
+        return {
+            'image_shape': list(self.image_shape),
+            'fft_shape': list(self.shape),
+            'pad': [self.shape[0] - self.image_shape[0], self.shape[1] - self.image_shape[1]],
+            'planner': self.planner,
+            'pad_mode': self.pad_mode,
+            'real_fft': self.real_fft,
+            'cost': self.cost,
+            'baseline_cost': self.baseline_cost,
+            'speedup': self.baseline_cost / self.cost if self.cost and self.baseline_cost else None,
+            'candidates': self.candidates,
+            'planning_ms': self.planning_ms,
+        }
+
+
+def _model_cost(height: int, width: int, real_fft: bool) -> float:
+    """Chi phí FFT thuận + ngược của lưới (height, width) và các bước theo phần tử"""
+    if real_fft:
+        spectrum_w = width // 2 + 1
+        transform = height * model_cost_1d(width, True) + spectrum_w * model_cost_1d(height, False)
+    else:
+        spectrum_w = width
+        transform = height * model_cost_1d(width, False) + width * model_cost_1d(height, False)
+    return 2.0 * transform + _ELEMENTWISE_WEIGHT * height * spectrum_w
+
+
+def _plan_key(height: int, width: int, planner: str, real_fft: bool, precision: str) -> Tuple:
+    """Khóa của plan trong _plans ('measure' phụ thuộc thêm precision và backend hiện tại)"""
+    if planner != 'measure':
+        return (height, width, planner, real_fft, None, None)
+    dtype = np.float64 if precision == 'float64' else np.float32
+    return (height, width, planner, real_fft, precision, _host_key(dtype))
+
+
+def remember_plan(plan: FFTPlan, precision: str = 'float32') -> None:
+    """
+    Ghi plan đã chọn ở nơi khác (ví dụ process cha của batch) để plan_fft trong
+    process này dùng lại thay vì lập plan (đo) lại; plan đã có sẵn được giữ nguyên
+    
+    Args:
+        plan: Kết quả plan_fft
+        precision: Độ chính xác đã dùng khi lập plan
+    """
+    height, width = plan.image_shape[:2]
+    key = _plan_key(int(height), int(width), plan.planner, plan.real_fft, precision)
+    with _lock:
+        _plans.setdefault(key, plan.with_pad_mode('zero'))
+
+
+def plan_fft(image_shape: Tuple[int, ...], planner: Optional[str] = None, pad_mode: str = 'zero',
+             real_fft: bool = True, precision: str = 'float32') -> FFTPlan:
+    """
+    Chọn lưới FFT cho ảnh (kết quả được nhớ theo tham số, dùng chung cho process)
+    
+    Args:
+        image_shape: Kích thước ảnh (H, W[, C])
+        planner: 'fast', 'model' hoặc 'measure' (None = FFT_PLANNER, mặc định 'fast')
+        pad_mode: 'zero', 'reflect' hoặc 'symmetric'
+        real_fft: True nếu dùng rfft2d/irfft2d
+        precision: 'float32' hoặc 'float64' (chỉ ảnh hưởng 'measure')
+        
+    Returns:
+        FFTPlan
+    """
+    planner = planner or DEFAULT_FFT_PLANNER
+    if planner not in FFT_PLANNERS:
+        raise ValueError(f"FFT planner không hợp lệ: {planner}. Chọn một trong {list(FFT_PLANNERS)}")
+    if pad_mode not in PAD_MODES:
+        raise ValueError(f"Chế độ pad không hợp lệ: {pad_mode}. Chọn một trong {list(PAD_MODES)}")
+    height, width = (int(size) for size in image_shape[:2])
+    dtype = np.float64 if precision == 'float64' else np.float32
+    key = _plan_key(height, width, planner, real_fft, precision)
+    with _lock:
+        plan = _plans.get(key)
+    if plan is not None:
+        return plan.with_pad_mode(pad_mode)
+    
+    start = time.perf_counter()
+    baseline = (next_fast_len(height), next_fast_len(width))
+    if planner == 'fast':
+        plan = FFTPlan((height, width), baseline, planner, 'zero', real_fft)
+    else:
+        rows, columns = candidate_lengths(height), candidate_lengths(width)
+        model_costs = {(h, w): _model_cost(h, w, real_fft) for h in rows for w in columns}
+        if planner == 'model':
+            costs = model_costs
+        else:
+            # Chỉ đo các lưới tốt nhất theo mô hình (và lưới next_fast_len để so sánh)
+            ranked = sorted(model_costs, key=lambda candidate: (model_costs[candidate], candidate))
+            costs = measure_costs(sorted(set(ranked[:MEASURE_CANDIDATES]) | {baseline}), real_fft, dtype)
+        shape = min(costs, key=lambda candidate: (costs[candidate], candidate))
+        if costs[shape] > costs[baseline] * (1.0 - FFT_PLAN_MIN_GAIN):
+            shape = baseline
+        plan = FFTPlan((height, width), shape, planner, 'zero', real_fft, cost=costs[shape],
+                       baseline_cost=costs[baseline], candidates=len(costs))
+    plan.planning_ms = (time.perf_counter() - start) * 1000.0
+    with _lock:
+        _plans[key] = plan
+    return plan.with_pad_mode(pad_mode)
+
+
+def _mirror_indices(n: int, m: int, pad_mode: str) -> np.ndarray:
+    """Chỉ số nguồn cho các vị trí n..m-1 khi phản xạ tuần hoàn cạnh độ dài n"""
+    positions = np.arange(n, m)
+    if pad_mode == 'reflect':
+        if n == 1:
+            return np.zeros_like(positions)
+        period = 2 * n - 2
+        positions %= period
+        return np.where(positions < n, positions, period - positions)
+    period = 2 * n
+    positions %= period
+    return np.where(positions < n, positions, period - 1 - positions)
+
+
+def fill_padding(padded: np.ndarray, height: int, width: int, pad_mode: str = 'zero') -> None:
+    """
+    Ghi phần pad (hàng >= height, cột >= width) của padded tại chỗ, phần ảnh
+    padded[:height, :width] đã có sẵn
+    
+    Args:
+        padded: Mảng (N, M[, C]) với N >= height, M >= width
+        height, width: Kích thước ảnh
+        pad_mode: 'zero', 'reflect' (như np.pad mode='reflect') hoặc 'symmetric'
+    """
+    if pad_mode == 'zero':
+        padded[height:] = 0.0
+        padded[:height, width:] = 0.0
+        return
+    if pad_mode not in PAD_MODES:
+        raise ValueError(f"Chế độ pad không hợp lệ: {pad_mode}. Chọn một trong {list(PAD_MODES)}")
+    optimal_h, optimal_w = padded.shape[:2]
+    if optimal_h > height:
+        padded[height:, :width] = padded[_mirror_indices(height, optimal_h, pad_mode), :width]
+    if optimal_w > width:
+        padded[:, width:] = padded[:, _mirror_indices(width, optimal_w, pad_mode)]
@@ -3,28 +3,192 @@ Module chứa các bộ lọc tần số: Low-pass, High-pass, Band-reject
 Hỗ trợ Ideal, Butterworth, và Gaussian filters
 """
 
+import os
 import numpy as np
 from typing import Tuple, Optional
 
+from .cache import LRUCache
 
-def create_distance_matrix(height: int, width: int) -> np.ndarray:
+
+# Cache chỉ số khoảng cách theo kích thước ảnh: (các khoảng cách duy nhất,
+# chỉ số của từng pixel trong 1/4 mặt phẳng tần số vào mảng khoảng cách đó)
+RADIAL_INDEX_CACHE = LRUCache(int(os.environ.get('RADIAL_INDEX_CACHE_MB', '256')) * 1024 * 1024,
+                              name='radial_index')
+
+
+def _build_radial_index(height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tạo chỉ số khoảng cách bình phương (số nguyên) cho 1/4 mặt phẳng tần số
+    
+    Mọi bộ lọc đều đối xứng tâm nên chỉ phụ thuộc D² = u² + v² với
+    u = 0..H/2, v = 0..W/2. Mỗi giá trị D² duy nhất chỉ cần tính profile một lần.
+    
+    Returns:
+        (distance, inverse): các khoảng cách D = sqrt(D²) duy nhất (float64, tăng dần)
+        và mảng (H // 2 + 1, W // 2 + 1) chỉ số của từng pixel vào distance
+        (kiểu intp để gather không phải chuyển kiểu chỉ số)
+    """
+    u = np.arange(height // 2 + 1, dtype=np.int64)
+    v = np.arange(width // 2 + 1, dtype=np.int64)
+    d2 = u[:, np.newaxis]**2 + v[np.newaxis, :]**2
+    # D² bị chặn bởi (H/2)² + (W/2)² nên đánh dấu + cumsum nhanh hơn np.unique (sắp xếp)
+    present = np.zeros(int(d2[-1, -1]) + 1, dtype=bool)
+    present[d2] = True
+    distance = np.sqrt(np.flatnonzero(present).astype(np.float64))
+    lookup = np.cumsum(present, dtype=np.intp) - 1
+    inverse = lookup[d2]
+    return distance, inverse
+
+
+def _radial_index(height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Lấy chỉ số khoảng cách của kích thước (height, width) từ cache"""
+    return RADIAL_INDEX_CACHE.get_or_create(
+        (height, width), lambda: _build_radial_index(height, width)
+    )
+
+
+def _radial_distances(height: int, width: int, dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Các khoảng cách D duy nhất (1-D) trong mặt phẳng tần số (height, width)
+    Profile của bộ lọc được tính trên mảng này thay vì trên toàn bộ H×W pixel
+    """
+    distance, _ = _radial_index(height, width)
+    return distance.astype(dtype, copy=False)
+
+
+def _radial_mask(profile: np.ndarray, height: int, width: int, half: bool = False,
+                 dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
+    """
+    Tạo mặt nạ 2D từ profile 1-D theo khoảng cách
+    Gather profile vào 1/4 mặt phẳng rồi lấy đối xứng ra các phần còn lại
+    
+    Args:
+        profile: Giá trị bộ lọc tại từng khoảng cách của _radial_distances(height, width)
+        height: Chiều cao ảnh
+        width: Chiều rộng ảnh
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
+        
+    Returns:
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
+    """
+    _, inverse = _radial_index(height, width)
+    q_h, q_w = inverse.shape
+    out_w = q_w if half else width
+    
+    # Gather thẳng vào 1/4 mặt phẳng của mặt nạ (mode='clip' để np.take không dùng buffer)
+    mask = np.empty((height, out_w), dtype=dtype)
+    np.take(np.asarray(profile, dtype=dtype), inverse, out=mask[:q_h, :q_w], mode='clip')
+    # Bố cục gốc của FFT: cột/hàng vượt quá W/2, H/2 là tần số âm, đối xứng với W - v, H - u
+    if not half:
+        mask[:q_h, q_w:] = mask[:q_h, width - q_w:0:-1]
+    mask[q_h:] = mask[height - q_h:0:-1]
+    
+    if centered:
+        mask = np.fft.fftshift(mask, axes=0 if half else (0, 1))
+    return mask
+
+
+def _ideal_lowpass_profile(distance: np.ndarray, cutoff: float) -> np.ndarray:
+    return (distance <= cutoff).astype(np.float64)
+
+
+def _butterworth_lowpass_profile(distance: np.ndarray, cutoff: float, order: int) -> np.ndarray:
+    return 1.0 / (1.0 + (distance / cutoff) ** (2 * order))
+
+
+def _gaussian_lowpass_profile(distance: np.ndarray, cutoff: float) -> np.ndarray:
+    return np.exp(-(distance**2) / (2 * (cutoff**2)))
+
+
+def _axis_distances(n: int, centered: bool, half: bool = False) -> np.ndarray:
+    """
+    Khoảng cách (có dấu nếu centered) tới tần số 0 dọc theo một trục độ dài n
+    
+    Args:
+        n: Độ dài trục
+        centered: True cho trục đã dịch tâm; False cho bố cục gốc của FFT
+        half: True cho trục cột của nửa phổ rfft2d (0..n/2, luôn bắt đầu từ tần số 0)
+    """
+    if half:
+        return np.arange(n // 2 + 1)
+    if centered:
+        return np.arange(n) - n // 2
+    k = np.arange(n)
+    return np.minimum(k, n - k)
+
+
+class SeparableMask:
+    """
+    Mặt nạ tách được dạng tích ngoài M[u, v] = row[u] * col[v] (rank-1)
+    Chỉ lưu hai vector 1-D; apply_filter nhân phổ theo hàng rồi theo cột thay vì
+    tạo mặt nạ H×W. Với highpass=True mặt nạ là 1 - row * col, được áp dụng
+    bằng cách lấy phổ trừ đi phần đã lọc thông thấp.
+    """
+    
+    def __init__(self, row: np.ndarray, col: np.ndarray, highpass: bool = False):
+        self.row = row
+        self.col = col
+        self.highpass = highpass
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.row.shape[0], self.col.shape[0])
+    
+    @property
+    def dtype(self) -> np.dtype:
+        return self.row.dtype
+    
+    @property
+    def nbytes(self) -> int:
+        return self.row.nbytes + self.col.nbytes
+    
+    def to_array(self) -> np.ndarray:
+        """
+        Tạo mặt nạ 2D đầy đủ (chỉ dùng khi cần hiển thị)
+        
+        Returns:
+            Mặt nạ bộ lọc (H, W) hoặc (H, W // 2 + 1)
+        """
+        mask = np.outer(self.row, self.col)
+        if self.highpass:
+            mask = 1.0 - mask
+        return mask
+
+
+def read_only(value):
+    """Khóa ghi mảng (hoặc SeparableMask) trước khi đưa vào cache dùng chung"""
+    arrays = (value.row, value.col) if isinstance(value, SeparableMask) else (value,)
+    for array in arrays:
+        array.flags.writeable = False
+    return value
+
+
+def create_distance_matrix(height: int, width: int, half: bool = False,
+                           dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
     """
-    Tạo ma trận khoảng cách từ tâm ảnh
+    Tạo ma trận khoảng cách từ tâm ảnh (tần số 0)
     
     Args:
         height: Chiều cao ảnh
         width: Chiều rộng ảnh
+        half: True để tạo nửa mặt phẳng tần số cho rfft2d (cột 0 là tần số 0)
+        dtype: Kiểu số thực của ma trận (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm (fftshift); False cho bố cục gốc
+            của FFT, tần số 0 ở góc (0, 0) và tần số âm ở nửa sau mỗi trục
         
     Returns:
-        Ma trận khoảng cách (H, W)
+        Ma trận khoảng cách (H, W) hoặc (H, W // 2 + 1) nếu half=True
     """
-    center_y, center_x = height // 2, width // 2
-    y, x = np.ogrid[:height, :width]
-    distance = np.sqrt((x - center_x)**2 + (y - center_y)**2)
+    y = _axis_distances(height, centered).astype(dtype)[:, np.newaxis]
+    x = _axis_distances(width, centered, half).astype(dtype)[np.newaxis, :]
+    distance = np.sqrt(x**2 + y**2)
     return distance
 
 
-def ideal_lowpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
+def ideal_lowpass_filter(height: int, width: int, cutoff: float, half: bool = False,
+                         dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc Low-pass Ideal
     
@@ -32,16 +196,20 @@ def ideal_lowpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
         height: Chiều cao ảnh
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0)
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    distance = create_distance_matrix(height, width)
-    mask = (distance <= cutoff).astype(float)
-    return mask
+    distance = _radial_distances(height, width, dtype)
+    profile = _ideal_lowpass_profile(distance, cutoff)
+    return _radial_mask(profile, height, width, half, dtype, centered)
 
 
-def ideal_highpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
+def ideal_highpass_filter(height: int, width: int, cutoff: float, half: bool = False,
+                          dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc High-pass Ideal
     
@@ -49,14 +217,21 @@ def ideal_highpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
         height: Chiều cao ảnh
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0)
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    return 1.0 - ideal_lowpass_filter(height, width, cutoff)
+    distance = _radial_distances(height, width, dtype)
+    profile = 1.0 - _ideal_lowpass_profile(distance, cutoff)
+    return _radial_mask(profile, height, width, half, dtype, centered)
 
 
-def butterworth_lowpass_filter(height: int, width: int, cutoff: float, order: int = 2) -> np.ndarray:
+def butterworth_lowpass_filter(height: int, width: int, cutoff: float, order: int = 2,
+                               half: bool = False, dtype: np.dtype = np.float64,
+                               centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc Low-pass Butterworth
     
@@ -65,16 +240,21 @@ def butterworth_lowpass_filter(height: int, width: int, cutoff: float, order: in
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0)
         order: Bậc của bộ lọc (mặc định 2)
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    distance = create_distance_matrix(height, width)
-    mask = 1.0 / (1.0 + (distance / cutoff) ** (2 * order))
-    return mask
+    distance = _radial_distances(height, width, dtype)
+    profile = _butterworth_lowpass_profile(distance, cutoff, order)
+    return _radial_mask(profile, height, width, half, dtype, centered)
 
 
-def butterworth_highpass_filter(height: int, width: int, cutoff: float, order: int = 2) -> np.ndarray:
+def butterworth_highpass_filter(height: int, width: int, cutoff: float, order: int = 2,
+                                half: bool = False, dtype: np.dtype = np.float64,
+                                centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc High-pass Butterworth
     
@@ -83,14 +263,20 @@ def butterworth_highpass_filter(height: int, width: int, cutoff: float, order: i
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0)
         order: Bậc của bộ lọc (mặc định 2)
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    return 1.0 - butterworth_lowpass_filter(height, width, cutoff, order)
+    distance = _radial_distances(height, width, dtype)
+    profile = 1.0 - _butterworth_lowpass_profile(distance, cutoff, order)
+    return _radial_mask(profile, height, width, half, dtype, centered)
 
 
-def gaussian_lowpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
+def gaussian_lowpass_filter(height: int, width: int, cutoff: float, half: bool = False,
+                            dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc Low-pass Gaussian
     
@@ -98,16 +284,20 @@ def gaussian_lowpass_filter(height: int, width: int, cutoff: float) -> np.ndarra
         height: Chiều cao ảnh
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0) - độ lệch chuẩn
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    distance = create_distance_matrix(height, width)
-    mask = np.exp(-(distance**2) / (2 * (cutoff**2)))
-    return mask
+    distance = _radial_distances(height, width, dtype)
+    profile = _gaussian_lowpass_profile(distance, cutoff)
+    return _radial_mask(profile, height, width, half, dtype, centered)
 
 
-def gaussian_highpass_filter(height: int, width: int, cutoff: float) -> np.ndarray:
+def gaussian_highpass_filter(height: int, width: int, cutoff: float, half: bool = False,
+                             dtype: np.dtype = np.float64, centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc High-pass Gaussian
     
@@ -115,14 +305,45 @@ def gaussian_highpass_filter(height: int, width: int, cutoff: float) -> np.ndarr
         height: Chiều cao ảnh
         width: Chiều rộng ảnh
         cutoff: Tần số cắt (D0) - độ lệch chuẩn
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
+        
+    Returns:
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
+    """
+    distance = _radial_distances(height, width, dtype)
+    profile = 1.0 - _gaussian_lowpass_profile(distance, cutoff)
+    return _radial_mask(profile, height, width, half, dtype, centered)
+
+
+def gaussian_separable_filter(height: int, width: int, cutoff: float, highpass: bool = False,
+                              half: bool = False, dtype: np.dtype = np.float64,
+                              centered: bool = True) -> SeparableMask:
+    """
+    Tạo bộ lọc Gaussian dạng tách được (không tạo mặt nạ H×W)
+    exp(-(u² + v²) / 2D0²) = exp(-u² / 2D0²) * exp(-v² / 2D0²)
+    
+    Args:
+        height: Chiều cao ảnh
+        width: Chiều rộng ảnh
+        cutoff: Tần số cắt (D0) - độ lệch chuẩn
+        highpass: True cho High-pass (1 - low-pass)
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        SeparableMask tương đương gaussian_lowpass_filter/gaussian_highpass_filter
     """
-    return 1.0 - gaussian_lowpass_filter(height, width, cutoff)
+    row = _gaussian_lowpass_profile(_axis_distances(height, centered).astype(np.float64), cutoff)
+    col = _gaussian_lowpass_profile(_axis_distances(width, centered, half).astype(np.float64), cutoff)
+    return SeparableMask(row.astype(dtype), col.astype(dtype), highpass)
 
 
-def bandreject_filter(height: int, width: int, center_freq: float, bandwidth: float, filter_type: str = 'ideal') -> np.ndarray:
+def bandreject_filter(height: int, width: int, center_freq: float, bandwidth: float, filter_type: str = 'ideal',
+                      half: bool = False, dtype: np.dtype = np.float64,
+                      centered: bool = True) -> np.ndarray:
     """
     Tạo bộ lọc Band-reject (loại bỏ dải tần số)
     
@@ -132,18 +353,28 @@ def bandreject_filter(height: int, width: int, center_freq: float, bandwidth: fl
         center_freq: Tần số trung tâm của dải cần loại bỏ (D0)
         bandwidth: Độ rộng dải tần số (W)
         filter_type: Loại bộ lọc ('ideal', 'butterworth', 'gaussian')
+        half: True để tạo nửa mặt nạ cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 hoặc float64)
+        centered: True cho phổ đã dịch tâm, False cho bố cục gốc của FFT
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
     """
-    distance = create_distance_matrix(height, width)
-    
+    # Profile được tính trên các khoảng cách duy nhất rồi mới gather ra mặt nạ 2D
+    distance = _radial_distances(height, width, dtype)
+    profile = _bandreject_profile(distance, center_freq, bandwidth, filter_type)
+    return _radial_mask(profile, height, width, half, dtype, centered)
+
+
+def _bandreject_profile(distance: np.ndarray, center_freq: float, bandwidth: float,
+                        filter_type: str = 'ideal') -> np.ndarray:
+    """Profile Band-reject theo khoảng cách D (xem bandreject_filter)"""
     if filter_type == 'ideal':
         # Ideal band-reject: loại bỏ dải tần số từ D0 - W/2 đến D0 + W/2
-        mask = np.ones((height, width))
+        profile = np.ones(distance.shape)
         reject_band = (distance >= (center_freq - bandwidth/2)) & (distance <= (center_freq + bandwidth/2))
-        mask[reject_band] = 0.0
-        return mask
+        profile[reject_band] = 0.0
+        return profile
     
     elif filter_type == 'butterworth':
         # Butterworth band-reject filter
@@ -160,8 +391,9 @@ def bandreject_filter(height: int, width: int, center_freq: float, bandwidth: fl
         
         # Tính [D*W / (D² - D₀²)]^(2*order)
         ratio = (D * W) / denominator
-        mask = 1.0 / (1.0 + ratio ** (2 * order))
-        return mask
+        # ratio^(2n) có thể tràn thành inf quanh D0; khi đó mask = 0 là đúng
+        with np.errstate(over='ignore'):
+            return 1.0 / (1.0 + ratio ** (2 * order))
     
     elif filter_type == 'gaussian':
         # Gaussian band-reject filter
@@ -177,16 +409,83 @@ def bandreject_filter(height: int, width: int, center_freq: float, bandwidth: fl
         denominator_sq = (D * W)**2
         denominator_sq = np.where(denominator_sq < 1e-10, 1e-10, denominator_sq)
         
-        mask = 1.0 - np.exp(-(numerator / denominator_sq))
-        return mask
+        return 1.0 - np.exp(-(numerator / denominator_sq))
     
     else:
         raise ValueError(f"Loại bộ lọc không hợp lệ: {filter_type}. Chọn 'ideal', 'butterworth', hoặc 'gaussian'")
 
 
+def _filter_profile(distance: np.ndarray, filter_type: str, filter_mode: str, cutoff: float,
+                    order: int = 2, center_freq: Optional[float] = None,
+                    bandwidth: Optional[float] = None) -> np.ndarray:
+    """Profile của bộ lọc bất kỳ theo khoảng cách D (cùng quy ước với create_filter_mask)"""
+    if filter_mode == 'bandreject':
+        if center_freq is None:
+            center_freq = cutoff
+        if bandwidth is None:
+            bandwidth = cutoff * 0.5
+        return _bandreject_profile(distance, center_freq, bandwidth, filter_type)
+    
+    if filter_type == 'ideal':
+        lowpass = _ideal_lowpass_profile(distance, cutoff)
+    elif filter_type == 'butterworth':
+        lowpass = _butterworth_lowpass_profile(distance, cutoff, order)
+    elif filter_type == 'gaussian':
+        lowpass = _gaussian_lowpass_profile(distance, cutoff)
+    else:
+        raise ValueError(f"Loại bộ lọc không hợp lệ: {filter_type}")
+    
+    if filter_mode == 'lowpass':
+        return lowpass
+    elif filter_mode == 'highpass':
+        return 1.0 - lowpass
+    else:
+        raise ValueError(f"Chế độ lọc không hợp lệ: {filter_mode}")
+
+
+def create_scaled_filter_mask(height: int, width: int, filter_type: str, filter_mode: str,
+                              cutoff: float, order: int = 2, center_freq: Optional[float] = None,
+                              bandwidth: Optional[float] = None,
+                              scale: Tuple[float, float] = (1.0, 1.0), half: bool = False,
+                              dtype: np.dtype = np.float64, centered: bool = True,
+                              separable: bool = False):
+    """
+    Tạo mặt nạ trên lưới (height, width) cho bộ lọc được định nghĩa trên lưới khác
+    
+    Chỉ số tần số (u, v) của lưới này tương ứng với (u * scale[0], v * scale[1]) trên
+    lưới gốc, ví dụ scale = (N / height, M / width) khi lọc từng tile bằng bộ lọc của
+    ảnh đầy đủ đã pad (N, M). Khoảng cách không còn là số nguyên nên tính trực tiếp
+    thay vì dùng chỉ số khoảng cách dùng chung của create_filter_mask.
+    
+    Args:
+        height, width: Kích thước lưới FFT của mặt nạ
+        filter_type, filter_mode, cutoff, order, center_freq, bandwidth: Như create_filter_mask
+            (theo đơn vị chỉ số tần số của lưới gốc)
+        scale: Hệ số quy đổi chỉ số tần số (hàng, cột) sang lưới gốc
+        half, dtype, centered, separable: Như create_filter_mask
+        
+    Returns:
+        Mặt nạ bộ lọc (H, W) hoặc (H, W // 2 + 1) nếu half=True
+        (SeparableMask nếu separable=True và bộ lọc là Gaussian low/high-pass)
+    """
+    y = _axis_distances(height, centered).astype(np.float64) * scale[0]
+    x = _axis_distances(width, centered, half).astype(np.float64) * scale[1]
+    
+    if separable and filter_type == 'gaussian' and filter_mode in ('lowpass', 'highpass'):
+        row = _gaussian_lowpass_profile(y, cutoff)
+        col = _gaussian_lowpass_profile(x, cutoff)
+        return SeparableMask(row.astype(dtype), col.astype(dtype), filter_mode == 'highpass')
+    
+    distance = np.sqrt(y[:, np.newaxis]**2 + x[np.newaxis, :]**2)
+    profile = _filter_profile(distance, filter_type, filter_mode, cutoff, order, center_freq, bandwidth)
+    return profile.astype(dtype, copy=False)
+
+
 def create_filter_mask(height: int, width: int, filter_type: str, filter_mode: str, 
                       cutoff: float, order: int = 2, center_freq: Optional[float] = None, 
-                      bandwidth: Optional[float] = None) -> np.ndarray:
+                      bandwidth: Optional[float] = None, half: bool = False,
+                      dtype: np.dtype = np.float64, centered: bool = True,
+                      separable: bool = False):
     """
     Hàm tổng quát để tạo mặt nạ bộ lọc
     
@@ -199,27 +498,38 @@ def create_filter_mask(height: int, width: int, filter_type: str, filter_mode: s
         order: Bậc bộ lọc (chỉ dùng cho Butterworth)
         center_freq: Tần số trung tâm (chỉ dùng cho band-reject)
         bandwidth: Độ rộng dải (chỉ dùng cho band-reject)
+        half: True để tạo nửa mặt nạ (H, W // 2 + 1) cho nửa phổ của rfft2d
+        dtype: Kiểu số thực của mặt nạ (float32 cho chế độ single precision)
+        centered: True (mặc định) cho phổ đã dịch tâm; False tạo mặt nạ trực tiếp
+            theo bố cục gốc của FFT để bỏ qua fftshift/ifftshift trên phổ
+        separable: True để trả về SeparableMask cho Gaussian low-pass/high-pass
+            (apply_filter xử lý được cả hai dạng)
         
     Returns:
-        Mặt nạ bộ lọc (H, W)
+        Mặt nạ bộ lọc (H, W), hoặc (H, W // 2 + 1) nếu half=True
+        (SeparableMask nếu separable=True và bộ lọc là Gaussian low/high-pass)
     """
+    if separable and filter_type == 'gaussian' and filter_mode in ('lowpass', 'highpass'):
+        return gaussian_separable_filter(height, width, cutoff, filter_mode == 'highpass',
+                                         half, dtype, centered)
+    
     if filter_mode == 'lowpass':
         if filter_type == 'ideal':
-            return ideal_lowpass_filter(height, width, cutoff)
+            return ideal_lowpass_filter(height, width, cutoff, half, dtype, centered)
         elif filter_type == 'butterworth':
-            return butterworth_lowpass_filter(height, width, cutoff, order)
+            return butterworth_lowpass_filter(height, width, cutoff, order, half, dtype, centered)
         elif filter_type == 'gaussian':
-            return gaussian_lowpass_filter(height, width, cutoff)
+            return gaussian_lowpass_filter(height, width, cutoff, half, dtype, centered)
         else:
             raise ValueError(f"Loại bộ lọc không hợp lệ: {filter_type}")
     
     elif filter_mode == 'highpass':
         if filter_type == 'ideal':
-            return ideal_highpass_filter(height, width, cutoff)
+            return ideal_highpass_filter(height, width, cutoff, half, dtype, centered)
         elif filter_type == 'butterworth':
-            return butterworth_highpass_filter(height, width, cutoff, order)
+            return butterworth_highpass_filter(height, width, cutoff, order, half, dtype, centered)
         elif filter_type == 'gaussian':
-            return gaussian_highpass_filter(height, width, cutoff)
+            return gaussian_highpass_filter(height, width, cutoff, half, dtype, centered)
         else:
             raise ValueError(f"Loại bộ lọc không hợp lệ: {filter_type}")
     
@@ -228,7 +538,7 @@ def create_filter_mask(height: int, width: int, filter_type: str, filter_mode: s
             center_freq = cutoff
         if bandwidth is None:
             bandwidth = cutoff * 0.5
-        return bandreject_filter(height, width, center_freq, bandwidth, filter_type)
+        return bandreject_filter(height, width, center_freq, bandwidth, filter_type, half, dtype, centered)
     
     else:
         raise ValueError(f"Chế độ lọc không hợp lệ: {filter_mode}")
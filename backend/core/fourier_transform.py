@@ -1,72 +1,325 @@
 """
 Module xử lý biến đổi Fourier 2D cho ảnh
 Hỗ trợ FFT, IFFT và các thao tác trên miền tần số
+
+Phép biến đổi được thực hiện qua một FFT backend có thể thay đổi
+(numpy.fft, scipy.fft đa luồng hoặc pyFFTW nếu đã cài), chọn bằng biến
+môi trường FFT_BACKEND / FFT_WORKERS hoặc hàm set_fft_backend().
 """
 
+import os
+import time
+from abc import ABC, abstractmethod
 import numpy as np
-from typing import Tuple, Optional
+from typing import Dict, List, Optional, Tuple
+
+from .filters import SeparableMask
+
+try:
+    import scipy.fft as _scipy_fft
+except ImportError:  # pragma: no cover - scipy có trong requirements
+    _scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.numpy_fft as _pyfftw_fft
+    pyfftw.interfaces.cache.enable()
+except ImportError:
+    pyfftw = None
+    _pyfftw_fft = None
+
+
+# Các trục không gian của ảnh (H, W); kênh màu nằm ở trục 2 và được
+# biến đổi cùng lúc trong một lời gọi batch
+SPATIAL_AXES = (0, 1)
+
+
+class FFTBackend(ABC):
+    """
+    Giao diện chung cho các thư viện FFT, biến đổi theo các trục (0, 1)
+    Backend con phải cài đặt đủ fft2/ifft2/rfft2/irfft2 (thiếu thì lỗi ngay khi khởi tạo)
+    """
+    
+    name = 'base'
+    
+    def __init__(self, workers: int = 1):
+        self.workers = max(1, int(workers))
+    
+    @abstractmethod
+    def fft2(self, x: np.ndarray) -> np.ndarray:
+        """FFT 2D phức"""
+    
+    @abstractmethod
+    def ifft2(self, x: np.ndarray) -> np.ndarray:
+        """IFFT 2D phức"""
+    
+    @abstractmethod
+    def rfft2(self, x: np.ndarray) -> np.ndarray:
+        """FFT 2D của mảng thực (nửa phổ theo trục 1)"""
+    
+    @abstractmethod
+    def irfft2(self, x: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """IFFT 2D của nửa phổ về mảng thực kích thước shape"""
+    
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(workers={self.workers})"
+
+
+class NumpyFFTBackend(FFTBackend):
+    """numpy.fft - đơn luồng, luôn có sẵn"""
+    
+    name = 'numpy'
+    
+    def __init__(self, workers: int = 1):
+        # numpy.fft không hỗ trợ đa luồng
+        super().__init__(1)
+    
+    @staticmethod
+    def _keep_precision(result: np.ndarray, x: np.ndarray) -> np.ndarray:
+        # numpy < 2.0 luôn tính bằng double; ép lại về độ chính xác của đầu vào
+        if x.dtype in (np.float32, np.complex64):
+            return result.astype(np.complex64 if np.iscomplexobj(result) else np.float32, copy=False)
+        return result
+    
+    def fft2(self, x):
+        return self._keep_precision(np.fft.fft2(x, axes=SPATIAL_AXES), x)
+    
+    def ifft2(self, x):
+        return self._keep_precision(np.fft.ifft2(x, axes=SPATIAL_AXES), x)
+    
+    def rfft2(self, x):
+        return self._keep_precision(np.fft.rfft2(x, axes=SPATIAL_AXES), x)
+    
+    def irfft2(self, x, shape):
+        return self._keep_precision(np.fft.irfft2(x, s=shape, axes=SPATIAL_AXES), x)
+
+
+class ScipyFFTBackend(FFTBackend):
+    """scipy.fft (pocketfft) với tham số workers để chạy đa luồng"""
+    
+    name = 'scipy'
+    
+    def fft2(self, x):
+        return _scipy_fft.fft2(x, axes=SPATIAL_AXES, workers=self.workers)
+    
+    def ifft2(self, x):
+        return _scipy_fft.ifft2(x, axes=SPATIAL_AXES, workers=self.workers)
+    
+    def rfft2(self, x):
+        return _scipy_fft.rfft2(x, axes=SPATIAL_AXES, workers=self.workers)
+    
+    def irfft2(self, x, shape):
+        return _scipy_fft.irfft2(x, s=shape, axes=SPATIAL_AXES, workers=self.workers)
+
+
+class PyFFTWBackend(FFTBackend):
+    """pyFFTW (FFTW3) với cache plan, chỉ dùng được khi đã cài pyfftw"""
+    
+    name = 'pyfftw'
+    
+    def fft2(self, x):
+        return _pyfftw_fft.fft2(x, axes=SPATIAL_AXES, threads=self.workers)
+    
+    def ifft2(self, x):
+        return _pyfftw_fft.ifft2(x, axes=SPATIAL_AXES, threads=self.workers)
+    
+    def rfft2(self, x):
+        return _pyfftw_fft.rfft2(x, axes=SPATIAL_AXES, threads=self.workers)
+    
+    def irfft2(self, x, shape):
+        return _pyfftw_fft.irfft2(x, s=shape, axes=SPATIAL_AXES, threads=self.workers)
+
+
+_BACKENDS: Dict[str, type] = {'numpy': NumpyFFTBackend}
+if _scipy_fft is not None:
+    _BACKENDS['scipy'] = ScipyFFTBackend
+if _pyfftw_fft is not None:
+    _BACKENDS['pyfftw'] = PyFFTWBackend
+
+DEFAULT_FFT_BACKEND = 'scipy' if 'scipy' in _BACKENDS else 'numpy'
+
+_active_backend: Optional[FFTBackend] = None
+
+
+def available_backends() -> List[str]:
+    """
+    Danh sách các FFT backend dùng được trên máy hiện tại
+    
+    Returns:
+        Tên các backend ('numpy', 'scipy', 'pyfftw')
+    """
+    return list(_BACKENDS)
+
+
+def create_fft_backend(name: str, workers: Optional[int] = None) -> FFTBackend:
+    """
+    Tạo một FFT backend theo tên
+    
+    Args:
+        name: Tên backend ('numpy', 'scipy', 'pyfftw')
+        workers: Số luồng (None hoặc <= 0 = số CPU của máy)
+        
+    Returns:
+        Đối tượng FFTBackend
+    """
+    name = name.lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"FFT backend không hợp lệ hoặc chưa cài: {name}. "
+                         f"Chọn một trong {available_backends()}")
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    return _BACKENDS[name](workers)
 
 
-def fft2d(image: np.ndarray) -> np.ndarray:
+def set_fft_backend(name: Optional[str] = None, workers: Optional[int] = None) -> FFTBackend:
+    """
+    Chọn FFT backend dùng cho toàn bộ process
+    
+    Args:
+        name: Tên backend (None = đọc biến môi trường FFT_BACKEND, mặc định 'scipy')
+        workers: Số luồng (None = đọc biến môi trường FFT_WORKERS, mặc định số CPU)
+        
+    Returns:
+        Backend đang được dùng
+    """
+    global _active_backend
+    if name is None:
+        name = os.environ.get('FFT_BACKEND', DEFAULT_FFT_BACKEND)
+    if workers is None:
+        workers = int(os.environ.get('FFT_WORKERS', '0'))
+    _active_backend = create_fft_backend(name, workers)
+    return _active_backend
+
+
+def get_fft_backend() -> FFTBackend:
+    """
+    Lấy FFT backend hiện tại (khởi tạo từ biến môi trường ở lần gọi đầu)
+    
+    Returns:
+        Backend đang được dùng
+    """
+    if _active_backend is None:
+        return set_fft_backend()
+    return _active_backend
+
+
+def fft2d(image: np.ndarray, shift: bool = True) -> np.ndarray:
     """
     Thực hiện biến đổi Fourier 2D (FFT) cho ảnh
     Workflow: Tách 3 kênh RGB và áp dụng FFT cho từng kênh độc lập
+    (các kênh được biến đổi trong một lời gọi batch theo trục (0, 1))
     
     Args:
         image: Ảnh đầu vào (H, W) hoặc (H, W, C)
+        shift: True để dịch tâm phổ (fftshift); False giữ bố cục gốc của FFT
+            (tần số 0 ở góc), tránh một lần sao chép toàn bộ phổ
         
     Returns:
-        Phổ Fourier đã được dịch tâm (centered)
+        Phổ Fourier (đã dịch tâm nếu shift=True)
         - Nếu ảnh grayscale: (H, W)
         - Nếu ảnh RGB: (H, W, 3) - mỗi kênh được xử lý riêng biệt
     """
-    if len(image.shape) == 2:
-        # Ảnh grayscale
-        fft = np.fft.fft2(image)
-        return np.fft.fftshift(fft)
-    elif len(image.shape) == 3:
-        # Ảnh màu RGB - Bước 1: Tách 3 kênh RGB
-        # Bước 2: Áp dụng FFT cho từng kênh độc lập
-        fft_channels = []
-        for i in range(image.shape[2]):
-            fft = np.fft.fft2(image[:, :, i])
-            fft_channels.append(np.fft.fftshift(fft))
-        # Merge lại thành (H, W, 3)
-        return np.stack(fft_channels, axis=2)
-    else:
+    if image.ndim not in (2, 3):
         raise ValueError(f"Ảnh phải có 2 hoặc 3 chiều, nhận được {len(image.shape)}")
+    fft = get_fft_backend().fft2(image)
+    if shift:
+        fft = np.fft.fftshift(fft, axes=SPATIAL_AXES)
+    return fft
 
 
-def ifft2d(fft_spectrum: np.ndarray) -> np.ndarray:
+def ifft2d(fft_spectrum: np.ndarray, shift: bool = True) -> np.ndarray:
     """
     Thực hiện biến đổi Fourier ngược 2D (IFFT) cho phổ
     Workflow: Áp dụng IFFT cho từng kênh RGB và merge lại
     
     Args:
-        fft_spectrum: Phổ Fourier đã được dịch tâm
+        fft_spectrum: Phổ Fourier; các trục sau (H, W) được biến đổi độc lập
+            (kênh màu, hoặc thêm trục batch khi quét tham số)
+        shift: True nếu phổ đầu vào đã dịch tâm (cần ifftshift trước khi biến đổi)
         
     Returns:
         Ảnh phục hồi (phần thực)
         - Nếu phổ grayscale: (H, W)
         - Nếu phổ RGB: (H, W, 3) - merge 3 kênh đã xử lý
     """
-    if len(fft_spectrum.shape) == 2:
-        # Ảnh grayscale
-        ifft = np.fft.ifftshift(fft_spectrum)
-        image = np.fft.ifft2(ifft)
-        return np.real(image)
-    elif len(fft_spectrum.shape) == 3:
-        # Ảnh màu RGB - Bước 4: Merge 3 kênh đã lọc
-        # Áp dụng IFFT cho từng kênh độc lập
-        image_channels = []
-        for i in range(fft_spectrum.shape[2]):
-            ifft = np.fft.ifftshift(fft_spectrum[:, :, i])
-            channel = np.fft.ifft2(ifft)
-            image_channels.append(np.real(channel))
-        # Merge lại thành (H, W, 3)
-        return np.stack(image_channels, axis=2)
-    else:
-        raise ValueError(f"Phổ phải có 2 hoặc 3 chiều, nhận được {len(fft_spectrum.shape)}")
+    if fft_spectrum.ndim < 2:
+        raise ValueError(f"Phổ phải có ít nhất 2 chiều, nhận được {len(fft_spectrum.shape)}")
+    if shift:
+        fft_spectrum = np.fft.ifftshift(fft_spectrum, axes=SPATIAL_AXES)
+    return np.real(get_fft_backend().ifft2(fft_spectrum))
+
+
+def rfft2d(image: np.ndarray, shift: bool = True) -> np.ndarray:
+    """
+    Thực hiện biến đổi Fourier 2D cho ảnh thực (real-to-complex FFT)
+    Ảnh đầu vào là số thực nên phổ có tính đối xứng Hermite: chỉ cần lưu
+    nửa phổ (W // 2 + 1 cột), giảm gần một nửa thời gian tính và bộ nhớ
+    
+    Args:
+        image: Ảnh đầu vào (H, W) hoặc (H, W, C)
+        shift: True để dịch tâm theo trục hàng (axis 0); False giữ bố cục gốc
+        
+    Returns:
+        Nửa phổ Fourier
+        - Nếu ảnh grayscale: (H, W // 2 + 1)
+        - Nếu ảnh RGB: (H, W // 2 + 1, 3)
+    """
+    if image.ndim not in (2, 3):
+        raise ValueError(f"Ảnh phải có 2 hoặc 3 chiều, nhận được {len(image.shape)}")
+    fft = get_fft_backend().rfft2(image)
+    if shift:
+        fft = np.fft.fftshift(fft, axes=0)
+    return fft
+
+
+def irfft2d(fft_spectrum: np.ndarray, width: int, shift: bool = True) -> np.ndarray:
+    """
+    Thực hiện biến đổi Fourier ngược 2D từ nửa phổ (complex-to-real IFFT)
+    
+    Args:
+        fft_spectrum: Nửa phổ Fourier từ rfft2d; các trục sau (H, W // 2 + 1)
+            được biến đổi độc lập (kênh màu, hoặc thêm trục batch khi quét tham số)
+        width: Chiều rộng ảnh gốc (không suy ra được từ nửa phổ khi W lẻ)
+        shift: True nếu nửa phổ đã dịch tâm theo trục hàng
+        
+    Returns:
+        Ảnh phục hồi (số thực)
+        - Nếu phổ grayscale: (H, width)
+        - Nếu phổ RGB: (H, width, 3)
+    """
+    if fft_spectrum.ndim < 2:
+        raise ValueError(f"Phổ phải có ít nhất 2 chiều, nhận được {len(fft_spectrum.shape)}")
+    if shift:
+        fft_spectrum = np.fft.ifftshift(fft_spectrum, axes=0)
+    return get_fft_backend().irfft2(fft_spectrum, (fft_spectrum.shape[0], width))
+
+
+def expand_half_spectrum(half_spectrum: np.ndarray, width: int, shift: bool = True) -> np.ndarray:
+    """
+    Khôi phục phổ đầy đủ (dịch tâm cả hai trục) từ nửa phổ của rfft2d
+    bằng tính đối xứng Hermite: X[u, v] = conj(X[-u, -v])
+    Dùng cho hiển thị phổ biên độ và mặt nạ (với mảng thực như biên độ
+    hoặc mặt nạ, conj không đổi giá trị)
+    
+    Args:
+        half_spectrum: Nửa phổ (H, W // 2 + 1) hoặc (H, W // 2 + 1, C)
+        width: Chiều rộng phổ đầy đủ
+        shift: True nếu nửa phổ đầu vào đã dịch tâm theo trục hàng
+        
+    Returns:
+        Phổ đầy đủ đã dịch tâm (H, W) hoặc (H, W, C)
+    """
+    height, half_width = half_spectrum.shape[:2]
+    unshifted = np.fft.ifftshift(half_spectrum, axes=0) if shift else half_spectrum
+    
+    full = np.empty((height, width) + half_spectrum.shape[2:], dtype=half_spectrum.dtype)
+    full[:, :half_width] = unshifted
+    # Cột v > W/2 lấy từ cột W - v, hàng u lấy từ hàng -u (mod H)
+    rows = (-np.arange(height)) % height
+    cols = width - np.arange(half_width, width)
+    full[:, half_width:] = np.conj(unshifted[rows][:, cols])
+    
+    return np.fft.fftshift(full, axes=SPATIAL_AXES)
 
 
 def get_magnitude_spectrum(fft_spectrum: np.ndarray) -> np.ndarray:
@@ -98,26 +351,104 @@ def get_phase_spectrum(fft_spectrum: np.ndarray) -> np.ndarray:
     return np.angle(fft_spectrum)
 
 
-def apply_filter(fft_spectrum: np.ndarray, filter_mask: np.ndarray) -> np.ndarray:
+def apply_filter(fft_spectrum: np.ndarray, filter_mask,
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Áp dụng bộ lọc lên phổ Fourier
     Bước 3: Lọc với bán kính r (cutoff) cho từng kênh RGB độc lập
+    Kết quả giữ độ chính xác của phổ: mặt nạ float32 với phổ complex64
+    cho ra complex64 (mặt nạ được ép kiểu nếu cần)
     
     Args:
         fft_spectrum: Phổ Fourier (H, W) hoặc (H, W, 3)
-        filter_mask: Mặt nạ bộ lọc với bán kính r (cùng kích thước với ảnh)
+        filter_mask: Mặt nạ bộ lọc với bán kính r (cùng kích thước với ảnh),
+            hoặc SeparableMask (nhân theo hàng rồi theo cột, không tạo mặt nạ H×W)
+        out: Mảng nhận kết quả (có thể chính là fft_spectrum để lọc tại chỗ);
+            None để cấp phát mảng mới
         
     Returns:
         Phổ đã được lọc (cùng shape với input)
     """
-    if len(fft_spectrum.shape) == 2:
-        return fft_spectrum * filter_mask
-    elif len(fft_spectrum.shape) == 3:
-        # Áp dụng cùng một mask (với bán kính r) cho từng kênh RGB độc lập
-        filtered_channels = []
-        for i in range(fft_spectrum.shape[2]):
-            filtered_channels.append(fft_spectrum[:, :, i] * filter_mask)
-        return np.stack(filtered_channels, axis=2)
-    else:
+    if len(fft_spectrum.shape) not in (2, 3):
         raise ValueError(f"Phổ phải có 2 hoặc 3 chiều, nhận được {len(fft_spectrum.shape)}")
+    # Thêm trục kênh để cùng một mask áp dụng cho từng kênh RGB độc lập
+    channel_axis = (np.newaxis,) * (fft_spectrum.ndim - 2)
+    real_dtype = fft_spectrum.real.dtype
+    
+    if isinstance(filter_mask, SeparableMask):
+        row = filter_mask.row.astype(real_dtype, copy=False)[(slice(None), np.newaxis) + channel_axis]
+        col = filter_mask.col.astype(real_dtype, copy=False)[(np.newaxis, slice(None)) + channel_axis]
+        if filter_mask.highpass and (out is fft_spectrum):
+            # High-pass tại chỗ: phổ -= phần thông thấp
+            lowpassed = fft_spectrum * row
+            lowpassed *= col
+            fft_spectrum -= lowpassed
+            return fft_spectrum
+        out = np.multiply(fft_spectrum, row, out=out)
+        out *= col
+        if filter_mask.highpass:
+            # High-pass = phổ - phổ đã lọc thông thấp
+            np.subtract(fft_spectrum, out, out=out)
+        return out
+    
+    if filter_mask.dtype.itemsize * 2 > fft_spectrum.dtype.itemsize:
+        # Mặt nạ float64 không được nâng phổ complex64 lên complex128
+        filter_mask = filter_mask.astype(real_dtype)
+    return np.multiply(fft_spectrum, filter_mask[(Ellipsis,) + channel_axis], out=out)
+
+
+def benchmark_fft_backends(shape: Tuple[int, ...] = (2048, 2048, 3), repeats: int = 3,
+                           workers: Optional[int] = None, dtype=np.float32) -> Dict:
+    """
+    Micro-benchmark các FFT backend có sẵn trên máy (rfft2 + irfft2 theo trục (0, 1))
+    
+    Args:
+        shape: Kích thước ảnh thử (H, W) hoặc (H, W, C)
+        repeats: Số lần lặp, lấy thời gian nhỏ nhất
+        workers: Số luồng cho các backend đa luồng (None = số CPU)
+        dtype: Kiểu dữ liệu ảnh thử
+        
+    Returns:
+        Dictionary {'shape', 'workers', 'results': {backend: giây}, 'winner'}
+    """
+    rng = np.random.default_rng(0)
+    image = rng.random(shape).astype(dtype)
+    height, width = shape[:2]
+    
+    results = {}
+    for name in available_backends():
+        backend = create_fft_backend(name, workers)
+        # Lần chạy đầu để khởi tạo plan/cache, không tính thời gian
+        backend.irfft2(backend.rfft2(image), (height, width))
+        best = float('inf')
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            backend.irfft2(backend.rfft2(image), (height, width))
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    
+    return {
+        'shape': tuple(shape),
+        'workers': create_fft_backend(DEFAULT_FFT_BACKEND, workers).workers,
+        'results': results,
+        'winner': min(results, key=results.get),
+    }
 
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='So sánh tốc độ các FFT backend trên máy hiện tại')
+    parser.add_argument('--height', type=int, default=2048)
+    parser.add_argument('--width', type=int, default=2048)
+    parser.add_argument('--channels', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    
+    shape = (args.height, args.width) if args.channels <= 1 else (args.height, args.width, args.channels)
+    report = benchmark_fft_backends(shape, args.repeats, args.workers)
+    print(f"Ảnh thử {report['shape']}, workers={report['workers']}")
+    for name, seconds in sorted(report['results'].items(), key=lambda item: item[1]):
+        print(f"  {name:8s} {seconds * 1000:9.2f} ms")
+    print(f"Backend nhanh nhất: {report['winner']}")
@@ -2,14 +2,218 @@
 Module xử lý ảnh chính: kết hợp Fourier transform, filters và metrics
 """
 
+import os
+import time
+from contextlib import ExitStack
 import numpy as np
 import cv2
-from typing import Dict, Tuple, Optional
-from scipy.fft import next_fast_len
+from typing import Callable, Dict, List, Tuple, Optional
 
-from .fourier_transform import fft2d, ifft2d, apply_filter, get_magnitude_spectrum
-from .filters import create_filter_mask
-from .metrics import calculate_all_metrics
+from .fourier_transform import (
+    fft2d, ifft2d, rfft2d, irfft2d, apply_filter,
+    get_magnitude_spectrum, expand_half_spectrum,
+)
+from .filters import create_filter_mask, read_only, SeparableMask
+from .metrics import METRIC_LEVELS, SSIM_WORKERS, calculate_all_metrics, no_reference_score
+from .optimizer import golden_section_search
+from .tiling import process_tiled
+from .cache import MASK_CACHE, SPECTRUM_CACHE, image_digest
+from .workspace import WORKSPACE_POOL
+from .telemetry import StageTimer, timed
+from .fft_plan import FFTPlan, plan_fft, fill_padding
+
+
+# Độ chính xác tính toán: float32 (complex64) hoặc float64 (complex128)
+PRECISIONS = {'float32': np.float32, 'float64': np.float64}
+DEFAULT_PRECISION = 'float32'
+
+# Bộ nhớ tối đa cho một batch IFFT khi quét tham số (ImageProcessor.sweep)
+SWEEP_BATCH_BYTES = int(os.environ.get('SWEEP_MEMORY_MB', '512')) * 1024 * 1024
+
+# Tìm tham số tự động (ImageProcessor.optimize_parameters)
+AUTO_PARAMS = ('cutoff', 'center_freq', 'bandwidth')
+AUTO_OBJECTIVES = ('psnr', 'ssim', 'noref')
+AUTO_PROXY_SIZE = int(os.environ.get('AUTO_PROXY_SIZE', '512'))
+
+
+def _thumbnail(image: np.ndarray, size: int) -> np.ndarray:
+    """Thu nhỏ ảnh để cạnh dài nhất bằng size (giữ nguyên nếu ảnh đã nhỏ hơn)"""
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1.0:
+        return image
+    new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
+
+def _crop_spectrum(spectrum: np.ndarray, full_shape: Tuple[int, int],
+                   proxy_shape: Tuple[int, int], real_fft: bool) -> np.ndarray:
+    """
+    Cắt vùng tần số thấp của phổ (bố cục gốc) thành phổ của lưới nhỏ hơn
+    IFFT của phổ đã cắt là ảnh thu nhỏ giới hạn băng tần (đã bù hệ số chuẩn hóa)
+    """
+    full_h, full_w = full_shape
+    proxy_h, proxy_w = proxy_shape
+    if (proxy_h, proxy_w) == (full_h, full_w):
+        return spectrum
+    rows = np.concatenate([spectrum[:proxy_h // 2], spectrum[full_h - proxy_h // 2:]])
+    if real_fft:
+        cropped = rows[:, :proxy_w // 2 + 1]
+    else:
+        cropped = np.concatenate([rows[:, :proxy_w // 2], rows[:, full_w - proxy_w // 2:]], axis=1)
+    return cropped * cropped.real.dtype.type(proxy_h * proxy_w / (full_h * full_w))
+
+
+def preview_shape(shape: Tuple[int, ...], preview_scale: Optional[float] = None,
+                  max_pixels: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Tính kích thước ảnh xem trước (không bao giờ lớn hơn ảnh gốc)
+    
+    Args:
+        shape: Kích thước ảnh gốc (H, W[, C])
+        preview_scale: Tỷ lệ thu nhỏ (0, 1]
+        max_pixels: Số pixel tối đa của ảnh xem trước
+        
+    Returns:
+        (height, width) của ảnh xem trước
+    """
+    height, width = shape[:2]
+    scale = 1.0
+    if preview_scale:
+        scale = min(scale, preview_scale)
+    if max_pixels:
+        scale = min(scale, np.sqrt(max_pixels / (height * width)))
+    return max(1, int(round(height * scale))), max(1, int(round(width * scale)))
+
+
+def frequency_scale(full_shape: Tuple[int, ...], small_shape: Tuple[int, ...],
+                    fft_planner: Optional[str] = None) -> float:
+    """
+    Hệ số quy đổi tham số tần số (cutoff, center_freq, bandwidth) từ ảnh gốc sang
+    ảnh thu nhỏ để kết quả trông giống nhau
+    
+    Khoảng cách trong mặt nạ tính theo chỉ số tần số của lưới FFT đã pad, tức là số
+    chu kỳ trên kích thước đã pad. Số chu kỳ trên toàn ảnh không đổi khi thu nhỏ nên
+    chỉ cần bù tỷ lệ pad (lưới của FFT plan) khác nhau giữa hai kích thước:
+    k_nhỏ = k_gốc * (n_nhỏ / nhỏ) * (gốc / n_gốc), lấy trung bình nhân của hai trục.
+    
+    Args:
+        full_shape: Kích thước ảnh gốc
+        small_shape: Kích thước ảnh thu nhỏ
+        fft_planner: Như process_image
+        
+    Returns:
+        Hệ số nhân cho tham số tần số
+    """
+    full_grid = plan_fft(full_shape, fft_planner).shape
+    small_grid = plan_fft(small_shape, fft_planner).shape
+    ratios = [
+        (small_n / small) * (full / full_n)
+        for full, small, full_n, small_n in zip(full_shape[:2], small_shape[:2], full_grid, small_grid)
+    ]
+    return float(np.sqrt(ratios[0] * ratios[1]))
+
+
+def estimate_process_memory(shape: Tuple[int, ...], precision: str = DEFAULT_PRECISION,
+                            real_fft: bool = True, metrics_level: str = 'full',
+                            fft_shape: Optional[Tuple[int, int]] = None) -> Dict:
+    """
+    Dự đoán bộ nhớ (byte) của ImageProcessor.process_image cho một kích thước ảnh,
+    để đối chiếu với số đo của profile=1 (MemoryProfiler)
+    
+    Mỗi bước cấp phát mới: pad - ảnh đã pad (bộ đệm WORKSPACE_POOL, 0 khi dùng lại),
+    fft - phổ, mask - mặt nạ đầy đủ (0 khi có trong MASK_CACHE, Gaussian tách được
+    nhỏ hơn nhiều), filter - phổ đã lọc (WORKSPACE_POOL), ifft - kết quả IFFT,
+    quantize - ảnh uint8, metrics - các map float32 của SSIM (các kênh tính song song).
+    Đỉnh là tổng các mảng cùng sống lớn nhất trong các bước, không gồm ảnh gốc.
+    
+    Args:
+        shape: Kích thước ảnh (H, W[, C])
+        precision: 'float32' hoặc 'float64'
+        real_fft: Như process_image
+        metrics_level: Như process_image
+        fft_shape: Lưới FFT (ImageProcessor.fft_plan.shape), None = plan_fft với planner mặc định
+        
+    Returns:
+        Dictionary chứa fft_shape, stages ({bước: byte cấp phát}), peak_bytes
+        (đỉnh bộ nhớ làm việc) và pool_bytes (bộ đệm WORKSPACE_POOL giữ lại sau request)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Độ chính xác không hợp lệ: {precision}. Chọn 'float32' hoặc 'float64'")
+    itemsize = np.dtype(PRECISIONS[precision]).itemsize
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) == 3 else 1
+    fft_h, fft_w = fft_shape or plan_fft(shape, real_fft=real_fft, precision=precision).shape
+    spectrum_w = fft_w // 2 + 1 if real_fft else fft_w
+    
+    padded = fft_h * fft_w * channels * itemsize
+    spectrum = fft_h * spectrum_w * channels * 2 * itemsize
+    mask = fft_h * spectrum_w * itemsize
+    # ifft2d trả về phần thực của mảng phức (mảng phức vẫn được giữ)
+    inverse = padded if real_fft else 2 * padded
+    output = height * width * channels
+    ssim_maps = 7 * min(channels, SSIM_WORKERS) * height * width * 4
+    metrics = ssim_maps if metrics_level == 'full' else 0
+    
+    stages = {
+        'pad': padded,
+        'fft': spectrum,
+        'mask': mask,
+        'filter': spectrum,
+        'ifft': inverse,
+        'quantize': output,
+        'metrics': metrics,
+    }
+    peak = max(
+        padded + spectrum,
+        spectrum + mask + spectrum + inverse,
+        spectrum + inverse + output,
+        spectrum + output + metrics,
+    )
+    return {
+        'shape': list(shape),
+        'fft_shape': [fft_h, fft_w],
+        'precision': precision,
+        'stages': stages,
+        'peak_bytes': peak,
+        'pool_bytes': padded + spectrum,
+    }
+
+
+def _build_shared_mask(*args, **kwargs):
+    """Tạo mặt nạ để lưu vào cache dùng chung; khóa ghi để không request nào sửa được"""
+    return read_only(create_filter_mask(*args, **kwargs))
+
+
+def get_filter_mask(optimal_shape: Tuple[int, int], filter_type: str = 'gaussian',
+                    filter_mode: str = 'lowpass', cutoff: float = 50.0, order: int = 2,
+                    center_freq: Optional[float] = None, bandwidth: Optional[float] = None,
+                    real_fft: bool = True, precision: str = DEFAULT_PRECISION):
+    """
+    Lấy mặt nạ bộ lọc (bố cục gốc của FFT) cho lưới FFT optimal_shape từ MASK_CACHE,
+    tạo nếu chưa có. Gọi trước khi fork các process con để chúng dùng chung mặt nạ
+    
+    Args:
+        optimal_shape: Kích thước lưới FFT đã pad (FFTPlan.shape)
+        filter_type, filter_mode, cutoff, order, center_freq, bandwidth: Tham số bộ lọc
+        real_fft: True cho nửa mặt nạ của rfft2d
+        precision: 'float32' hoặc 'float64'
+        
+    Returns:
+        Mặt nạ chỉ đọc (ndarray hoặc SeparableMask)
+    """
+    optimal_h, optimal_w = optimal_shape
+    cache_key = (
+        (optimal_h, optimal_w), filter_type, filter_mode, float(cutoff), int(order),
+        None if center_freq is None else float(center_freq),
+        None if bandwidth is None else float(bandwidth),
+        real_fft, precision,
+    )
+    return MASK_CACHE.get_or_create(cache_key, lambda: _build_shared_mask(
+        optimal_h, optimal_w, filter_type, filter_mode,
+        cutoff, order, center_freq, bandwidth, half=real_fft,
+        dtype=PRECISIONS[precision], centered=False, separable=True
+    ))
 
 
 class ImageProcessor:
@@ -22,8 +226,27 @@ class ImageProcessor:
         self.filter_mask = None
         self.metrics = None
         self._optimal_shape: Optional[Tuple[int, int]] = None
+        # Lưới FFT và cách pad của lần xử lý gần nhất (xem core.fft_plan)
+        self.fft_plan: Optional[FFTPlan] = None
         self._crop_slices: Optional[Tuple[slice, slice]] = None
-        self._mask_cache: dict = {}
+        self._real_fft: bool = False
+        self._image_digest: Optional[str] = None
+        self.spectrum_cache_hit: bool = False
+        self.tiling: Optional[Dict] = None
+        # Hàm gọi khi bắt đầu mỗi bước xử lý (tên bước: 'auto', 'spectrum', 'filter',
+        # 'inverse', 'tiles', 'metrics'); dùng để báo tiến độ và hủy job (ném ngoại lệ)
+        self.stage_hook: Optional[Callable[[str], None]] = None
+        # Đo thời gian chi tiết từng bước (pad, fft, mask, filter, ifft, quantize,
+        # metrics, ...) của request hiện tại; None = không đo
+        self.timer: Optional[StageTimer] = None
+    
+    def _enter_stage(self, name: str) -> None:
+        if self.stage_hook is not None:
+            self.stage_hook(name)
+    
+    def _timed(self, name: str):
+        """Context manager đo bước name bằng self.timer (không làm gì nếu timer là None)"""
+        return timed(self.timer, name)
     
     def load_image(self, image_path: str) -> np.ndarray:
         """
@@ -40,23 +263,82 @@ class ImageProcessor:
             raise ValueError(f"Không thể đọc ảnh từ {image_path}")
         
         self.original_image = image
+        self._image_digest = None
         return image
     
-    def load_image_from_array(self, image_array: np.ndarray):
+    def load_image_from_array(self, image_array: np.ndarray, digest: Optional[str] = None,
+                              copy: bool = True):
         """
         Load ảnh từ numpy array
         
         Args:
             image_array: Mảng numpy chứa dữ liệu ảnh (BGR hoặc RGB)
+            digest: Mã băm nội dung đã tính sẵn (image_digest), None để tính khi cần
+            copy: False để dùng trực tiếp mảng (ví dụ ảnh chỉ đọc trong IMAGE_STORE);
+                ImageProcessor không bao giờ ghi vào ảnh gốc
+        """
+        self.original_image = image_array.copy() if copy else image_array
+        self._image_digest = digest
+    
+    def get_image_digest(self) -> str:
         """
-        self.original_image = image_array.copy()
+        Lấy mã băm nội dung của ảnh gốc (tính một lần, dùng làm khóa cache phổ)
+        
+        Returns:
+            Chuỗi hex (xem core.cache.image_digest)
+        """
+        if self.original_image is None:
+            raise ValueError("Chưa có ảnh. Hãy load ảnh trước.")
+        if self._image_digest is None:
+            self._image_digest = image_digest(self.original_image)
+        return self._image_digest
+    
+    def _compute_spectrum(self, dtype, real_fft: bool) -> np.ndarray:
+        """
+        Chuẩn hóa ảnh gốc về [0, 1], pad đến lưới của self.fft_plan và FFT thuận
+        
+        Args:
+            dtype: Kiểu số thực (np.float32 hoặc np.float64)
+            real_fft: True dùng rfft2d (nửa phổ), False dùng fft2d
+            
+        Returns:
+            Phổ theo bố cục gốc của FFT (không dịch tâm)
+        """
+        # Pad ảnh đến kích thước tối ưu: mượn bộ đệm từ WORKSPACE_POOL, chuẩn hóa ảnh
+        # về [0, 1] ghi thẳng vào góc trên trái (ép kiểu và chia cho 255 trong một
+        # lượt, không tạo mảng trung gian) rồi ghi phần pad theo fft_plan.pad_mode
+        # (bộ đệm mượn trong bước 'pad' để profile tính cả cấp phát mới của pool)
+        height, width = self.original_image.shape[:2]
+        with ExitStack() as stack:
+            with self._timed('pad'):
+                image_padded = stack.enter_context(
+                    WORKSPACE_POOL.borrow(self._optimal_shape + self.original_image.shape[2:], dtype)
+                )
+                np.divide(self.original_image, dtype(255.0), out=image_padded[:height, :width], dtype=dtype)
+                fill_padding(image_padded, height, width, self.fft_plan.pad_mode)
+            
+            # Bước 2: Thực hiện FFT cho từng kênh RGB độc lập
+            # (fft2d tự động xử lý từng kênh riêng biệt nếu ảnh có 3 kênh)
+            # Ảnh là số thực nên mặc định chỉ tính nửa phổ Hermite với rfft2d.
+            # Mặt nạ được tạo theo bố cục gốc của FFT nên phổ không cần dịch tâm;
+            # chỉ dịch tâm khi hiển thị (get_magnitude_spectrum_image)
+            with self._timed('fft'):
+                if real_fft:
+                    return rfft2d(image_padded, shift=False)
+                return fft2d(image_padded, shift=False)
     
     def process_image(self, filter_type: str = 'gaussian', 
                      filter_mode: str = 'lowpass',
                      cutoff: float = 50.0,
                      order: int = 2,
                      center_freq: Optional[float] = None,
-                     bandwidth: Optional[float] = None) -> np.ndarray:
+                     bandwidth: Optional[float] = None,
+                     real_fft: bool = True,
+                     precision: str = DEFAULT_PRECISION,
+                     use_spectrum_cache: bool = True,
+                     metrics_level: str = 'full',
+                     pad_mode: str = 'zero',
+                     fft_planner: Optional[str] = None) -> np.ndarray:
         """
         Xử lý ảnh với bộ lọc Fourier theo workflow:
         1. Tách 3 kênh RGB (nếu ảnh màu)
@@ -72,81 +354,427 @@ class ImageProcessor:
             order: Bậc bộ lọc (chỉ dùng cho Butterworth)
             center_freq: Tần số trung tâm (chỉ dùng cho band-reject)
             bandwidth: Độ rộng dải (chỉ dùng cho band-reject)
+            real_fft: True (mặc định) dùng rfft2d/irfft2d trên nửa phổ Hermite,
+                False dùng FFT phức đầy đủ
+            precision: 'float32' (mặc định, phổ complex64) hoặc 'float64' (complex128);
+                áp dụng cho mặt nạ, FFT, bước lọc và bước clip/lượng tử hóa.
+                Với ảnh 8-bit, float32 giảm một nửa bộ nhớ mà sai số sau lượng
+                tử hóa không đáng kể (xem precision_error)
+            use_spectrum_cache: True để dùng lại phổ FFT thuận từ SPECTRUM_CACHE
+                khi cùng ảnh được xử lý lại với tham số khác (ví dụ kéo slider)
+            metrics_level: 'full' (MSE, PSNR, SSIM), 'cheap' (MSE, PSNR - bỏ SSIM tốn
+                kém nhất) hoặc 'none' (metrics = None, ví dụ ảnh xem trước cần độ trễ thấp)
+            pad_mode: Cách pad ảnh đến lưới FFT: 'zero', 'reflect' hoặc 'symmetric'
+                (giảm tối/rung ở biên ảnh, xem core.fft_plan)
+            fft_planner: Cách chọn lưới FFT: 'fast' (next_fast_len), 'model' hoặc
+                'measure'; None = FFT_PLANNER. Plan đã chọn nằm trong self.fft_plan
             
         Returns:
             Ảnh đã được xử lý (BGR format)
         """
         if self.original_image is None:
             raise ValueError("Chưa có ảnh để xử lý. Hãy load ảnh trước.")
+        if metrics_level not in METRIC_LEVELS:
+            raise ValueError(f"Mức metrics không hợp lệ: {metrics_level}")
         
-        # Chuyển ảnh về float và normalize về [0, 1]
-        image = self.original_image.astype(np.float32) / 255.0
+        self._enter_stage('spectrum')
+        dtype = self._prepare_spectrum(real_fft, precision, use_spectrum_cache, pad_mode, fft_planner)
         
-        # Lấy kích thước ảnh
-        height, width = image.shape[:2]
-        # Tính kích thước FFT tối ưu để tăng tốc
-        optimal_h = next_fast_len(height)
-        optimal_w = next_fast_len(width)
-        self._optimal_shape = (optimal_h, optimal_w)
-        self._crop_slices = (slice(0, height), slice(0, width))
-        # Pad ảnh đến kích thước tối ưu
-        pad_h = optimal_h - height
-        pad_w = optimal_w - width
-        if pad_h > 0 or pad_w > 0:
-            if image.ndim == 2:
-                image_padded = np.pad(image, ((0, pad_h), (0, pad_w)), mode='constant', constant_values=0.0)
-            else:
-                image_padded = np.pad(image, ((0, pad_h), (0, pad_w), (0, 0)), mode='constant', constant_values=0.0)
-        else:
-            image_padded = image
+        # Tạo mặt nạ bộ lọc (cache dùng chung cho cả process)
+        self._enter_stage('filter')
+        with self._timed('mask'):
+            self.filter_mask = self._get_filter_mask(
+                filter_type, filter_mode, cutoff, order, center_freq, bandwidth, precision
+            )
         
-        # Tạo mặt nạ bộ lọc (cache theo kích thước tối ưu và tham số)
-        cache_key = (
-            self._optimal_shape, filter_type, filter_mode, float(cutoff), int(order),
-            None if center_freq is None else float(center_freq),
-            None if bandwidth is None else float(bandwidth),
-        )
-        if cache_key in self._mask_cache:
-            self.filter_mask = self._mask_cache[cache_key]
-        else:
-            self.filter_mask = create_filter_mask(
-                optimal_h, optimal_w, filter_type, filter_mode,
-                cutoff, order, center_freq, bandwidth
+        # Bước 3: Áp dụng bộ lọc với bán kính r (cutoff) cho từng kênh
+        # (apply_filter áp dụng cùng mask cho tất cả kênh RGB). Phổ trong
+        # SPECTRUM_CACHE chỉ đọc nên kết quả ghi vào bộ đệm mượn từ WORKSPACE_POOL
+        with ExitStack() as stack:
+            with self._timed('filter'):
+                filtered_spectrum = stack.enter_context(
+                    WORKSPACE_POOL.borrow(self.fft_spectrum.shape, self.fft_spectrum.dtype)
+                )
+                apply_filter(self.fft_spectrum, self.filter_mask, out=filtered_spectrum)
+            
+            # Bước 4: Merge 3 kênh đã lọc - thực hiện IFFT cho từng kênh và merge lại
+            self._enter_stage('inverse')
+            with self._timed('ifft'):
+                spatial = self._inverse_transform(filtered_spectrum)
+        with self._timed('quantize'):
+            processed = self._quantize(spatial, dtype)
+        
+        self.processed_image = processed
+        
+        # Tính metrics
+        self.metrics = self._compute_metrics(metrics_level)
+        
+        return processed
+    
+    def process_image_tiled(self, filter_type: str = 'gaussian',
+                            filter_mode: str = 'lowpass',
+                            cutoff: float = 50.0,
+                            order: int = 2,
+                            center_freq: Optional[float] = None,
+                            bandwidth: Optional[float] = None,
+                            precision: str = DEFAULT_PRECISION,
+                            memory_budget: Optional[int] = None,
+                            workers: Optional[int] = None,
+                            metrics_level: str = 'full') -> np.ndarray:
+        """
+        Xử lý ảnh theo tile (overlap-save, xem core.tiling) khi ảnh quá lớn để giữ
+        toàn bộ phổ trong bộ nhớ. Kết quả lệch tối đa 1 mức xám so với process_image
+        (Gaussian/Butterworth); không hỗ trợ Ideal. Không có phổ/mặt nạ toàn ảnh nên
+        get_magnitude_spectrum_image/get_filter_mask_image không dùng được sau bước này.
+        
+        Args:
+            filter_type, filter_mode, cutoff, order, center_freq, bandwidth,
+            precision, metrics_level: Như process_image
+            memory_budget: Bộ nhớ tối đa (byte) cho các tile đang xử lý
+            workers: Số tile xử lý song song
+            
+        Returns:
+            Ảnh đã được xử lý (BGR format)
+        """
+        if self.original_image is None:
+            raise ValueError("Chưa có ảnh để xử lý. Hãy load ảnh trước.")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Độ chính xác không hợp lệ: {precision}. Chọn 'float32' hoặc 'float64'")
+        if metrics_level not in METRIC_LEVELS:
+            raise ValueError(f"Mức metrics không hợp lệ: {metrics_level}")
+        
+        self._enter_stage('tiles')
+        with self._timed('tiles'):
+            processed, self.tiling = process_tiled(
+                self.original_image, filter_type, filter_mode, cutoff, order, center_freq, bandwidth,
+                dtype=PRECISIONS[precision], memory_budget=memory_budget, workers=workers
             )
-            self._mask_cache[cache_key] = self.filter_mask
+        self.fft_spectrum = None
+        self.filter_mask = None
+        self.fft_plan = None
+        self.spectrum_cache_hit = False
+        self.processed_image = processed
+        self.metrics = self._compute_metrics(metrics_level)
         
-        # Bước 2: Thực hiện FFT cho từng kênh RGB độc lập
-        # (fft2d tự động xử lý từng kênh riêng biệt nếu ảnh có 3 kênh)
-        self.fft_spectrum = fft2d(image_padded)
+        return processed
+    
+    def _compute_metrics(self, metrics_level: str) -> Optional[Dict]:
+        """Metrics giữa ảnh gốc và ảnh đã xử lý theo mức (None nếu 'none')"""
+        if metrics_level == 'none':
+            return None
+        self._enter_stage('metrics')
+        with self._timed('metrics'):
+            return calculate_all_metrics(
+                self.original_image,
+                self.processed_image,
+                max_value=255.0,
+                level=metrics_level
+            )
+    
+    def sweep(self, param_sets: List[Dict],
+              real_fft: bool = True,
+              precision: str = DEFAULT_PRECISION,
+              use_spectrum_cache: bool = True,
+              thumbnail_size: Optional[int] = None,
+              batch_bytes: Optional[int] = None,
+              metrics_level: str = 'full',
+              pad_mode: str = 'zero',
+              fft_planner: Optional[str] = None) -> List[Dict]:
+        """
+        Quét nhiều bộ tham số lọc trên cùng một ảnh: FFT thuận chỉ chạy một lần,
+        các IFFT được gộp thành batch (trục cuối) trong giới hạn bộ nhớ
         
-        # Bước 3: Áp dụng bộ lọc với bán kính r (cutoff) cho từng kênh
-        # (apply_filter áp dụng cùng mask cho tất cả kênh RGB)
-        filtered_spectrum = apply_filter(self.fft_spectrum, self.filter_mask)
+        Args:
+            param_sets: Danh sách dict tham số bộ lọc (filter_type, filter_mode,
+                cutoff, order, center_freq, bandwidth)
+            real_fft: Như process_image
+            precision: Như process_image
+            use_spectrum_cache: Như process_image
+            thumbnail_size: Cạnh dài của ảnh thu nhỏ trả về (None = không trả ảnh)
+            batch_bytes: Bộ nhớ tối đa cho một batch IFFT (None = SWEEP_BATCH_BYTES)
+            metrics_level: 'full' hoặc 'cheap' (bỏ SSIM, nhanh hơn nhiều khi quét dày)
+            pad_mode, fft_planner: Như process_image
+            
+        Returns:
+            Danh sách dict {'params', 'metrics'} (thêm 'thumbnail' là ảnh uint8
+            BGR thu nhỏ nếu thumbnail_size được đặt), cùng thứ tự với param_sets
+        """
+        if self.original_image is None:
+            raise ValueError("Chưa có ảnh để xử lý. Hãy load ảnh trước.")
         
-        # Bước 4: Merge 3 kênh đã lọc - thực hiện IFFT cho từng kênh và merge lại
-        # (ifft2d tự động xử lý từng kênh và merge lại)
-        processed = ifft2d(filtered_spectrum)
-        if processed.ndim == 2:
-            processed = processed[self._crop_slices[0], self._crop_slices[1]]
+        dtype = self._prepare_spectrum(real_fft, precision, use_spectrum_cache, pad_mode, fft_planner)
+        spectrum = self.fft_spectrum
+        
+        # Mỗi bộ tham số cần một phổ đã lọc và một ảnh số thực sau IFFT
+        optimal_h, optimal_w = self._optimal_shape
+        channels = spectrum.shape[2] if spectrum.ndim == 3 else 1
+        per_item = spectrum.nbytes + optimal_h * optimal_w * channels * np.dtype(dtype).itemsize
+        if batch_bytes is None:
+            batch_bytes = SWEEP_BATCH_BYTES
+        batch_size = int(max(1, min(len(param_sets), batch_bytes // per_item)))
+        
+        results = []
+        for start in range(0, len(param_sets), batch_size):
+            chunk = param_sets[start:start + batch_size]
+            filtered = np.empty(spectrum.shape + (len(chunk),), dtype=spectrum.dtype)
+            for i, params in enumerate(chunk):
+                mask = self._get_filter_mask(precision=precision, **params)
+                apply_filter(spectrum, mask, out=filtered[..., i])
+            
+            images = self._inverse_transform(filtered)
+            del filtered
+            for i, params in enumerate(chunk):
+                processed = self._quantize(images[..., i], dtype)
+                entry = {
+                    'params': params,
+                    'metrics': calculate_all_metrics(self.original_image, processed, max_value=255.0,
+                                                     level=metrics_level)
+                }
+                if thumbnail_size:
+                    entry['thumbnail'] = _thumbnail(processed, thumbnail_size)
+                results.append(entry)
+        
+        return results
+    
+    def optimize_parameters(self, auto_params: List[str],
+                            filter_type: str = 'gaussian',
+                            filter_mode: str = 'lowpass',
+                            cutoff: float = 50.0,
+                            order: int = 2,
+                            center_freq: Optional[float] = None,
+                            bandwidth: Optional[float] = None,
+                            reference: Optional[np.ndarray] = None,
+                            objective: Optional[str] = None,
+                            proxy_size: int = AUTO_PROXY_SIZE,
+                            real_fft: bool = True,
+                            precision: str = DEFAULT_PRECISION,
+                            tol: float = 0.5,
+                            pad_mode: str = 'zero',
+                            fft_planner: Optional[str] = None) -> Dict:
+        """
+        Tìm cutoff (và center_freq/bandwidth cho band-reject) tối ưu
+        
+        Mỗi lần đánh giá chỉ nhân mặt nạ và IFFT trên ảnh proxy độ phân giải thấp:
+        proxy là vùng tần số thấp (|u| < h/2, |v| < w/2) cắt từ phổ FFT thuận đã cache,
+        tức là bản thu nhỏ giới hạn băng tần của chính ảnh kết quả. Mặt nạ trên lưới
+        proxy trùng với mặt nạ đầy đủ trong băng tần đó (khoảng cách tính theo chỉ số
+        tần số) nên tham số tìm được dùng trực tiếp cho ảnh gốc. Vì vậy khoảng tìm
+        kiếm giới hạn ở tần số Nyquist của proxy (min(h, w) / 2).
+        
+        Args:
+            auto_params: Các tham số cần tìm ('cutoff', 'center_freq', 'bandwidth');
+                nhiều tham số được tìm lần lượt (coordinate descent, 2 vòng)
+            filter_type, filter_mode, cutoff, order, center_freq, bandwidth: Tham số
+                bộ lọc (giá trị của tham số auto là điểm xuất phát, có thể bỏ qua)
+            reference: Ảnh tham chiếu (cùng kích thước ảnh gốc), None = không tham chiếu
+            objective: 'psnr', 'ssim' (cần reference) hoặc 'noref'
+                (metrics.no_reference_score); None = 'psnr' nếu có reference, ngược lại 'noref'
+            proxy_size: Cạnh dài tối đa của lưới proxy
+            real_fft: Như process_image
+            precision: Như process_image
+            tol: Độ chính xác tìm kiếm (đơn vị tần số)
+            pad_mode, fft_planner: Như process_image (dùng cùng giá trị với process_image
+                để tham số tìm được khớp lưới FFT)
+            
+        Returns:
+            Dictionary chứa:
+            - params: Tham số bộ lọc tốt nhất (truyền thẳng cho process_image)
+            - objective, score: Hàm mục tiêu và giá trị tại điểm tốt nhất
+            - points: Các điểm đã đánh giá theo thứ tự (params, score, metrics, ms)
+            - proxy_shape: Kích thước lưới proxy
+            - bounds: Khoảng tìm kiếm [min, max] của từng tham số auto (cận trên theo
+              Nyquist của proxy, không vượt nyquist)
+            - nyquist: Bán kính Nyquist min(N, M) / 2 của lưới FFT của ảnh
+            - at_bound: Các tham số có giá trị tốt nhất nằm ở cận (trong khoảng tol) -
+              tối ưu có thể nằm ngoài khoảng tìm kiếm, không phải cực trị đã tìm được
+            - timings: spectrum_ms (FFT thuận/cache), search_ms, total_ms
+        """
+        if self.original_image is None:
+            raise ValueError("Chưa có ảnh để xử lý. Hãy load ảnh trước.")
+        unknown = [name for name in auto_params if name not in AUTO_PARAMS]
+        if not auto_params or unknown:
+            raise ValueError(f"Tham số auto không hợp lệ: {unknown or auto_params}")
+        if objective is None:
+            objective = 'noref' if reference is None else 'psnr'
+        if objective not in AUTO_OBJECTIVES:
+            raise ValueError(f"Hàm mục tiêu không hợp lệ: {objective}")
+        if objective != 'noref' and reference is None:
+            raise ValueError(f"Hàm mục tiêu {objective} cần ảnh tham chiếu")
+        if reference is not None and reference.shape != self.original_image.shape:
+            raise ValueError(
+                f"Kích thước ảnh tham chiếu không khớp: {reference.shape} vs {self.original_image.shape}"
+            )
+        
+        if filter_mode == 'bandreject' and {'center_freq', 'bandwidth'} <= set(auto_params):
+            # cutoff không ảnh hưởng khi đã có cả center_freq và bandwidth
+            auto_params = [name for name in auto_params if name != 'cutoff']
+        
+        self._enter_stage('auto')
+        start = time.perf_counter()
+        dtype = self._prepare_spectrum(real_fft, precision, True, pad_mode, fft_planner)
+        
+        # Lưới proxy: kích thước chẵn để cắt đối xứng các tần số -h/2 .. h/2 - 1
+        optimal_h, optimal_w = self._optimal_shape
+        scale = min(1.0, proxy_size / max(optimal_h, optimal_w))
+        if scale < 1.0:
+            proxy_shape = (max(2, 2 * round(optimal_h * scale / 2)),
+                           max(2, 2 * round(optimal_w * scale / 2)))
         else:
-            processed = processed[self._crop_slices[0], self._crop_slices[1], :]
+            proxy_shape = self._optimal_shape
+        height, width = self.original_image.shape[:2]
+        proxy_crop = (slice(0, max(1, round(height * proxy_shape[0] / optimal_h))),
+                      slice(0, max(1, round(width * proxy_shape[1] / optimal_w))))
         
-        # Đảm bảo giá trị trong khoảng [0, 1]
-        processed = np.clip(processed, 0.0, 1.0)
+        def to_proxy_image(spectrum):
+            proxy = _crop_spectrum(spectrum, self._optimal_shape, proxy_shape, real_fft)
+            return self._quantize(self._inverse_transform(proxy, proxy_shape[1]), dtype, proxy_crop)
         
-        # Chuyển về [0, 255] và uint8
-        processed = (processed * 255.0).astype(np.uint8)
+        proxy_spectrum = _crop_spectrum(self.fft_spectrum, self._optimal_shape, proxy_shape, real_fft)
+        proxy_original = to_proxy_image(self.fft_spectrum)
+        if reference is not None:
+            reference_processor = ImageProcessor()
+            reference_processor.load_image_from_array(reference, copy=False)
+            reference_processor._prepare_spectrum(real_fft, precision, True, pad_mode, fft_planner)
+            proxy_reference = to_proxy_image(reference_processor.fft_spectrum)
+        spectrum_ms = (time.perf_counter() - start) * 1000.0
         
-        self.processed_image = processed
+        params = {
+            'filter_type': filter_type, 'filter_mode': filter_mode, 'cutoff': float(cutoff),
+            'order': int(order), 'center_freq': center_freq, 'bandwidth': bandwidth,
+        }
+        points = []
         
-        # Tính metrics
-        self.metrics = calculate_all_metrics(
-            self.original_image, 
-            self.processed_image,
-            max_value=255.0
+        def evaluate(overrides: Dict) -> float:
+            t0 = time.perf_counter()
+            candidate = {**params, **overrides}
+            mask = self._get_filter_mask(precision=precision, shape=proxy_shape, **candidate)
+            filtered = apply_filter(proxy_spectrum, mask)
+            output = self._quantize(self._inverse_transform(filtered, proxy_shape[1]), dtype, proxy_crop)
+            if objective == 'noref':
+                metrics = no_reference_score(proxy_original, output)
+                score = metrics['score']
+            else:
+                # PSNR chỉ cần MSE: bỏ qua SSIM ở mỗi lần đánh giá
+                metrics = calculate_all_metrics(proxy_reference, output, max_value=255.0,
+                                                level='full' if objective == 'ssim' else 'cheap')
+                score = metrics[objective]
+            points.append({
+                'params': dict(overrides),
+                'score': score,
+                'metrics': metrics,
+                'ms': (time.perf_counter() - t0) * 1000.0
+            })
+            return score
+        
+        # Tìm lần lượt từng tham số, giữ cố định các tham số còn lại
+        upper = min(proxy_shape) / 2.0
+        bounds = {'cutoff': (1.0, upper), 'center_freq': (1.0, upper), 'bandwidth': (1.0, upper / 2.0)}
+        best_score = None
+        for _ in range(2 if len(auto_params) > 1 else 1):
+            for name in auto_params:
+                fixed = {key: params[key] for key in auto_params if key != name}
+                value, best_score = golden_section_search(
+                    lambda x: evaluate({**fixed, name: x}), *bounds[name], tol=tol
+                )
+                params[name] = value
+        
+        # Điểm tốt nhất nằm ở cận (ví dụ ảnh nhiễu không có dải tần nào đáng loại bỏ):
+        # không phải cực trị tìm được trong khoảng nên báo riêng thay vì coi là tối ưu
+        at_bound = [
+            name for name in auto_params
+            if params[name] <= bounds[name][0] + tol or params[name] >= bounds[name][1] - tol
+        ]
+        
+        search_ms = (time.perf_counter() - start) * 1000.0 - spectrum_ms
+        if self.timer is not None:
+            self.timer.add('auto', search_ms / 1000.0)
+        return {
+            'params': params,
+            'objective': objective,
+            'score': best_score,
+            'points': points,
+            'proxy_shape': list(proxy_shape),
+            'bounds': {name: list(bounds[name]) for name in auto_params},
+            'nyquist': min(self._optimal_shape) / 2.0,
+            'at_bound': at_bound,
+            'timings': {
+                'spectrum_ms': spectrum_ms,
+                'search_ms': search_ms,
+                'total_ms': spectrum_ms + search_ms,
+                'evaluations': len(points)
+            }
+        }
+    
+    def _prepare_spectrum(self, real_fft: bool, precision: str, use_spectrum_cache: bool,
+                          pad_mode: str = 'zero', fft_planner: Optional[str] = None):
+        """
+        Chọn lưới FFT (self.fft_plan) và lấy phổ FFT thuận của ảnh gốc (self.fft_spectrum)
+        
+        Returns:
+            Kiểu số thực tương ứng với precision
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Độ chính xác không hợp lệ: {precision}. Chọn 'float32' hoặc 'float64'")
+        dtype = PRECISIONS[precision]
+        
+        # Lấy kích thước ảnh
+        height, width = self.original_image.shape[:2]
+        # Chọn lưới FFT (mặc định next_fast_len từng trục) và cách pad
+        self.fft_plan = plan_fft(self.original_image.shape, fft_planner, pad_mode, real_fft, precision)
+        self._optimal_shape = self.fft_plan.shape
+        self._crop_slices = (slice(0, height), slice(0, width))
+        self._real_fft = real_fft
+        
+        # Phổ FFT thuận: lấy từ cache theo nội dung ảnh nếu có, nếu không thì
+        # pad + FFT (phổ trong cache chỉ đọc; bước lọc luôn ghi ra mảng mới)
+        if use_spectrum_cache:
+            spectrum_key = (self.get_image_digest(), self._optimal_shape, pad_mode, real_fft, precision)
+            self.spectrum_cache_hit = spectrum_key in SPECTRUM_CACHE
+            self.fft_spectrum = SPECTRUM_CACHE.get_or_create(
+                spectrum_key, lambda: read_only(self._compute_spectrum(dtype, real_fft))
+            )
+        else:
+            self.spectrum_cache_hit = False
+            self.fft_spectrum = self._compute_spectrum(dtype, real_fft)
+        
+        return dtype
+    
+    def _get_filter_mask(self, filter_type: str = 'gaussian', filter_mode: str = 'lowpass',
+                         cutoff: float = 50.0, order: int = 2,
+                         center_freq: Optional[float] = None, bandwidth: Optional[float] = None,
+                         precision: str = DEFAULT_PRECISION,
+                         shape: Optional[Tuple[int, int]] = None):
+        """
+        Lấy mặt nạ bộ lọc cho kích thước FFT hiện tại (hoặc shape) từ MASK_CACHE (tạo nếu chưa có)
+        Cache theo kích thước tối ưu và tham số - các request từ slider lặp lại cùng tham số
+        """
+        return get_filter_mask(
+            shape or self._optimal_shape, filter_type, filter_mode, cutoff, order,
+            center_freq, bandwidth, self._real_fft, precision
         )
+    
+    def _inverse_transform(self, filtered_spectrum: np.ndarray,
+                           width: Optional[int] = None) -> np.ndarray:
+        """IFFT phổ đã lọc (bố cục gốc, có thể có thêm trục batch phía sau)"""
+        # (ifft2d tự động xử lý từng kênh và merge lại)
+        if self._real_fft:
+            return irfft2d(filtered_spectrum, width or self._optimal_shape[1], shift=False)
+        return ifft2d(filtered_spectrum, shift=False)
+    
+    def _quantize(self, processed: np.ndarray, dtype,
+                  crop: Optional[Tuple[slice, slice]] = None) -> np.ndarray:
+        """
+        Crop về kích thước gốc (hoặc crop), clip về [0, 1] và lượng tử hóa thành uint8
+        Tính tại chỗ trên processed (kết quả IFFT tạm, bị ghi đè): nhân 255 rồi
+        clip về [0, 255] cho cùng kết quả với clip [0, 1] rồi nhân 255
+        """
+        crop = crop or self._crop_slices
+        processed = processed[crop[0], crop[1]]
         
-        return processed
+        # Chuyển về [0, 255], đảm bảo giá trị trong khoảng và ép kiểu uint8 (cắt phần thập phân)
+        np.multiply(processed, dtype(255.0), out=processed)
+        np.clip(processed, dtype(0.0), dtype(255.0), out=processed)
+        return processed.astype(np.uint8)
     
     def get_magnitude_spectrum_image(self) -> np.ndarray:
         """
@@ -158,7 +786,13 @@ class ImageProcessor:
         if self.fft_spectrum is None:
             raise ValueError("Chưa có phổ Fourier. Hãy xử lý ảnh trước.")
         
+        # Tính biên độ (số thực) trước rồi mới dịch tâm/khôi phục phổ đầy đủ,
+        # rẻ hơn so với dịch tâm phổ phức
         magnitude = get_magnitude_spectrum(self.fft_spectrum)
+        if self._real_fft:
+            magnitude = expand_half_spectrum(magnitude, self._optimal_shape[1], shift=False)
+        else:
+            magnitude = np.fft.fftshift(magnitude, axes=(0, 1))
         # Crop về kích thước gốc để hiển thị
         if magnitude.ndim == 2:
             magnitude = magnitude[self._crop_slices[0], self._crop_slices[1]]
@@ -180,8 +814,16 @@ class ImageProcessor:
         if self.filter_mask is None:
             raise ValueError("Chưa có mặt nạ bộ lọc. Hãy xử lý ảnh trước.")
         
+        mask = self.filter_mask
+        if isinstance(mask, SeparableMask):
+            # Mặt nạ Gaussian dạng tách được chỉ được tạo thành mảng 2D khi hiển thị
+            mask = mask.to_array()
+        if self._real_fft:
+            mask = expand_half_spectrum(mask, self._optimal_shape[1], shift=False)
+        else:
+            mask = np.fft.fftshift(mask)
         # Crop mask về kích thước gốc để hiển thị
-        mask_cropped = self.filter_mask[self._crop_slices[0], self._crop_slices[1]]
+        mask_cropped = mask[self._crop_slices[0], self._crop_slices[1]]
         mask_normalized = (mask_cropped * 255.0).astype(np.uint8)
         return mask_normalized
     
@@ -206,3 +848,32 @@ class ImageProcessor:
         
         cv2.imwrite(output_path, self.processed_image)
 
+
+def precision_error(image: np.ndarray, **process_kwargs) -> Dict:
+    """
+    So sánh kết quả chế độ float32 với float64 trên cùng một ảnh
+    
+    Args:
+        image: Ảnh đầu vào (uint8, BGR)
+        **process_kwargs: Tham số truyền cho ImageProcessor.process_image
+            (trừ precision)
+            
+    Returns:
+        Dictionary chứa:
+        - max_abs_error: Sai số tuyệt đối lớn nhất (mức xám 0-255) của ảnh uint8
+        - mean_abs_error: Sai số tuyệt đối trung bình (mức xám)
+        - mismatch_ratio: Tỷ lệ pixel khác nhau giữa hai chế độ
+    """
+    process_kwargs.pop('precision', None)
+    outputs = {}
+    for precision in ('float32', 'float64'):
+        processor = ImageProcessor()
+        processor.load_image_from_array(image)
+        outputs[precision] = processor.process_image(precision=precision, **process_kwargs)
+    
+    diff = np.abs(outputs['float32'].astype(np.int16) - outputs['float64'].astype(np.int16))
+    return {
+        'max_abs_error': int(diff.max()),
+        'mean_abs_error': float(diff.mean()),
+        'mismatch_ratio': float(np.count_nonzero(diff) / diff.size),
+    }
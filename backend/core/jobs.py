@@ -0,0 +1,217 @@
+"""
+Module chạy xử lý ảnh bất đồng bộ: pool worker giới hạn, tiến độ theo từng bước,
+hủy job và giữ kết quả có thời hạn (TTL)
+
+Worker là thread: FFT (scipy/pocketfft), OpenCV và phần lớn thao tác numpy nhả GIL
+nên các job chạy song song trên nhiều lõi, đồng thời dùng chung MASK_CACHE,
+SPECTRUM_CACHE và IMAGE_STORE của process.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# Số job chạy đồng thời (0 = số CPU)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '0')) or (os.cpu_count() or 1)
+# Số job tối đa đang chờ hoặc đang chạy; vượt quá thì từ chối job mới
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '32'))
+# Thời gian giữ kết quả (giây) sau khi job kết thúc
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', '600'))
+
+# Thứ tự các bước của một job (ImageProcessor.stage_hook và app.run_process);
+# tiến độ ước lượng theo vị trí của bước hiện tại, các bước không dùng bị bỏ qua
+JOB_STAGES = ('preview', 'auto', 'spectrum', 'filter', 'inverse', 'tiles',
+              'metrics', 'precision', 'encode')
+JOB_STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Job bị hủy - ném ra từ stage hook ở ranh giới giữa hai bước"""
+
+
+class Job:
+    """Trạng thái một job: bước hiện tại, thời gian từng bước, kết quả hoặc lỗi"""
+    
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = 'queued'
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.timings: Dict[str, float] = {}
+        self.result: Optional[Dict] = None
+        self.artifacts: Dict[str, Tuple[bytes, str]] = {}
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._stage_start: Optional[float] = None
+    
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+    
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+    
+    def enter_stage(self, name: str) -> None:
+        """
+        Stage hook: ghi nhận bắt đầu bước name (kết thúc bước trước)
+        
+        Raises:
+            JobCancelled: Nếu job đã được yêu cầu hủy
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self._end_stage()
+        self.stage = name
+        self._stage_start = time.perf_counter()
+        if name in JOB_STAGES:
+            self.progress = max(self.progress, JOB_STAGES.index(name) / len(JOB_STAGES))
+    
+    def _end_stage(self) -> None:
+        if self.stage is not None and self._stage_start is not None:
+            elapsed = (time.perf_counter() - self._stage_start) * 1000.0
+            self.timings[f'{self.stage}_ms'] = self.timings.get(f'{self.stage}_ms', 0.0) + elapsed
+        self._stage_start = None
+    
+    def _finish(self, status: str) -> None:
+        self._end_stage()
+        self.status = status
+        self.stage = None
+        self.finished = time.time()
+        if status == 'done':
+            self.progress = 1.0
+        if self.started is not None:
+            self.timings['total_ms'] = (self.finished - self.started) * 1000.0
+    
+    def to_dict(self) -> Dict:
+        """
+        Trạng thái job (không gồm kết quả)
+        
+        Returns:
+            Dictionary chứa job_id, status, stage, progress, timings, error, thời điểm
+        """
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'timings': dict(self.timings),
+            'cancel_requested': self.cancel_requested,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class JobManager:
+    """Hàng đợi job với pool worker giới hạn, giữ job đã kết thúc trong ttl giây"""
+    
+    def __init__(self, workers: int = JOB_WORKERS, max_jobs: int = JOB_QUEUE_SIZE,
+                 ttl: float = JOB_RESULT_TTL):
+        """
+        Args:
+            workers: Số job chạy đồng thời
+            max_jobs: Số job tối đa đang chờ hoặc đang chạy
+            ttl: Thời gian giữ job đã kết thúc (giây)
+        """
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+    
+    def _purge_expired(self, now: float) -> None:
+        # Gọi khi đang giữ lock
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished + self.ttl <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+    
+    def submit(self, func: Callable[[Job], Tuple[Dict, Dict[str, Tuple[bytes, str]]]]) -> Optional[Job]:
+        """
+        Đưa job vào hàng đợi
+        
+        Args:
+            func: Hàm xử lý nhận Job (gọi job.enter_stage ở đầu mỗi bước), trả về
+                (kết quả, {tên ảnh: (bytes, mimetype)}); ValueError = lỗi tham số (400)
+                
+        Returns:
+            Job hoặc None nếu hàng đợi đã đầy
+        """
+        with self._lock:
+            self._purge_expired(time.time())
+            if sum(job.active for job in self._jobs.values()) >= self.max_jobs:
+                return None
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, func)
+        return job
+    
+    def _run(self, job: Job, func: Callable) -> None:
+        if job.cancel_requested:
+            job._finish('cancelled')
+            return
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.result, job.artifacts = func(job)
+            job._finish('done')
+        except JobCancelled:
+            job._finish('cancelled')
+        except ValueError as e:
+            job.error, job.error_status = str(e), 400
+            job._finish('failed')
+        except Exception as e:
+            import traceback
+            print(f"Error in job {job.id}: {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            job.error, job.error_status = f'Lỗi xử lý: {str(e)}', 500
+            job._finish('failed')
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """Lấy job theo id, None nếu không có hoặc đã hết hạn"""
+        with self._lock:
+            self._purge_expired(time.time())
+            return self._jobs.get(job_id)
+    
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Hủy job: job đang chờ bị hủy ngay, job đang chạy dừng ở ranh giới bước kế tiếp
+        
+        Returns:
+            Job hoặc None nếu không tìm thấy
+        """
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return job
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job._finish('cancelled')
+        return job
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê job
+        
+        Returns:
+            Dictionary chứa workers, max_jobs, ttl và số job theo trạng thái
+        """
+        with self._lock:
+            self._purge_expired(time.time())
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {'workers': self.workers, 'max_jobs': self.max_jobs, 'ttl': self.ttl, **counts}
@@ -2,14 +2,34 @@
 Module tính toán các metrics đánh giá chất lượng ảnh: PSNR, SSIM, MSE
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
-from typing import Tuple
+import cv2
+from typing import Optional, Tuple
+
+
+# SSIM (ssim_metric): cửa sổ Gaussian 11x11, sigma 1.5 và hằng số K1, K2 theo Wang et al. (2004)
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+# Hệ số thu nhỏ ảnh trước khi tính SSIM (1 = độ phân giải gốc, 0 = tự chọn theo kích thước)
+SSIM_DOWNSAMPLE = int(os.environ.get('SSIM_DOWNSAMPLE', '1'))
+# Số kênh SSIM tính song song (0 = số CPU)
+SSIM_WORKERS = int(os.environ.get('SSIM_WORKERS', '0')) or (os.cpu_count() or 1)
+
+
+# Mức tính metrics: 'none' (bỏ qua), 'cheap' (MSE, PSNR), 'full' (MSE, PSNR, SSIM)
+METRIC_LEVELS = ('none', 'cheap', 'full')
 
 
 def mse(image1: np.ndarray, image2: np.ndarray) -> float:
     """
     Tính Mean Squared Error (MSE) giữa hai ảnh
+    Ảnh uint8: một lượt duy nhất bằng cv2.norm (cộng dồn bình phương hiệu bằng số
+    nguyên, kết quả chính xác, không tạo mảng trung gian); kiểu khác: float64
     
     Args:
         image1: Ảnh gốc
@@ -21,6 +41,14 @@ def mse(image1: np.ndarray, image2: np.ndarray) -> float:
     # Đảm bảo hai ảnh cùng kích thước
     if image1.shape != image2.shape:
         raise ValueError(f"Kích thước ảnh không khớp: {image1.shape} vs {image2.shape}")
+    if image1.size == 0:
+        return 0.0
+    
+    if image1.dtype == np.uint8 and image2.dtype == np.uint8:
+        # Gộp các kênh vào trục cột: cv2.norm nhận mảng 2D một kênh với mọi số kênh
+        img1 = np.ascontiguousarray(image1).reshape(image1.shape[0], -1)
+        img2 = np.ascontiguousarray(image2).reshape(image2.shape[0], -1)
+        return float(cv2.norm(img1, img2, cv2.NORM_L2SQR) / image1.size)
     
     # Chuyển về float để tính toán chính xác
     img1 = image1.astype(np.float64)
@@ -31,6 +59,24 @@ def mse(image1: np.ndarray, image2: np.ndarray) -> float:
     return float(mse_value)
 
 
+def psnr_from_mse(mse_value: float, max_value: float = 255.0) -> float:
+    """
+    Tính PSNR (dB) từ MSE đã có
+    
+    Args:
+        mse_value: Giá trị MSE
+        max_value: Giá trị pixel tối đa
+        
+    Returns:
+        Giá trị PSNR (dB), inf nếu MSE = 0
+    """
+    # Tránh chia cho 0
+    if mse_value == 0:
+        return float('inf')
+    
+    return float(20 * np.log10(max_value / np.sqrt(mse_value)))
+
+
 def psnr(image1: np.ndarray, image2: np.ndarray, max_value: float = 255.0) -> float:
     """
     Tính Peak Signal-to-Noise Ratio (PSNR) giữa hai ảnh
@@ -43,27 +89,76 @@ def psnr(image1: np.ndarray, image2: np.ndarray, max_value: float = 255.0) -> fl
     Returns:
         Giá trị PSNR (dB)
     """
-    mse_value = mse(image1, image2)
+    return psnr_from_mse(mse(image1, image2), max_value)
+
+
+def _ssim_channel(x: np.ndarray, y: np.ndarray, c1: float, c2: float,
+                  window: int = SSIM_WINDOW) -> Tuple[float, int]:
+    """
+    SSIM trung bình của một kênh (mảng float32 2D), bỏ viền rộng bằng bán kính cửa sổ
     
-    # Tránh chia cho 0
-    if mse_value == 0:
-        return float('inf')
+    Returns:
+        (tổng SSIM trên vùng trong, số pixel) để cộng dồn giữa các kênh
+    """
+    def blur(a):
+        return cv2.GaussianBlur(a, (window, window), SSIM_SIGMA,
+                                borderType=cv2.BORDER_REFLECT)
+    
+    mu_x = blur(x)
+    mu_y = blur(y)
+    mu_xy = mu_x * mu_y
+    mu_sq = np.multiply(mu_x, mu_x, out=mu_x)
+    mu_sq += np.multiply(mu_y, mu_y, out=mu_y)
+    del mu_y
     
-    # Tính PSNR
-    psnr_value = 20 * np.log10(max_value / np.sqrt(mse_value))
-    return float(psnr_value)
+    # sigma_x + sigma_y chỉ cần một lần lọc: blur(x² + y²) - (mu_x² + mu_y²)
+    sigma_xy = blur(x * y)
+    sigma_xy -= mu_xy
+    sigma_sum = blur(x * x + y * y)
+    sigma_sum -= mu_sq
+    
+    numerator = mu_xy
+    numerator *= 2.0
+    numerator += c1
+    sigma_xy *= 2.0
+    sigma_xy += c2
+    numerator *= sigma_xy
+    denominator = mu_sq
+    denominator += c1
+    sigma_sum += c2
+    denominator *= sigma_sum
+    numerator /= denominator
+    
+    pad = window // 2
+    inner = numerator[pad:numerator.shape[0] - pad, pad:numerator.shape[1] - pad]
+    return float(inner.sum(dtype=np.float64)), inner.size
 
 
 def ssim_metric(image1: np.ndarray, image2: np.ndarray, 
-                max_value: float = 255.0, multichannel: bool = None) -> float:
+                max_value: float = 255.0, multichannel: bool = None,
+                downsample: Optional[int] = None) -> float:
     """
     Tính Structural Similarity Index (SSIM) giữa hai ảnh
     
+    Định nghĩa gốc của Wang et al. (2004): cửa sổ Gaussian 11x11, sigma = 1.5, K1 = 0.01,
+    K2 = 0.03, trung bình SSIM map sau khi bỏ viền 5 pixel, trung bình các kênh màu.
+    Lọc Gaussian tách được bằng cv2.GaussianBlur trên float32, các kênh xử lý song song.
+    Khớp skimage.metrics.structural_similarity(gaussian_weights=True, sigma=1.5,
+    use_sample_covariance=False, data_range=max_value) với sai lệch tuyệt đối < 1e-4:
+    ảnh có kết cấu thường lệch cỡ 1e-6, vùng gần phẳng và sáng lệch nhiều nhất do
+    triệt tiêu số float32 trong các số hạng sigma (blur(x²) - mu²). So với cấu hình
+    mặc định của skimage (cửa sổ đều 7x7) lệch khoảng 0.002 - 0.02 tùy ảnh. Thu nhỏ
+    (downsample) làm trung bình hóa nhiễu nên SSIM cao hơn bản độ phân giải gốc -
+    chỉ so sánh các giá trị cùng hệ số thu nhỏ. Ảnh có cạnh
+    ngắn hơn 11 pixel dùng cửa sổ lẻ lớn nhất vừa ảnh (không so sánh được với cửa sổ 11x11).
+    
     Args:
         image1: Ảnh gốc
         image2: Ảnh đã xử lý
         max_value: Giá trị pixel tối đa (255 cho ảnh 8-bit, 1.0 cho ảnh normalized)
-        multichannel: True nếu ảnh có nhiều kênh màu (None = tự động phát hiện)
+        multichannel: Giữ để tương thích - ảnh (H, W, C) luôn được tính theo từng kênh
+        downsample: Hệ số thu nhỏ (INTER_AREA) trước khi tính; 0 = tự chọn theo
+            Wang et al. (max(1, round(min(H, W) / 256))); None = SSIM_DOWNSAMPLE
         
     Returns:
         Giá trị SSIM (0-1, càng gần 1 càng tốt)
@@ -72,48 +167,140 @@ def ssim_metric(image1: np.ndarray, image2: np.ndarray,
     if image1.shape != image2.shape:
         raise ValueError(f"Kích thước ảnh không khớp: {image1.shape} vs {image2.shape}")
     
-    # Tự động phát hiện multichannel
-    if multichannel is None:
-        multichannel = len(image1.shape) == 3 and image1.shape[2] > 1
+    height, width = image1.shape[:2]
+    if height == 0 or width == 0:
+        raise ValueError("Ảnh rỗng, không tính được SSIM")
+    # Ảnh nhỏ hơn cửa sổ: thu cửa sổ về số lẻ lớn nhất không vượt cạnh ngắn
+    window = min(SSIM_WINDOW, min(height, width) - (1 - min(height, width) % 2))
+    if downsample is None:
+        downsample = SSIM_DOWNSAMPLE
+    if downsample == 0:
+        downsample = max(1, round(min(height, width) / 256))
+    # Không thu nhỏ dưới kích thước cửa sổ
+    downsample = max(1, min(int(downsample), min(height, width) // SSIM_WINDOW))
+    small_size = (width // downsample, height // downsample)
     
-    # Chuyển về float và normalize nếu cần
-    img1 = image1.astype(np.float64)
-    img2 = image2.astype(np.float64)
+    c1 = (SSIM_K1 * max_value) ** 2
+    c2 = (SSIM_K2 * max_value) ** 2
+    
+    if image1.ndim == 3:
+        channels = [(image1[..., c], image2[..., c]) for c in range(image1.shape[2])]
+    else:
+        channels = [(image1, image2)]
     
-    # Nếu max_value là 255, normalize về [0, 1]
-    if max_value > 1.0:
-        img1 = img1 / max_value
-        img2 = img2 / max_value
+    def run(pair) -> Tuple[float, int]:
+        x, y = (np.ascontiguousarray(channel, dtype=np.float32) for channel in pair)
+        if downsample > 1:
+            x = cv2.resize(x, small_size, interpolation=cv2.INTER_AREA)
+            y = cv2.resize(y, small_size, interpolation=cv2.INTER_AREA)
+        return _ssim_channel(x, y, c1, c2, window)
     
-    # Tính SSIM
-    if multichannel:
-        ssim_value = ssim(img1, img2, data_range=1.0, multichannel=True, channel_axis=2)
+    # OpenCV nhả GIL nên các kênh chạy song song trên nhiều lõi
+    workers = min(len(channels), SSIM_WORKERS)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, channels))
     else:
-        ssim_value = ssim(img1, img2, data_range=1.0)
+        results = [run(pair) for pair in channels]
     
-    return float(ssim_value)
+    # Trung bình SSIM của từng kênh (các kênh cùng số pixel)
+    return float(np.mean([total / count for total, count in results]))
 
 
 def calculate_all_metrics(image1: np.ndarray, image2: np.ndarray, 
-                         max_value: float = 255.0) -> dict:
+                         max_value: float = 255.0, level: str = 'full') -> dict:
     """
-    Tính tất cả các metrics: MSE, PSNR, SSIM
+    Tính các metrics theo mức: MSE, PSNR (một lượt MSE) và SSIM nếu level = 'full'
     
     Args:
         image1: Ảnh gốc
         image2: Ảnh đã xử lý
         max_value: Giá trị pixel tối đa
+        level: 'none', 'cheap' (MSE, PSNR) hoặc 'full' (thêm SSIM - chậm nhất)
         
     Returns:
-        Dictionary chứa các metrics
+        Dictionary chứa các metrics (rỗng nếu level = 'none')
     """
+    if level not in METRIC_LEVELS:
+        raise ValueError(f"Mức metrics không hợp lệ: {level}. Chọn {', '.join(METRIC_LEVELS)}")
+    if level == 'none':
+        return {}
+    
     mse_value = mse(image1, image2)
-    psnr_value = psnr(image1, image2, max_value)
-    ssim_value = ssim_metric(image1, image2, max_value)
+    metrics = {
+        'mse': mse_value,
+        'psnr': psnr_from_mse(mse_value, max_value)
+    }
+    if level == 'full':
+        metrics['ssim'] = ssim_metric(image1, image2, max_value)
+    return metrics
+
+
+def estimate_noise(image: np.ndarray) -> float:
+    """
+    Ước lượng độ lệch chuẩn nhiễu Gauss của ảnh (phương pháp Immerkær, 1996)
+    Dùng mặt nạ Laplacian hiệu của hai ảnh đạo hàm bậc hai nên ít nhạy với cạnh
+    
+    Args:
+        image: Ảnh (grayscale hoặc nhiều kênh - lấy trung bình các kênh)
+        
+    Returns:
+        Độ lệch chuẩn nhiễu ước lượng (cùng thang giá trị với ảnh)
+    """
+    img = image.astype(np.float32)
+    if img.ndim == 3:
+        img = img.mean(axis=2)
+    height, width = img.shape
+    if height < 3 or width < 3:
+        return 0.0
+    
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(img, -1, kernel)[1:-1, 1:-1]
+    return float(np.sqrt(np.pi / 2) * np.abs(response).sum(dtype=np.float64)
+                 / (6 * (width - 2) * (height - 2)))
+
+
+def sharpness(image: np.ndarray) -> float:
+    """
+    Độ sắc nét của ảnh: trung bình độ lớn gradient Sobel
+    
+    Args:
+        image: Ảnh (grayscale hoặc nhiều kênh - lấy trung bình các kênh)
+        
+    Returns:
+        Độ lớn gradient trung bình
+    """
+    img = image.astype(np.float32)
+    if img.ndim == 3:
+        img = img.mean(axis=2)
+    grad_x = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=3)
+    return float(cv2.magnitude(grad_x, grad_y).mean())
+
+
+def no_reference_score(original: np.ndarray, processed: np.ndarray) -> dict:
+    """
+    Điểm chất lượng không cần ảnh tham chiếu cho bài toán khử nhiễu:
+    score = (độ sắc nét giữ lại) x (tỷ lệ nhiễu đã loại bỏ)
+    Lọc quá mạnh làm mất chi tiết, lọc quá nhẹ giữ lại nhiễu - score đạt cực đại ở giữa
+    
+    Args:
+        original: Ảnh đầu vào (có nhiễu)
+        processed: Ảnh đã xử lý
+        
+    Returns:
+        Dictionary chứa score, sharpness_ratio, noise_in, noise_out
+    """
+    noise_in = estimate_noise(original)
+    noise_out = estimate_noise(processed)
+    sharpness_in = sharpness(original)
+    sharpness_ratio = min(sharpness(processed) / sharpness_in, 1.0) if sharpness_in > 0 else 0.0
+    noise_removed = max(1.0 - noise_out / noise_in, 0.0) if noise_in > 0 else 0.0
     
     return {
-        'mse': mse_value,
-        'psnr': psnr_value,
-        'ssim': ssim_value
+        'score': sharpness_ratio * noise_removed,
+        'sharpness_ratio': sharpness_ratio,
+        'noise_in': noise_in,
+        'noise_out': noise_out
     }
 
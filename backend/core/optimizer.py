@@ -0,0 +1,71 @@
+"""
+Module tìm tham số bộ lọc tối ưu: lưới thô để khoanh vùng + golden-section search
+"""
+
+import math
+from typing import Callable, Dict, Tuple
+
+
+# Tỷ lệ vàng nghịch đảo (sqrt(5) - 1) / 2
+INV_PHI = (math.sqrt(5.0) - 1.0) / 2.0
+
+
+def golden_section_search(func: Callable[[float], float], lower: float, upper: float,
+                          tol: float = 0.5, grid_points: int = 7,
+                          log_scale: bool = True) -> Tuple[float, float]:
+    """
+    Tìm x trong [lower, upper] làm cực đại func(x)
+    
+    Bước 1 đánh giá một lưới thô (đều theo log nếu log_scale) để khoanh vùng quanh
+    điểm tốt nhất - tránh kẹt ở cực đại địa phương khi hàm không đơn đỉnh.
+    Bước 2 thu hẹp khoảng [điểm lưới trước, điểm lưới sau] bằng golden-section
+    đến khi độ rộng (theo đơn vị gốc) nhỏ hơn tol. Mỗi giá trị x chỉ được đánh giá một lần.
+    
+    Args:
+        func: Hàm mục tiêu (càng lớn càng tốt)
+        lower: Cận dưới (> 0 nếu log_scale)
+        upper: Cận trên
+        tol: Độ rộng khoảng dừng
+        grid_points: Số điểm lưới thô (>= 3)
+        log_scale: Tìm theo log(x) - hợp với tần số cắt (bán kính nhỏ nhạy hơn)
+        
+    Returns:
+        (x tốt nhất, giá trị func tại đó)
+    """
+    if lower <= 0 and log_scale:
+        raise ValueError("Cận dưới phải dương khi tìm theo thang log")
+    if upper <= lower:
+        return lower, func(lower)
+    
+    forward = math.log if log_scale else (lambda x: x)
+    backward = math.exp if log_scale else (lambda t: t)
+    cache: Dict[float, float] = {}
+    
+    def evaluate(t: float) -> float:
+        x = round(min(max(backward(t), lower), upper), 6)
+        if x not in cache:
+            cache[x] = func(x)
+        return cache[x]
+    
+    # Bước 1: lưới thô
+    t_lo, t_hi = forward(lower), forward(upper)
+    grid_points = max(3, grid_points)
+    grid = [t_lo + (t_hi - t_lo) * i / (grid_points - 1) for i in range(grid_points)]
+    scores = [evaluate(t) for t in grid]
+    best = max(range(grid_points), key=lambda i: scores[i])
+    a = grid[max(best - 1, 0)]
+    b = grid[min(best + 1, grid_points - 1)]
+    
+    # Bước 2: golden-section trong khoảng quanh điểm lưới tốt nhất
+    c = b - INV_PHI * (b - a)
+    d = a + INV_PHI * (b - a)
+    while backward(b) - backward(a) > tol:
+        if evaluate(c) >= evaluate(d):
+            b, d = d, c
+            c = b - INV_PHI * (b - a)
+        else:
+            a, c = c, d
+            d = a + INV_PHI * (b - a)
+    
+    best_x = max(cache, key=cache.get)
+    return best_x, cache[best_x]
@@ -0,0 +1,218 @@
+"""
+Module profile bộ nhớ và CPU cho từng request (profile=1, chỉ khi ENABLE_PROFILING=1)
+
+MemoryProfiler thay StageTimer của request: ngoài thời gian còn đo đỉnh tracemalloc
+(numpy báo cấp phát mảng cho tracemalloc) và mức thay đổi RSS của từng bước.
+tracemalloc chỉ bật trong lúc một bước được đo nên request thường không chịu chi phí.
+tracemalloc và cProfile dùng chung cho process: khi nhiều request profile chạy đồng
+thời, số liệu các bước chồng lên nhau nên chỉ nên profile từng request một.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from .telemetry import StageTimer
+from .workspace import WORKSPACE_POOL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_TRACING_LOCK = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+_CPROFILE_LOCK = threading.Lock()
+
+
+def current_rss() -> Optional[int]:
+    """RSS hiện tại của process (byte) từ /proc/self/statm, None nếu không đọc được (không phải Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """RSS lớn nhất từ khi process khởi động (byte), None nếu không có module resource"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux báo KB, macOS báo byte
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _tracing_owned
+    with _TRACING_LOCK:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _tracing_owned
+    with _TRACING_LOCK:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+class MemoryProfiler(StageTimer):
+    """
+    StageTimer đo thêm bộ nhớ của từng bước (các bước không lồng nhau):
+    traced_peak_bytes - đỉnh cấp phát mới trong bước (tracemalloc), traced_held_bytes -
+    phần còn giữ khi kết thúc bước, rss_delta_bytes - thay đổi RSS
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.memory: Dict[str, Dict[str, int]] = {}
+        self.estimate: Optional[Dict] = None
+        self._rss_peak_start = peak_rss()
+        pool = WORKSPACE_POOL.stats()
+        self._pool_start = (pool['hits'], pool['misses'])
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        _start_tracing()
+        rss_start = current_rss()
+        traced_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            traced_end, traced_peak = tracemalloc.get_traced_memory()
+            rss_end = current_rss()
+            _stop_tracing()
+            self.add(name, elapsed)
+            entry = self.memory.setdefault(name, {'traced_peak_bytes': 0, 'traced_held_bytes': 0})
+            entry['traced_peak_bytes'] = max(entry['traced_peak_bytes'], traced_peak - traced_start)
+            entry['traced_held_bytes'] += traced_end - traced_start
+            if rss_start is not None and rss_end is not None:
+                entry['rss_delta_bytes'] = entry.get('rss_delta_bytes', 0) + rss_end - rss_start
+    
+    def report(self, top_functions: Optional[List[Dict]] = None) -> Dict:
+        """
+        Kết quả profile cho response
+        
+        Args:
+            top_functions: Kết quả CallProfiler.top_functions() (None nếu không chạy cProfile)
+            
+        Returns:
+            Dictionary chứa stages ({bước: ms, số đo bộ nhớ, predicted_bytes nếu có
+            estimate}), rss_bytes, rss_peak_bytes, rss_peak_growth_bytes (mức tăng đỉnh
+            RSS của process trong request), workspace_hits/workspace_misses (bộ đệm
+            WORKSPACE_POOL dùng lại/cấp phát mới trong request - bước pad/filter chỉ cấp
+            phát khi miss, còn predicted_bytes luôn tính là miss), estimate và cprofile
+        """
+        predicted = self.estimate['stages'] if self.estimate else {}
+        stages = {}
+        for name, seconds in self.timings.items():
+            stages[name] = {'ms': seconds * 1000.0, **self.memory.get(name, {})}
+            if name in predicted:
+                stages[name]['predicted_bytes'] = predicted[name]
+        rss_peak = peak_rss()
+        pool = WORKSPACE_POOL.stats()
+        report = {
+            'stages': stages,
+            'rss_bytes': current_rss(),
+            'rss_peak_bytes': rss_peak,
+            'rss_peak_growth_bytes': (rss_peak - self._rss_peak_start
+                                      if rss_peak is not None and self._rss_peak_start is not None else None),
+            'workspace_hits': pool['hits'] - self._pool_start[0],
+            'workspace_misses': pool['misses'] - self._pool_start[1],
+            'estimate': self.estimate,
+        }
+        if top_functions is not None:
+            report['cprofile'] = top_functions
+        return report
+
+
+class CallProfiler:
+    """
+    Context manager chạy cProfile trong khối with và lấy top-N hàm theo thời gian
+    cộng dồn; top <= 0 hoặc khi một request khác đang chạy cProfile thì không làm gì
+    """
+    
+    def __init__(self, top: int = 0):
+        self.top = top
+        self.busy = False
+        self._profile: Optional[cProfile.Profile] = None
+    
+    def __enter__(self) -> 'CallProfiler':
+        if self.top > 0:
+            if _CPROFILE_LOCK.acquire(blocking=False):
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                self.busy = True
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+            _CPROFILE_LOCK.release()
+    
+    def top_functions(self) -> Optional[List[Dict]]:
+        """
+        Top-N hàm theo thời gian cộng dồn (cumulative)
+        
+        Returns:
+            Danh sách {function, calls, total_ms (thời gian riêng), cumulative_ms};
+            [] nếu cProfile đang bận, None nếu không chạy cProfile
+        """
+        if self.busy:
+            return []
+        if self._profile is None:
+            return None
+        stats = pstats.Stats(self._profile)
+        stats.sort_stats('cumulative')
+        rows = []
+        for func in stats.fcn_list[:self.top]:
+            _, calls, total, cumulative, _ = stats.stats[func]
+            filename, line, name = func
+            rows.append({
+                'function': f'{os.path.basename(filename)}:{line}({name})' if line else name,
+                'calls': calls,
+                'total_ms': total * 1000.0,
+                'cumulative_ms': cumulative * 1000.0,
+            })
+        return rows
+
+
+def format_profile(report: Dict) -> str:
+    """Tóm tắt kết quả profile trên vài dòng để ghi log"""
+    mb = 1024 * 1024
+    lines = []
+    for name, stage in report['stages'].items():
+        line = f"  {name:28s} {stage['ms']:9.1f} ms"
+        if 'traced_peak_bytes' in stage:
+            line += f"  peak {stage['traced_peak_bytes'] / mb:8.1f} MB"
+        if 'rss_delta_bytes' in stage:
+            line += f"  rss {stage['rss_delta_bytes'] / mb:+8.1f} MB"
+        if 'predicted_bytes' in stage:
+            line += f"  dự đoán {stage['predicted_bytes'] / mb:8.1f} MB"
+        lines.append(line)
+    if report.get('rss_peak_bytes') is not None:
+        lines.append(f"  RSS đỉnh {report['rss_peak_bytes'] / mb:.1f} MB "
+                     f"(tăng {(report['rss_peak_growth_bytes'] or 0) / mb:.1f} MB trong request)")
+    lines.append(f"  WORKSPACE_POOL: {report['workspace_hits']} hit, {report['workspace_misses']} miss")
+    if report.get('estimate'):
+        lines.append(f"  Dự đoán đỉnh bộ nhớ làm việc {report['estimate']['peak_bytes'] / mb:.1f} MB")
+    for row in report.get('cprofile') or []:
+        lines.append(f"  {row['cumulative_ms']:9.1f} ms  {row['calls']:6d}  {row['function']}")
+    return '\n'.join(lines)
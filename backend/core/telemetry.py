@@ -0,0 +1,224 @@
+"""
+Module đo thời gian từng bước xử lý và thống kê theo định dạng Prometheus (thread-safe)
+
+StageTimer đo các bước của một request (trả về client trong 'timings'), đồng thời
+ghi vào histogram STAGE_SECONDS dùng chung cho process; app.py thêm số request,
+thời gian request và số request đang xử lý. render_prometheus() xuất toàn bộ theo
+Prometheus text format 0.0.4 cho /api/metrics (không cần thư viện prometheus_client).
+Số liệu nằm trong bộ nhớ từng process: với nhiều worker gunicorn, mỗi lần scrape
+chỉ thấy worker nhận request.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Ngưỡng bucket (giây): bước xử lý từ vài ms (mặt nạ trong cache) đến hàng chục giây (ảnh 40 MP)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Metric có nhãn: một giá trị (hoặc histogram) cho mỗi bộ giá trị nhãn"""
+    
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+    
+    kind = 'counter'
+    
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._header() + [
+            f'{self.name}{_format_labels(self.labels, values)} {_format_value(value)}'
+            for values, value in series
+        ]
+
+
+class Gauge(Counter):
+    """Giá trị tăng giảm được (ví dụ số request đang xử lý)"""
+    
+    kind = 'gauge'
+    
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Histogram với bucket cố định (giây), đủ để ước lượng p50/p99 bằng histogram_quantile"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float],
+                 labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [số quan sát theo từng bucket (không cộng dồn), +Inf, tổng]
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            else:
+                series[1] += 1
+            series[2] += value
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((values, ([*counts], overflow, total))
+                            for values, (counts, overflow, total) in self._series.items())
+        lines = self._header()
+        for values, (counts, overflow, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}')
+            cumulative += overflow
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, values)} {cumulative}')
+        return lines
+
+
+# Thời gian từng bước (StageTimer) và từng request HTTP (app.py)
+STAGE_SECONDS = Histogram('fourier_stage_seconds', 'Thời gian từng bước xử lý ảnh (giây)',
+                          STAGE_BUCKETS, ('stage',))
+REQUEST_SECONDS = Histogram('fourier_http_request_duration_seconds', 'Thời gian xử lý request HTTP (giây)',
+                            REQUEST_BUCKETS, ('endpoint', 'method'))
+REQUESTS_TOTAL = Counter('fourier_http_requests_total', 'Số request HTTP đã xử lý',
+                         ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('fourier_http_requests_in_flight', 'Số request HTTP đang xử lý',
+                           ('endpoint',))
+
+
+class StageTimer:
+    """
+    Đo thời gian các bước của một request (perf_counter, cộng dồn nếu một bước
+    lặp lại); mỗi lần đo cũng được ghi vào STAGE_SECONDS
+    """
+    
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+    
+    def add(self, name: str, seconds: float) -> None:
+        """Ghi nhận bước name kéo dài seconds giây"""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, name)
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Đo thời gian khối with là bước name (kể cả khi khối ném ngoại lệ)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+    
+    def to_dict(self) -> Dict[str, float]:
+        """
+        Thời gian từng bước cho response
+        
+        Returns:
+            Dictionary {'<bước>_ms': mili giây} theo thứ tự thực hiện
+        """
+        return {f'{name}_ms': seconds * 1000.0 for name, seconds in self.timings.items()}
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    """timer.stage(name), hoặc context manager rỗng nếu timer là None"""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def render_cache_stats(stats: Sequence[Dict]) -> List[str]:
+    """
+    Xuất thống kê các cache (LRUCache.stats() / WorkspacePool.stats()) theo nhãn cache
+    
+    Args:
+        stats: Danh sách dictionary thống kê, mỗi cái có 'name'
+        
+    Returns:
+        Các dòng Prometheus text format
+    """
+    metrics = (
+        ('hits', 'counter', 'fourier_cache_hits_total', 'Số lần tìm thấy trong cache'),
+        ('misses', 'counter', 'fourier_cache_misses_total', 'Số lần không tìm thấy trong cache'),
+        ('evictions', 'counter', 'fourier_cache_evictions_total', 'Số phần tử bị loại vì vượt ngân sách'),
+        ('hit_rate', 'gauge', 'fourier_cache_hit_ratio', 'Tỉ lệ hit từ khi khởi động'),
+        ('entries', 'gauge', 'fourier_cache_entries', 'Số phần tử trong cache'),
+        ('bytes', 'gauge', 'fourier_cache_bytes', 'Tổng số byte trong cache'),
+        ('max_bytes', 'gauge', 'fourier_cache_max_bytes', 'Ngân sách byte của cache'),
+    )
+    lines = []
+    for key, kind, name, documentation in metrics:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{{cache="{_escape(item["name"])}"}} {_format_value(item[key])}'
+                  for item in stats if key in item]
+    return lines
+
+
+def render_gauges(name: str, documentation: str, label: str, values: Dict[str, float]) -> List[str]:
+    """Xuất một gauge với một nhãn từ dictionary {giá trị nhãn: giá trị}"""
+    return [f'# HELP {name} {documentation}', f'# TYPE {name} gauge'] + [
+        f'{name}{{{label}="{_escape(key)}"}} {_format_value(value)}' for key, value in values.items()
+    ]
+
+
+def render_prometheus(extra: Sequence[str] = ()) -> str:
+    """
+    Xuất toàn bộ metric của process theo Prometheus text format
+    
+    Args:
+        extra: Các dòng bổ sung tính lúc scrape (cache, job, ...)
+        
+    Returns:
+        Nội dung cho Content-Type 'text/plain; version=0.0.4'
+    """
+    lines = []
+    for metric in (STAGE_SECONDS, REQUEST_SECONDS, REQUESTS_TOTAL, REQUESTS_IN_FLIGHT):
+        lines += metric.render()
+    lines += extra
+    return '\n'.join(lines) + '\n'
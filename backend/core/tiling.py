@@ -0,0 +1,245 @@
+"""
+Module xử lý ảnh lớn theo tile (overlap-save) trong giới hạn bộ nhớ
+
+Đường xử lý nguyên khối pad ảnh đến (N, M) = next_fast_len và giữ ảnh, phổ và phổ
+đã lọc cùng lúc. Ở đây mỗi tile được mở rộng thêm một dải viền (apron) bằng bán kính
+kernel không gian của bộ lọc, lọc trên lưới FFT nhỏ rồi bỏ phần viền (bị ảnh hưởng
+bởi tích chập vòng) - chỉ giữ phần lõi. Dữ liệu viền lấy theo chỉ số modulo (N, M)
+của ảnh đã pad nên kết quả trùng với đường nguyên khối (kể cả phần quấn vòng ở biên),
+sai khác chỉ đến từ phần đuôi kernel bị cắt bỏ (tolerance).
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.fft import next_fast_len
+
+from .cache import MASK_CACHE
+from .filters import create_scaled_filter_mask, read_only
+from .fourier_transform import rfft2d, irfft2d, apply_filter
+
+
+# Ngưỡng tương đối của đuôi kernel bị cắt bỏ khi tính viền tile. Với bộ lọc
+# Gaussian/Butterworth, 1e-4 cho ảnh uint8 lệch tối đa 1 mức xám so với xử lý nguyên khối
+TILE_TOLERANCE = float(os.environ.get('TILE_TOLERANCE', '1e-4'))
+# Bộ nhớ tối đa cho các tile đang xử lý đồng thời
+TILE_MEMORY_BYTES = int(os.environ.get('TILE_MEMORY_MB', '512')) * 1024 * 1024
+# Số tile xử lý song song (0 = số CPU)
+TILE_WORKERS = int(os.environ.get('TILE_WORKERS', '0')) or (os.cpu_count() or 1)
+# Số mảng số thực cỡ tile cần cho mỗi kênh: block đầu vào, phổ (nửa phổ phức ~ 1 mảng
+# thực), phổ đã lọc, kết quả IFFT, bước clip
+TILE_WORKSPACE_ARRAYS = 5
+# Lõi tile nhỏ nhất (pixel mỗi cạnh) - nhỏ hơn thì phần viền chiếm gần hết công FFT
+MIN_TILE_CORE = 32
+
+
+def kernel_radius(filter_type: str, filter_mode: str, cutoff: float, order: int = 2,
+                  center_freq: Optional[float] = None, bandwidth: Optional[float] = None,
+                  length: int = 1, tolerance: float = TILE_TOLERANCE) -> int:
+    """
+    Bán kính (pixel) mà ngoài đó kernel không gian của bộ lọc nhỏ hơn tolerance lần
+    đỉnh của nó, dọc theo một trục có lưới FFT dài length
+    
+    Chỉ số tần số u trên lưới dài L ứng với u / L chu kỳ/pixel, nên bán kính tỷ lệ
+    với L / cutoff:
+    - Gaussian: kernel Gauss, sigma = L / (2*pi*D0)
+    - Butterworth bậc n: kernel giảm theo hàm mũ với tốc độ 2*pi*D0*sin(pi / 2n) / L
+      (phần ảo của cực gần trục thực nhất của 1 / (1 + (D/D0)^2n))
+    - Band-reject: 1 - mặt nạ là dải thông quanh D0, độ rộng W quyết định bán kính
+    - High-pass = xung đơn vị - low-pass nên cùng bán kính với low-pass
+    
+    Ideal có kernel dạng sinc/jinc (giảm theo lũy thừa, không có bán kính hữu hạn
+    hợp lý) nên không hỗ trợ.
+    
+    Returns:
+        Bán kính (số nguyên, pixel)
+    """
+    if filter_type == 'ideal':
+        raise ValueError("Chế độ tile không hỗ trợ bộ lọc Ideal (kernel không gian không giới hạn)")
+    if filter_type not in ('butterworth', 'gaussian'):
+        raise ValueError(f"Loại bộ lọc không hợp lệ: {filter_type}")
+    
+    log_tolerance = math.log(1.0 / tolerance)
+    if filter_mode == 'bandreject':
+        center_freq = cutoff if center_freq is None else center_freq
+        bandwidth = cutoff * 0.5 if bandwidth is None else bandwidth
+        if filter_type == 'gaussian':
+            # exp(-((D² - D0²) / DW)²) ~ exp(-4 (D - D0)² / W²): Gauss độ lệch chuẩn W / (2*sqrt(2))
+            sigma = length / (2 * math.pi * bandwidth / (2 * math.sqrt(2)))
+            radius = math.sqrt(2 * log_tolerance) * sigma
+        else:
+            # Butterworth band-reject (bậc 2): dải thông ~ Butterworth theo (D - D0), cutoff W / 2
+            radius = log_tolerance * length / (2 * math.pi * (bandwidth / 2) * math.sin(math.pi / 4))
+    elif filter_type == 'gaussian':
+        sigma = length / (2 * math.pi * cutoff)
+        radius = math.sqrt(2 * log_tolerance) * sigma
+    else:
+        radius = log_tolerance * length / (2 * math.pi * cutoff * math.sin(math.pi / (2 * order)))
+    return int(math.ceil(radius))
+
+
+def estimate_monolithic_bytes(shape: Tuple[int, ...], itemsize: int = 4) -> int:
+    """
+    Ước lượng bộ nhớ đỉnh (byte) của ImageProcessor.process_image nguyên khối
+    
+    Args:
+        shape: Kích thước ảnh (H, W[, C])
+        itemsize: Số byte của kiểu số thực (4 cho float32, 8 cho float64)
+    """
+    channels = shape[2] if len(shape) == 3 else 1
+    padded = next_fast_len(shape[0]) * next_fast_len(shape[1]) * channels
+    return padded * itemsize * TILE_WORKSPACE_ARRAYS
+
+
+def plan_tiles(shape: Tuple[int, ...], apron: Tuple[int, int], itemsize: int = 4,
+               memory_budget: int = TILE_MEMORY_BYTES, workers: int = TILE_WORKERS) -> Dict:
+    """
+    Chọn kích thước tile để workers tile đồng thời nằm trong memory_budget
+    
+    Bắt đầu với một tile phủ toàn ảnh, chia đôi cạnh lõi dài hơn cho đến khi
+    (lõi + 2 * viền), làm tròn lên next_fast_len, vừa ngân sách
+    
+    Returns:
+        Dictionary chứa core (lõi tile), fft_shape (lưới FFT của tile), workers
+    """
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) == 3 else 1
+    apron_h, apron_w = apron
+    bytes_per_pixel = channels * itemsize * TILE_WORKSPACE_ARRAYS
+    
+    core_h, core_w = height, width
+    while True:
+        fft_shape = (next_fast_len(core_h + 2 * apron_h), next_fast_len(core_w + 2 * apron_w))
+        tile_count = math.ceil(height / core_h) * math.ceil(width / core_w)
+        active = max(1, min(workers, tile_count))
+        if fft_shape[0] * fft_shape[1] * bytes_per_pixel * active <= memory_budget:
+            break
+        if max(core_h, core_w) <= MIN_TILE_CORE:
+            raise ValueError(
+                f"Ngân sách bộ nhớ {memory_budget // (1024 * 1024)} MB quá nhỏ so với "
+                f"bán kính kernel {apron_h}x{apron_w} pixel của bộ lọc"
+            )
+        if core_h >= core_w:
+            core_h = max(MIN_TILE_CORE, math.ceil(core_h / 2))
+        else:
+            core_w = max(MIN_TILE_CORE, math.ceil(core_w / 2))
+    
+    return {'core': (core_h, core_w), 'fft_shape': fft_shape, 'workers': active}
+
+
+def plan_image_tiles(shape: Tuple[int, ...], filter_type: str = 'gaussian', filter_mode: str = 'lowpass',
+                     cutoff: float = 50.0, order: int = 2,
+                     center_freq: Optional[float] = None, bandwidth: Optional[float] = None,
+                     dtype=np.float32, memory_budget: Optional[int] = None,
+                     workers: Optional[int] = None,
+                     tolerance: float = TILE_TOLERANCE) -> Dict:
+    """
+    Kế hoạch tile của process_tiled cho ảnh kích thước shape (không xử lý ảnh), dùng để
+    kiểm tra trước chế độ tile có khả thi không
+    
+    Args:
+        Như process_tiled (shape thay cho ảnh)
+        
+    Returns:
+        Dictionary như plan_tiles, thêm apron (viền theo hai trục)
+        
+    Raises:
+        ValueError: Bộ lọc Ideal, hoặc không có tile nào vừa memory_budget
+    """
+    apron = tuple(
+        min(kernel_radius(filter_type, filter_mode, cutoff, order, center_freq, bandwidth,
+                          length, tolerance), length)
+        for length in (next_fast_len(shape[0]), next_fast_len(shape[1]))
+    )
+    plan = plan_tiles(shape, apron, np.dtype(dtype).itemsize,
+                      TILE_MEMORY_BYTES if memory_budget is None else memory_budget,
+                      TILE_WORKERS if workers is None else workers)
+    plan['apron'] = apron
+    return plan
+
+
+def process_tiled(image: np.ndarray, filter_type: str = 'gaussian', filter_mode: str = 'lowpass',
+                  cutoff: float = 50.0, order: int = 2,
+                  center_freq: Optional[float] = None, bandwidth: Optional[float] = None,
+                  dtype=np.float32, memory_budget: Optional[int] = None,
+                  workers: Optional[int] = None,
+                  tolerance: float = TILE_TOLERANCE) -> Tuple[np.ndarray, Dict]:
+    """
+    Lọc ảnh theo tile (overlap-save), kết quả tương đương ImageProcessor.process_image
+    
+    Args:
+        image: Ảnh uint8 (H, W) hoặc (H, W, C)
+        filter_type, filter_mode, cutoff, order, center_freq, bandwidth: Tham số bộ lọc
+            (đơn vị chỉ số tần số của lưới nguyên khối next_fast_len(H) x next_fast_len(W))
+        dtype: Kiểu số thực (np.float32 hoặc np.float64)
+        memory_budget: Bộ nhớ tối đa (byte) cho các tile đang xử lý (None = TILE_MEMORY_BYTES)
+        workers: Số tile xử lý song song (None = TILE_WORKERS)
+        tolerance: Ngưỡng cắt đuôi kernel (xem kernel_radius)
+        
+    Returns:
+        (ảnh uint8 đã xử lý, thông tin tile: tiles, core, fft_shape, apron, workers, tolerance)
+    """
+    height, width = image.shape[:2]
+    full_h, full_w = next_fast_len(height), next_fast_len(width)
+    plan = plan_image_tiles(image.shape, filter_type, filter_mode, cutoff, order, center_freq, bandwidth,
+                            dtype, memory_budget, workers, tolerance)
+    (core_h, core_w), (tile_h, tile_w) = plan['core'], plan['fft_shape']
+    apron_h, apron_w = plan['apron']
+    
+    # Mặt nạ chung cho mọi tile: chỉ số tần số của lưới tile quy đổi về lưới nguyên khối
+    scale = (full_h / tile_h, full_w / tile_w)
+    cache_key = (
+        'tile', (tile_h, tile_w), scale, filter_type, filter_mode, float(cutoff), int(order),
+        None if center_freq is None else float(center_freq),
+        None if bandwidth is None else float(bandwidth), np.dtype(dtype).str,
+    )
+    mask = MASK_CACHE.get_or_create(cache_key, lambda: read_only(create_scaled_filter_mask(
+        tile_h, tile_w, filter_type, filter_mode, cutoff, order, center_freq, bandwidth,
+        scale=scale, half=True, dtype=dtype, centered=False, separable=True
+    )))
+    
+    output = np.empty_like(image)
+    
+    def run(origin: Tuple[int, int]) -> None:
+        row0, col0 = origin
+        rows = (row0 - apron_h + np.arange(tile_h)) % full_h
+        cols = (col0 - apron_w + np.arange(tile_w)) % full_w
+        # Phần thuộc vùng pad (>= H, W) của ảnh nguyên khối là 0
+        valid_rows = np.flatnonzero(rows < height)
+        valid_cols = np.flatnonzero(cols < width)
+        block = np.zeros((tile_h, tile_w) + image.shape[2:], dtype=dtype)
+        block[np.ix_(valid_rows, valid_cols)] = image[np.ix_(rows[valid_rows], cols[valid_cols])]
+        block /= dtype(255.0)
+        
+        spectrum = rfft2d(block, shift=False)
+        del block
+        apply_filter(spectrum, mask, out=spectrum)
+        result = irfft2d(spectrum, tile_w, shift=False)
+        del spectrum
+        
+        rows_kept = min(core_h, height - row0)
+        cols_kept = min(core_w, width - col0)
+        core = result[apron_h:apron_h + rows_kept, apron_w:apron_w + cols_kept]
+        np.clip(core, dtype(0.0), dtype(1.0), out=core)
+        core *= dtype(255.0)
+        output[row0:row0 + rows_kept, col0:col0 + cols_kept] = core
+    
+    origins = [(row0, col0) for row0 in range(0, height, core_h) for col0 in range(0, width, core_w)]
+    if plan['workers'] > 1:
+        with ThreadPoolExecutor(max_workers=plan['workers']) as executor:
+            list(executor.map(run, origins))
+    else:
+        for origin in origins:
+            run(origin)
+    
+    return output, {
+        'tiles': len(origins),
+        'core': [core_h, core_w],
+        'fft_shape': [tile_h, tile_w],
+        'apron': [apron_h, apron_w],
+        'workers': plan['workers'],
+        'tolerance': tolerance,
+    }
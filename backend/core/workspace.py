@@ -0,0 +1,125 @@
+"""
+Module pool bộ đệm làm việc (workspace) dùng chung cho toàn bộ process (thread-safe)
+Bộ đệm tạm của đường xử lý chính (ảnh đã pad, phổ đã lọc) được mượn theo
+(shape, dtype) và trả lại sau mỗi request thay vì cấp phát mới: các request kéo
+slider trên cùng kích thước ảnh không phải xin lại hàng trăm MB từ allocator
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+import numpy as np
+
+
+class WorkspacePool:
+    """Pool mảng numpy theo (shape, dtype), giới hạn tổng số byte của các mảng đang rảnh"""
+    
+    def __init__(self, max_bytes: int, name: str = 'workspace'):
+        """
+        Args:
+            max_bytes: Tổng số byte tối đa của các mảng rảnh được giữ lại
+            name: Tên pool (dùng khi báo cáo thống kê)
+        """
+        self.name = name
+        self.max_bytes = int(max_bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.in_use = 0
+        self._free: 'OrderedDict[Hashable, List[np.ndarray]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(shape: Tuple[int, ...], dtype) -> Hashable:
+        return (tuple(int(size) for size in shape), np.dtype(dtype).str)
+    
+    def acquire(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """
+        Mượn một mảng C-contiguous (nội dung không xác định, giống np.empty)
+        
+        Args:
+            shape: Kích thước mảng
+            dtype: Kiểu dữ liệu
+            
+        Returns:
+            Mảng từ pool hoặc mảng mới nếu pool không có sẵn
+        """
+        key = self._key(shape, dtype)
+        with self._lock:
+            self.in_use += 1
+            arrays = self._free.get(key)
+            if arrays:
+                array = arrays.pop()
+                if not arrays:
+                    del self._free[key]
+                self.current_bytes -= array.nbytes
+                self.hits += 1
+                return array
+            self.misses += 1
+        return np.empty(key[0], dtype=dtype)
+    
+    def release(self, array: np.ndarray) -> None:
+        """
+        Trả mảng về pool (không được dùng mảng sau khi trả); loại bỏ các mảng
+        rảnh ít dùng nhất nếu vượt ngân sách, mảng lớn hơn cả ngân sách bị bỏ
+        """
+        key = self._key(array.shape, array.dtype)
+        with self._lock:
+            self.in_use -= 1
+            if array.nbytes > self.max_bytes:
+                return
+            self._free.setdefault(key, []).append(array)
+            self._free.move_to_end(key)
+            self.current_bytes += array.nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._free))
+                arrays = self._free[oldest_key]
+                self.current_bytes -= arrays.pop(0).nbytes
+                if not arrays:
+                    del self._free[oldest_key]
+                self.evictions += 1
+    
+    @contextmanager
+    def borrow(self, shape: Tuple[int, ...], dtype) -> Iterator[np.ndarray]:
+        """Mượn mảng trong khối with, tự trả lại khi ra khỏi khối (kể cả khi lỗi)"""
+        array = self.acquire(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.release(array)
+    
+    def clear(self) -> None:
+        """Bỏ toàn bộ mảng rảnh (giữ nguyên bộ đếm)"""
+        with self._lock:
+            self._free.clear()
+            self.current_bytes = 0
+    
+    def stats(self) -> Dict:
+        """
+        Thống kê pool
+        
+        Returns:
+            Dictionary chứa số mảng rảnh, số byte, số mảng đang mượn, hits, misses, evictions, hit_rate
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': sum(len(arrays) for arrays in self._free.values()),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'in_use': self.in_use,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# Bộ đệm tạm của ImageProcessor.process_image; một ảnh 12 MP float32 cần hai
+# mảng ~144 MB (ảnh đã pad và phổ đã lọc) cho mỗi request chạy đồng thời
+WORKSPACE_POOL = WorkspacePool(int(os.environ.get('WORKSPACE_POOL_MB', '512')) * 1024 * 1024)
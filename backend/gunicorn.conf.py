@@ -0,0 +1,59 @@
+"""
+Cấu hình gunicorn cho môi trường production
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- preload_app: process master import app và chạy warm-up (wsgi.py) một lần trước
+  khi fork; mặt nạ bộ lọc, plan FFT và các module nặng được các worker dùng chung
+  (copy-on-write), worker mới (sau max_requests) cũng khởi động ngay
+- Số luồng FFT/tile/SSIM/BLAS/OpenCV của mỗi tác vụ = số CPU / số tác vụ tính toán
+  đồng thời (worker x (luồng HTTP + JOB_WORKERS)) để tổng số luồng tính toán không
+  vượt số lõi khi mọi luồng cùng bận. Biến môi trường phải đặt trước khi numpy được
+  import nên được đặt ở đây (file cấu hình chạy trước khi load app)
+
+Lưu ý: IMAGE_STORE (image_id) và job của /api/jobs nằm trong bộ nhớ từng worker.
+Mặc định 1 worker (nhiều luồng) để frontend hỏi trạng thái job đúng worker;
+chỉ tăng WEB_WORKERS khi client gửi kèm ảnh trong mỗi request (/api/process).
+"""
+
+import os
+
+
+cpu_count = os.cpu_count() or 1
+
+# Worker và luồng HTTP mỗi worker (gthread: request chờ I/O không giữ worker)
+workers = int(os.environ.get('WEB_WORKERS', '1'))
+threads = int(os.environ.get('WEB_THREADS', '8'))
+worker_class = 'gthread'
+
+# Job chạy đồng thời trong một worker: 2 để một job tính FFT trong khi job kia
+# ở bước một luồng (metrics, mã hóa ảnh)
+os.environ.setdefault('JOB_WORKERS', '2')
+
+# Số luồng tính toán của mỗi request/job: mỗi luồng HTTP và mỗi job có thể chạy
+# pipeline cùng lúc, mỗi pipeline dùng pool FFT/tile/SSIM của riêng nó
+concurrent_tasks = workers * (threads + int(os.environ['JOB_WORKERS']))
+compute_threads = max(1, cpu_count // concurrent_tasks)
+os.environ.setdefault('FFT_WORKERS', str(compute_threads))
+os.environ.setdefault('TILE_WORKERS', str(compute_threads))
+os.environ.setdefault('SSIM_WORKERS', str(compute_threads))
+os.environ.setdefault('OPENCV_THREADS', str(compute_threads))
+for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(name, str(compute_threads))
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+# Khởi động lại worker định kỳ để giải phóng bộ nhớ phân mảnh của ảnh lớn
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Khởi tạo lại thread pool của OpenCV trong worker (thread không tồn tại sau fork)"""
+    import cv2
+    cv2.setNumThreads(int(os.environ['OPENCV_THREADS']))
@@ -0,0 +1,73 @@
+"""
+Kiểm tra LRUCache.get_or_create khi nhiều luồng cùng tạo một key
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from core.cache import LRUCache
+
+
+THREADS = 8
+
+
+def _run_concurrently(func):
+    barrier = threading.Barrier(THREADS)
+    
+    def call(_):
+        barrier.wait()
+        return func()
+    
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return [executor.submit(call, i) for i in range(THREADS)]
+
+
+def test_get_or_create_runs_factory_once_per_key():
+    cache = LRUCache(1024 * 1024)
+    calls = []
+    
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return np.zeros(1000)
+    
+    results = [future.result() for future in _run_concurrently(lambda: cache.get_or_create('mask', factory))]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['bytes'] == results[0].nbytes
+
+
+def test_get_or_create_value_larger_than_budget_is_shared():
+    cache = LRUCache(100)
+    calls = []
+    
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return np.zeros(1000)
+    
+    results = [future.result() for future in _run_concurrently(lambda: cache.get_or_create('big', factory))]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert len(cache) == 0
+
+
+def test_get_or_create_error_reaches_waiters_and_is_not_cached():
+    cache = LRUCache(1024 * 1024)
+    calls = []
+    
+    def failing():
+        calls.append(1)
+        time.sleep(0.05)
+        raise ValueError('lỗi tạo')
+    
+    for future in _run_concurrently(lambda: cache.get_or_create('key', failing)):
+        with pytest.raises(ValueError):
+            future.result()
+    assert len(calls) == 1
+    assert cache.get_or_create('key', lambda: np.ones(4)).sum() == 4
@@ -0,0 +1,50 @@
+"""
+Kiểm tra ssim_metric: ảnh nhỏ hơn cửa sổ 11x11 và sai lệch so với skimage
+"""
+
+import numpy as np
+import pytest
+
+from core.metrics import ssim_metric
+
+
+# Sai lệch tuyệt đối tối đa so với skimage (xem docstring ssim_metric)
+SKIMAGE_TOLERANCE = 1e-4
+
+
+@pytest.mark.parametrize('shape', [(8, 8), (8, 8, 3), (1, 5), (2, 2), (10, 64)])
+def test_ssim_smaller_than_window(shape):
+    rng = np.random.default_rng(0)
+    image = (rng.random(shape) * 255).astype(np.uint8)
+    other = np.clip(image.astype(np.int16) + rng.integers(-20, 21, shape), 0, 255).astype(np.uint8)
+    
+    assert ssim_metric(image, image) == pytest.approx(1.0)
+    value = ssim_metric(image, other)
+    assert np.isfinite(value) and value < 1.0
+
+
+def test_ssim_rejects_empty_image():
+    with pytest.raises(ValueError):
+        ssim_metric(np.zeros((0, 8), np.uint8), np.zeros((0, 8), np.uint8))
+
+
+def _ssim_pairs():
+    rng = np.random.default_rng(1)
+    noise = (rng.random((96, 128, 3)) * 255).astype(np.uint8)
+    yield noise, np.clip(noise.astype(np.int16) + rng.integers(-30, 31, noise.shape), 0, 255).astype(np.uint8)
+    gradient = np.tile(np.linspace(0, 255, 128), (96, 1))
+    yield gradient.astype(np.uint8), np.clip(gradient * 0.97 + 4, 0, 255).astype(np.uint8)
+    # Vùng gần phẳng, sáng: sai lệch float32 lớn nhất
+    flat = np.full((96, 128, 3), 255, np.int16)
+    yield flat.astype(np.uint8), np.clip(flat + rng.integers(-1, 2, flat.shape), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('pair', list(_ssim_pairs()), ids=['noise', 'gradient', 'flat'])
+def test_ssim_matches_skimage(pair):
+    metrics = pytest.importorskip('skimage.metrics')
+    image1, image2 = pair
+    expected = metrics.structural_similarity(
+        image1, image2, gaussian_weights=True, sigma=1.5, use_sample_covariance=False,
+        data_range=255, channel_axis=2 if image1.ndim == 3 else None
+    )
+    assert ssim_metric(image1, image2, downsample=1) == pytest.approx(expected, abs=SKIMAGE_TOLERANCE)
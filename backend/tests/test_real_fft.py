@@ -0,0 +1,76 @@
+"""
+Kiểm tra đường xử lý mặc định rfft2 + nửa mặt nạ bố cục gốc so với đường phổ
+đầy đủ (FFT phức, mặt nạ đầy đủ dịch tâm): mặt nạ trùng nhau, ảnh kết quả lệch
+tối đa 1 mức xám
+"""
+
+import numpy as np
+import pytest
+
+from core.filters import create_filter_mask
+from core.image_processor import ImageProcessor
+
+
+FILTER_TYPES = ['ideal', 'butterworth', 'gaussian']
+FILTER_MODES = ['lowpass', 'highpass', 'bandreject']
+# Kích thước chẵn/lẻ theo từng trục
+SHAPES = [(64, 96), (63, 95), (64, 95), (63, 96)]
+# Sai số tối đa (mức xám uint8) so với đường phổ đầy đủ
+MAX_DIFF = 1
+
+
+def _filter_params(filter_type, filter_mode):
+    return {'filter_type': filter_type, 'filter_mode': filter_mode, 'cutoff': 12.0, 'order': 2,
+            'center_freq': 15.0 if filter_mode == 'bandreject' else None,
+            'bandwidth': 6.0 if filter_mode == 'bandreject' else None}
+
+
+@pytest.mark.parametrize('filter_type', FILTER_TYPES)
+@pytest.mark.parametrize('filter_mode', FILTER_MODES)
+@pytest.mark.parametrize('shape', SHAPES)
+def test_half_mask_matches_full_mask(filter_type, filter_mode, shape):
+    height, width = shape
+    params = _filter_params(filter_type, filter_mode)
+    full = create_filter_mask(height, width, **params)
+    # Mặt nạ đầy đủ dịch tâm -> bố cục gốc của FFT, giữ nửa cột u >= 0 như rfft2
+    expected = np.fft.ifftshift(full)[:, :width // 2 + 1]
+    
+    half = create_filter_mask(height, width, **params, half=True, centered=False)
+    np.testing.assert_allclose(half, expected, rtol=0, atol=1e-12)
+    
+    separable = create_filter_mask(height, width, **params, half=True, centered=False, separable=True)
+    if not isinstance(separable, np.ndarray):
+        separable = separable.to_array()
+    np.testing.assert_allclose(separable, expected, rtol=0, atol=1e-12)
+
+
+def _full_spectrum_reference(image, fft_shape, params):
+    """Đường phổ đầy đủ: pad 0, FFT phức, fftshift, mặt nạ dịch tâm, IFFT"""
+    height, width = image.shape[:2]
+    padded = np.zeros(fft_shape + image.shape[2:])
+    padded[:height, :width] = image / 255.0
+    spectrum = np.fft.fftshift(np.fft.fft2(padded, axes=(0, 1)), axes=(0, 1))
+    mask = create_filter_mask(fft_shape[0], fft_shape[1], **params)
+    if image.ndim == 3:
+        mask = mask[..., np.newaxis]
+    result = np.fft.ifft2(np.fft.ifftshift(spectrum * mask, axes=(0, 1)), axes=(0, 1)).real
+    return (np.clip(result[:height, :width], 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+@pytest.mark.parametrize('filter_type', FILTER_TYPES)
+@pytest.mark.parametrize('filter_mode', FILTER_MODES)
+@pytest.mark.parametrize('shape', SHAPES)
+def test_process_image_matches_full_spectrum(filter_type, filter_mode, shape):
+    rng = np.random.default_rng(0)
+    image = (rng.random(shape + (3,)) * 255).astype(np.uint8)
+    params = _filter_params(filter_type, filter_mode)
+    
+    processor = ImageProcessor()
+    processor.load_image_from_array(image)
+    result = processor.process_image(**params, metrics_level='none', use_spectrum_cache=False)
+    complex_result = processor.process_image(**params, real_fft=False, metrics_level='none',
+                                             use_spectrum_cache=False)
+    expected = _full_spectrum_reference(image, processor.fft_plan.shape, params)
+    
+    assert np.abs(result.astype(np.int16) - expected.astype(np.int16)).max() <= MAX_DIFF
+    assert np.abs(complex_result.astype(np.int16) - expected.astype(np.int16)).max() <= MAX_DIFF
@@ -0,0 +1,89 @@
+"""
+Kiểm tra xử lý theo tile (core.tiling): kết quả khớp đường nguyên khối trong
+sai số đã nêu (TILE_TOLERANCE - lệch tối đa 1 mức xám), kế hoạch tile và mặt nạ trong cache
+"""
+
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from app import app
+from core.cache import MASK_CACHE
+from core.image_processor import ImageProcessor
+from core.tiling import plan_image_tiles, process_tiled
+
+
+# Sai số tối đa (mức xám uint8) giữa process_image_tiled và process_image
+TILE_MAX_DIFF = 1
+
+
+def _noise_image(height: int, width: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (rng.random((height, width, 3)) * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('filter_type', ['gaussian', 'butterworth'])
+@pytest.mark.parametrize('filter_mode', ['lowpass', 'highpass'])
+@pytest.mark.parametrize('shape', [(300, 400), (257, 331)])
+def test_tiled_matches_monolithic(filter_type, filter_mode, shape):
+    image = _noise_image(*shape)
+    monolithic = ImageProcessor()
+    monolithic.load_image_from_array(image)
+    expected = monolithic.process_image(filter_type=filter_type, filter_mode=filter_mode,
+                                        cutoff=30, metrics_level='none')
+    
+    tiled = ImageProcessor()
+    tiled.load_image_from_array(image)
+    result = tiled.process_image_tiled(filter_type=filter_type, filter_mode=filter_mode, cutoff=30,
+                                       memory_budget=2 * 1024 * 1024, metrics_level='none')
+    
+    assert tiled.tiling['tiles'] > 1
+    assert result.shape == expected.shape
+    assert np.abs(result.astype(np.int16) - expected.astype(np.int16)).max() <= TILE_MAX_DIFF
+
+
+def test_plan_image_tiles_rejects_budget_below_kernel():
+    # cutoff nhỏ -> kernel không gian rộng, viền không vừa ngân sách 1 MB
+    with pytest.raises(ValueError):
+        plan_image_tiles((600, 800, 3), 'gaussian', 'lowpass', cutoff=1.0, memory_budget=1024 * 1024)
+
+
+def test_plan_image_tiles_matches_process_tiled():
+    image = _noise_image(300, 400)
+    plan = plan_image_tiles(image.shape, 'gaussian', 'lowpass', cutoff=30, memory_budget=2 * 1024 * 1024)
+    _, info = process_tiled(image, 'gaussian', 'lowpass', cutoff=30, memory_budget=2 * 1024 * 1024)
+    assert info['core'] == list(plan['core'])
+    assert info['fft_shape'] == list(plan['fft_shape'])
+    assert info['apron'] == list(plan['apron'])
+
+
+def test_cached_tile_mask_is_read_only():
+    MASK_CACHE.clear()
+    process_tiled(_noise_image(300, 400), 'gaussian', 'lowpass', cutoff=30, memory_budget=2 * 1024 * 1024)
+    masks = [value for key, value in MASK_CACHE._data.items() if key[0] == 'tile']
+    assert masks
+    for mask in masks:
+        for array in (mask.row, mask.col):
+            assert not array.flags.writeable
+
+
+def _post_process(form):
+    _, encoded = cv2.imencode('.png', _noise_image(120, 160))
+    data = {'image': (io.BytesIO(encoded.tobytes()), 'image.png'), 'filter_type': 'gaussian',
+            'filter_mode': 'lowpass', 'include': '', **form}
+    return app.test_client().post('/api/process', data=data, content_type='multipart/form-data')
+
+
+def test_tiled_rejects_fft_planner():
+    response = _post_process({'cutoff': '30', 'tiled': '1', 'fft_planner': 'measure'})
+    assert response.status_code == 400
+
+
+def test_tiled_auto_falls_back_when_no_tile_fits():
+    form = {'cutoff': '1', 'tile_memory_mb': '1'}
+    assert _post_process({**form, 'tiled': '1'}).status_code == 400
+    response = _post_process({**form, 'tiled': 'auto'})
+    assert response.status_code == 200
+    assert 'tiling' not in response.get_json()
@@ -4,8 +4,19 @@ Module xử lý đọc/ghi ảnh và chuyển đổi định dạng
 
 import cv2
 import numpy as np
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
 import os
+import time
+
+
+# Định dạng mã hóa ảnh trả về cho client: (đuôi file cho cv2.imencode, mimetype,
+# cờ tham số chất lượng/nén của OpenCV, giá trị mặc định, khoảng hợp lệ)
+ENCODERS = {
+    'png': ('.png', 'image/png', cv2.IMWRITE_PNG_COMPRESSION, 1, (0, 9)),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY, 85, (1, 100)),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY, 80, (1, 101)),
+}
+ENCODER_ALIASES = {'jpg': 'jpeg'}
 
 
 def read_image(image_path: str) -> np.ndarray:
@@ -147,3 +158,56 @@ def normalize_image(image: np.ndarray, target_range: Tuple[float, float] = (0.0,
     
     return normalized.astype(np.float32)
 
+
+def parse_encoding(spec: str) -> Tuple[str, int]:
+    """
+    Đọc cấu hình mã hóa dạng 'định_dạng[:mức]', ví dụ 'png', 'png:6', 'jpeg:90', 'webp:75'
+    Mức là mức nén (0-9) với PNG, chất lượng (1-100) với JPEG/WebP (101 = WebP lossless)
+    
+    Args:
+        spec: Chuỗi cấu hình
+        
+    Returns:
+        (định dạng, mức)
+    """
+    name, _, level = spec.strip().lower().partition(':')
+    name = ENCODER_ALIASES.get(name, name)
+    if name not in ENCODERS:
+        raise ValueError(f"Định dạng ảnh không hợp lệ: {name}. Chọn {', '.join(ENCODERS)}")
+    _, _, _, default, (low, high) = ENCODERS[name]
+    level = int(level) if level else default
+    if not low <= level <= high:
+        raise ValueError(f"Mức nén/chất lượng {name} phải trong khoảng {low} - {high}, nhận được {level}")
+    return name, level
+
+
+def encode_image(image: np.ndarray, image_format: str = 'png',
+                 level: Optional[int] = None) -> Tuple[bytes, str, Dict]:
+    """
+    Mã hóa ảnh BGR/grayscale trực tiếp bằng cv2.imencode (không chuyển sang RGB, không qua PIL)
+    
+    Args:
+        image: Ảnh uint8 (BGR hoặc grayscale)
+        image_format: 'png', 'jpeg' hoặc 'webp'
+        level: Mức nén PNG (0-9) hoặc chất lượng JPEG/WebP (None = mặc định của định dạng)
+        
+    Returns:
+        (bytes, mimetype, thông tin mã hóa: format, level, bytes, encode_ms)
+    """
+    image_format = ENCODER_ALIASES.get(image_format, image_format)
+    extension, mimetype, flag, default, _ = ENCODERS[image_format]
+    level = default if level is None else level
+    
+    start = time.perf_counter()
+    success, encoded = cv2.imencode(extension, image, [flag, int(level)])
+    encode_ms = (time.perf_counter() - start) * 1000.0
+    if not success:
+        raise ValueError(f"Không thể mã hóa ảnh sang {image_format}")
+    
+    data = encoded.tobytes()
+    return data, mimetype, {
+        'format': image_format,
+        'level': int(level),
+        'bytes': len(data),
+        'encode_ms': encode_ms
+    }
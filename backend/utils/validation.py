@@ -10,6 +10,7 @@ import numpy as np
 ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']
 ALLOWED_FILTER_TYPES = ['ideal', 'butterworth', 'gaussian']
 ALLOWED_FILTER_MODES = ['lowpass', 'highpass', 'bandreject']
+ALLOWED_PRECISIONS = ['float32', 'float64']
 
 
 def validate_image_file(file_path: str) -> bool:
@@ -55,6 +56,19 @@ def validate_filter_mode(filter_mode: str) -> bool:
     return filter_mode.lower() in ALLOWED_FILTER_MODES
 
 
+def validate_precision(precision: str) -> bool:
+    """
+    Kiểm tra chế độ độ chính xác có hợp lệ không
+    
+    Args:
+        precision: 'float32' hoặc 'float64'
+        
+    Returns:
+        True nếu hợp lệ
+    """
+    return precision.lower() in ALLOWED_PRECISIONS
+
+
 def validate_cutoff(cutoff: float, min_value: float = 0.1, max_value: float = 1000.0) -> bool:
     """
     Kiểm tra giá trị cutoff có hợp lệ không
@@ -0,0 +1,73 @@
+"""
+Entry point WSGI cho môi trường production (xem gunicorn.conf.py)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Với preload_app, module này chạy một lần trong process master trước khi fork:
+tạo sẵn mặt nạ bộ lọc và plan FFT cho các kích thước ảnh thường gặp, rồi gửi một
+request /api/process giả để khởi tạo các phần nạp trễ (route Flask, bộ mã hóa ảnh).
+"""
+
+import io
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app import app, apply_fft_config
+from core.fourier_transform import rfft2d, irfft2d
+from core.fft_plan import plan_fft
+from core.image_processor import get_filter_mask
+
+
+# Kích thước ảnh (HxW) cần tạo sẵn mặt nạ và plan FFT: Full HD và ảnh 12 MP
+WARMUP_SHAPES = os.environ.get('WARMUP_SHAPES', '1080x1920,3000x4000')
+# Tham số bộ lọc tạo sẵn: mặc định của frontend (r=20) và của API (cutoff=50)
+WARMUP_FILTERS = (
+    {'filter_type': 'gaussian', 'filter_mode': 'lowpass', 'cutoff': 20.0},
+    {'filter_type': 'gaussian', 'filter_mode': 'lowpass', 'cutoff': 50.0},
+)
+
+
+def parse_shapes(value: str):
+    """Đọc danh sách kích thước dạng '1080x1920,3000x4000' thành [(H, W), ...]"""
+    shapes = []
+    for item in value.split(','):
+        if item.strip():
+            height, width = item.lower().split('x')
+            shapes.append((int(height), int(width)))
+    return shapes
+
+
+def warm_up() -> None:
+    """Tạo sẵn mặt nạ, plan FFT cho WARMUP_SHAPES và chạy một request giả"""
+    start = time.perf_counter()
+    # Backend theo app.config (có thể đã đổi sau khi import app) trước khi tạo plan FFT
+    apply_fft_config()
+    for height, width in parse_shapes(WARMUP_SHAPES):
+        # Lưới theo FFT_PLANNER (với 'measure' cũng đo và ghi cache chi phí FFT của máy)
+        optimal_shape = plan_fft((height, width)).shape
+        for params in WARMUP_FILTERS:
+            get_filter_mask(optimal_shape, **params)
+        # Plan FFT theo độ dài từng trục (một kênh là đủ)
+        spectrum = rfft2d(np.zeros(optimal_shape, dtype=np.float32), shift=False)
+        irfft2d(spectrum, optimal_shape[1], shift=False)
+    
+    image = np.zeros((256, 256, 3), dtype=np.uint8)
+    cv2.circle(image, (128, 128), 64, (255, 255, 255), -1)
+    _, encoded = cv2.imencode('.png', image)
+    response = app.test_client().post('/api/process', data={
+        'image': (io.BytesIO(encoded.tobytes()), 'warmup.png'),
+        'filter_type': 'gaussian',
+        'cutoff': '20',
+    }, content_type='multipart/form-data')
+    if response.status_code != 200:
+        print(f"Warm-up request lỗi {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    print(f"Warm-up hoàn tất trong {time.perf_counter() - start:.2f} s")
+
+
+if 'OPENCV_THREADS' in os.environ:
+    cv2.setNumThreads(int(os.environ['OPENCV_THREADS']))
+if os.environ.get('WARMUP', '1') != '0':
+    warm_up()
@@ -5,15 +5,19 @@ import ComparisonView from './components/ComparisonView';
 import SpectrumViewer from './components/SpectrumViewer';
 import MetricsDisplay from './components/MetricsDisplay';
 import ProcessingStatus from './components/ProcessingStatus';
-import { processImage, healthCheck } from './services/api';
+import { processImageJob, healthCheck } from './services/api';
 
 function App() {
   const [originalImage, setOriginalImage] = useState(null);
+  // Mã ảnh server đang giữ: các lần xử lý sau chỉ gửi image_id thay vì cả ảnh
+  const [imageId, setImageId] = useState(null);
   const [processedImage, setProcessedImage] = useState(null);
   const [magnitudeSpectrum, setMagnitudeSpectrum] = useState(null);
   const [filterMask, setFilterMask] = useState(null);
   const [metrics, setMetrics] = useState(null);
   const [isProcessing, setIsProcessing] = useState(false);
+  // Trạng thái job đang chạy trên server (stage, progress) để hiển thị tiến độ
+  const [jobStatus, setJobStatus] = useState(null);
   const [error, setError] = useState(null);
   const [filterParams, setFilterParams] = useState({
     filter_type: 'gaussian',
@@ -37,6 +41,7 @@ function App() {
   // Xử lý khi chọn ảnh
   const handleImageSelect = (imageBase64) => {
     setOriginalImage(imageBase64);
+    setImageId(null);
     setProcessedImage(null);
     setMagnitudeSpectrum(null);
     setFilterMask(null);
@@ -54,10 +59,14 @@ function App() {
     if (!originalImage) return;
     
     setIsProcessing(true);
+    setJobStatus(null);
     setError(null);
     try {
-      const result = await processImage(originalImage, params);
+      const result = await processImageJob(originalImage, params, imageId, {
+        onProgress: setJobStatus,
+      });
       if (result.success) {
+        setImageId(result.image_id);
         setProcessedImage(result.processed_image);
         setMagnitudeSpectrum(result.magnitude_spectrum);
         setFilterMask(result.filter_mask);
@@ -70,12 +79,13 @@ function App() {
       console.error('Error processing image:', err);
     } finally {
       setIsProcessing(false);
+      setJobStatus(null);
     }
   };
 
   return (
     <div className="min-h-screen bg-gray-100">
-      <ProcessingStatus isProcessing={isProcessing} error={error} />
+      <ProcessingStatus isProcessing={isProcessing} error={error} job={jobStatus} />
       
       <div className="container mx-auto px-4 py-8">
         <header className="text-center mb-8">
@@ -35,7 +35,8 @@ const MetricsDisplay = ({ metrics }) => {
         <div className="bg-purple-50 p-4 rounded-lg">
           <h4 className="text-sm font-medium text-purple-700 mb-1">SSIM</h4>
           <p className="text-2xl font-bold text-purple-900">
-            {ssim.toFixed(4)}
+            {/* metrics='cheap' không tính SSIM */}
+            {ssim != null ? ssim.toFixed(4) : '—'}
           </p>
           <p className="text-xs text-purple-600 mt-1">
             Structural Similarity Index (0-1, càng gần 1 càng tốt)
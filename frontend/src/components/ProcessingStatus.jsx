@@ -1,4 +1,17 @@
-const ProcessingStatus = ({ isProcessing, error }) => {
+// Tên hiển thị các bước xử lý trên server (xem core/jobs.py JOB_STAGES)
+const STAGE_LABELS = {
+  preview: 'Thu nhỏ ảnh',
+  auto: 'Tìm tham số tối ưu',
+  spectrum: 'Biến đổi Fourier',
+  filter: 'Áp dụng bộ lọc',
+  inverse: 'Biến đổi ngược',
+  tiles: 'Xử lý theo tile',
+  metrics: 'Tính metrics',
+  precision: 'Đánh giá sai số',
+  encode: 'Mã hóa ảnh',
+};
+
+const ProcessingStatus = ({ isProcessing, error, job = null }) => {
   if (!isProcessing && !error) {
     return null;
   }
@@ -27,7 +40,23 @@ const ProcessingStatus = ({ isProcessing, error }) => {
               d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"
             ></path>
           </svg>
-          <span>Đang xử lý ảnh...</span>
+          <div>
+            <span>
+              {job?.status === 'queued'
+                ? 'Đang chờ xử lý...'
+                : job?.stage
+                  ? `${STAGE_LABELS[job.stage] || job.stage}...`
+                  : 'Đang xử lý ảnh...'}
+            </span>
+            {job && (
+              <div className="mt-1 h-1 w-40 bg-blue-300 rounded">
+                <div
+                  className="h-1 bg-white rounded transition-all"
+                  style={{ width: `${Math.round(job.progress * 100)}%` }}
+                ></div>
+              </div>
+            )}
+          </div>
         </div>
       )}
       {error && (
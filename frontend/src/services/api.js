@@ -15,37 +15,65 @@ export const healthCheck = async () => {
   }
 };
 
+/**
+ * Chuyển ảnh base64 (data URL) thành Blob để gửi qua FormData
+ * @param {string} imageBase64 - Ảnh dạng base64
+ */
+const base64ToBlob = (imageBase64) => {
+  const base64Data = imageBase64.split(',')[1] || imageBase64;
+  const byteCharacters = atob(base64Data);
+  const byteNumbers = new Array(byteCharacters.length);
+  for (let i = 0; i < byteCharacters.length; i++) {
+    byteNumbers[i] = byteCharacters.charCodeAt(i);
+  }
+  const byteArray = new Uint8Array(byteNumbers);
+  return new Blob([byteArray], { type: 'image/png' });
+};
+
+/**
+ * Tạo FormData cho /api/process và /api/jobs
+ * @param {string} imageBase64 - Ảnh dạng base64
+ * @param {object} filterParams - Tham số bộ lọc
+ * @param {string|null} imageId - Mã ảnh server đang giữ (không gửi lại ảnh)
+ */
+const buildProcessForm = (imageBase64, filterParams, imageId) => {
+  const formData = new FormData();
+
+  if (imageId) {
+    formData.append('image_id', imageId);
+  } else {
+    formData.append('image', base64ToBlob(imageBase64), 'image.png');
+  }
+  formData.append('filter_type', filterParams.filter_type);
+  formData.append('filter_mode', filterParams.filter_mode);
+  formData.append('cutoff', filterParams.cutoff);
+  formData.append('order', filterParams.order || 2);
+
+  if (filterParams.center_freq) {
+    formData.append('center_freq', filterParams.center_freq);
+  }
+  if (filterParams.bandwidth) {
+    formData.append('bandwidth', filterParams.bandwidth);
+  }
+  // Mức metrics: 'full' (mặc định, có SSIM), 'cheap' (MSE, PSNR) hoặc 'none'
+  if (filterParams.metrics) {
+    formData.append('metrics', filterParams.metrics);
+  }
+  // Ảnh gốc đã có sẵn ở client: chỉ yêu cầu các ảnh kết quả
+  formData.append('include', 'processed_image,magnitude_spectrum,filter_mask');
+  return formData;
+};
+
 /**
  * Xử lý ảnh với bộ lọc Fourier
  * @param {string} imageBase64 - Ảnh dạng base64
  * @param {object} filterParams - Tham số bộ lọc
+ * @param {string|null} imageId - Mã ảnh server đang giữ (từ lần xử lý trước);
+ *   nếu có thì không gửi lại ảnh, server hết hạn ảnh thì tự gửi lại
  */
-export const processImage = async (imageBase64, filterParams) => {
+export const processImage = async (imageBase64, filterParams, imageId = null) => {
   try {
-    const formData = new FormData();
-    
-    // Chuyển base64 thành Blob
-    const base64Data = imageBase64.split(',')[1] || imageBase64;
-    const byteCharacters = atob(base64Data);
-    const byteNumbers = new Array(byteCharacters.length);
-    for (let i = 0; i < byteCharacters.length; i++) {
-      byteNumbers[i] = byteCharacters.charCodeAt(i);
-    }
-    const byteArray = new Uint8Array(byteNumbers);
-    const blob = new Blob([byteArray], { type: 'image/png' });
-    
-    formData.append('image', blob, 'image.png');
-    formData.append('filter_type', filterParams.filter_type);
-    formData.append('filter_mode', filterParams.filter_mode);
-    formData.append('cutoff', filterParams.cutoff);
-    formData.append('order', filterParams.order || 2);
-    
-    if (filterParams.center_freq) {
-      formData.append('center_freq', filterParams.center_freq);
-    }
-    if (filterParams.bandwidth) {
-      formData.append('bandwidth', filterParams.bandwidth);
-    }
+    const formData = buildProcessForm(imageBase64, filterParams, imageId);
 
     // Thêm timeout 60 giây cho request xử lý ảnh
     const controller = new AbortController();
@@ -60,6 +88,11 @@ export const processImage = async (imageBase64, filterParams) => {
     
     clearTimeout(timeoutId);
 
+    if (response.status === 404 && imageId) {
+      // Ảnh trên server đã hết hạn: gửi lại ảnh đầy đủ
+      return processImage(imageBase64, filterParams, null);
+    }
+
     if (!response.ok) {
       // Thử đọc error message từ JSON
       let errorMessage = 'Lỗi xử lý ảnh';
@@ -80,6 +113,139 @@ export const processImage = async (imageBase64, filterParams) => {
   }
 };
 
+/**
+ * Đọc thông báo lỗi từ response (JSON hoặc text)
+ */
+const readError = async (response, fallback) => {
+  const text = await response.text();
+  try {
+    return JSON.parse(text).error || fallback;
+  } catch (e) {
+    return text || `HTTP ${response.status}: ${response.statusText}`;
+  }
+};
+
+const jobUrl = (path = '') => `${API_BASE_URL}/api/jobs${path}`;
+
+/**
+ * Gửi job xử lý ảnh bất đồng bộ (cùng tham số với processImage)
+ * @returns {Promise<object>} Trạng thái job (job_id, status, stage, progress)
+ */
+export const submitJob = async (imageBase64, filterParams, imageId = null) => {
+  const response = await fetch(jobUrl(), {
+    method: 'POST',
+    body: buildProcessForm(imageBase64, filterParams, imageId),
+  });
+  if (!response.ok) {
+    const error = new Error(await readError(response, 'Lỗi tạo job'));
+    error.status = response.status;
+    throw error;
+  }
+  return await response.json();
+};
+
+/**
+ * Lấy trạng thái job (có result khi status = 'done')
+ * @param {string} jobId - Mã job
+ */
+export const getJob = async (jobId) => {
+  const response = await fetch(jobUrl(`/${jobId}`));
+  if (!response.ok) {
+    throw new Error(await readError(response, 'Lỗi lấy trạng thái job'));
+  }
+  return await response.json();
+};
+
+/**
+ * Hủy job (job đang chạy dừng ở bước kế tiếp)
+ * @param {string} jobId - Mã job
+ */
+export const cancelJob = async (jobId) => {
+  const response = await fetch(jobUrl(`/${jobId}`), { method: 'DELETE' });
+  if (!response.ok) {
+    throw new Error(await readError(response, 'Lỗi hủy job'));
+  }
+  return await response.json();
+};
+
+/**
+ * Xử lý ảnh qua /api/jobs: gửi job rồi hỏi trạng thái định kỳ đến khi xong
+ * @param {string} imageBase64 - Ảnh dạng base64
+ * @param {object} filterParams - Tham số bộ lọc
+ * @param {string|null} imageId - Mã ảnh server đang giữ
+ * @param {object} options - onProgress(job) nhận trạng thái mỗi lần hỏi,
+ *   signal (AbortSignal) để hủy job, pollInterval (ms)
+ * @returns {Promise<object>} Kết quả cùng dạng với processImage
+ */
+export const processImageJob = async (imageBase64, filterParams, imageId = null, options = {}) => {
+  const { onProgress, signal, pollInterval = 250 } = options;
+  try {
+    let job;
+    try {
+      job = await submitJob(imageBase64, filterParams, imageId);
+    } catch (error) {
+      if (error.status === 404 && imageId) {
+        // Ảnh trên server đã hết hạn: gửi lại ảnh đầy đủ
+        return processImageJob(imageBase64, filterParams, null, options);
+      }
+      throw error;
+    }
+
+    while (job.status === 'queued' || job.status === 'running') {
+      if (signal?.aborted) {
+        await cancelJob(job.job_id);
+        throw new Error('Đã hủy');
+      }
+      onProgress?.(job);
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+      job = await getJob(job.job_id);
+    }
+    onProgress?.(job);
+
+    if (job.status === 'cancelled') {
+      throw new Error('Đã hủy');
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Lỗi xử lý ảnh');
+    }
+    return job.result;
+  } catch (error) {
+    throw new Error(`Lỗi xử lý ảnh: ${error.message}`);
+  }
+};
+
+/**
+ * Quét nhiều bộ tham số lọc trên một ảnh đã upload (chỉ trả về metrics)
+ * @param {string} imageId - Mã ảnh server đang giữ
+ * @param {object} baseParams - Tham số mặc định cho mọi bộ tham số
+ * @param {Array<object>} params - Danh sách bộ tham số (ghi đè baseParams)
+ * @param {number} thumbnailSize - Cạnh dài ảnh thu nhỏ (0 = không trả ảnh)
+ */
+export const sweepParameters = async (imageId, baseParams, params, thumbnailSize = 0) => {
+  try {
+    const url = API_BASE_URL ? `${API_BASE_URL}/api/sweep` : '/api/sweep';
+    const response = await fetch(url, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        ...baseParams,
+        image_id: imageId,
+        params,
+        thumbnail_size: thumbnailSize,
+      }),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Lỗi quét tham số');
+    }
+
+    return await response.json();
+  } catch (error) {
+    throw new Error(`Lỗi quét tham số: ${error.message}`);
+  }
+};
+
 /**
  * Upload ảnh lên server
  * @param {File} file - File ảnh